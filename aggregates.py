@@ -0,0 +1,224 @@
+"""Dashboard month-view aggregation.
+
+Everything the dashboard charts need (calendar cells, bucket counts, average,
+distribution, current-week trend and last-7-days trend) is derived from one
+`GROUP BY entry_date` query.  The query covers the requested month plus the
+window around today, so the database is hit once regardless of how many
+entries the user has.  The JSON API (/api/dashboard/month and /trends) asks
+for the two halves separately, with `month_summary` and `recent_trends`, one
+query each.
+"""
+import calendar
+from datetime import date, timedelta
+
+from sqlalchemy import Integer, and_, case, cast, func, or_, select
+
+from extensions import db
+from models import MoodEntry
+from tags import tagged_entry_ids
+
+BUCKETS = ["terrible", "bad", "neutral", "good", "excellent"]
+
+# Inclusive upper rating bound for each bucket except the last one.
+_BUCKET_UPPER = [2, 4, 6, 8]
+
+BUCKET_LABELS = {
+    "terrible": "Terrible (1–2)",
+    "bad": "Bad (3–4)",
+    "neutral": "Neutral (5–6)",
+    "good": "Good (7–8)",
+    "excellent": "Excellent (9–10)",
+}
+
+
+def bucket_index(rating):
+    """Zero-based bucket index for a rating (0 = terrible ... 4 = excellent)."""
+    for idx, upper in enumerate(_BUCKET_UPPER):
+        if rating <= upper:
+            return idx
+    return len(_BUCKET_UPPER)
+
+
+def bucket_name(rating):
+    if rating is None:
+        return None
+    return BUCKETS[bucket_index(rating)]
+
+
+def _in_bucket(rating, name):
+    """SQL condition: `rating` falls in bucket `name` (the same bounds as bucket_index)."""
+    idx = BUCKETS.index(name)
+    conds = []
+    if idx > 0:
+        conds.append(rating > _BUCKET_UPPER[idx - 1])
+    if idx < len(_BUCKET_UPPER):
+        conds.append(rating <= _BUCKET_UPPER[idx])
+    return and_(*conds)
+
+
+def _bucket_columns(rating):
+    """One SUM(CASE ...) per bucket, counting entries (not days) in that bucket."""
+    return [func.sum(case((_in_bucket(rating, name), 1), else_=0)) for name in BUCKETS]
+
+
+def month_bounds(year, month):
+    """First day of the month and first day of the following month."""
+    start = date(year, month, 1)
+    next_total = year * 12 + month
+    return start, date(next_total // 12, next_total % 12 + 1, 1)
+
+
+def daily_rows(user_id, ranges, tag=None):
+    """Per-day aggregates for `user_id` over a list of half-open date ranges.
+
+    With `tag`, only entries carrying that tag are counted.
+    Returns {date: (count, rating_sum, [count per bucket])}.
+    """
+    rating = MoodEntry.mood_rating
+    stmt = (
+        select(
+            MoodEntry.entry_date,
+            func.count(MoodEntry.id),
+            func.sum(rating),
+            *_bucket_columns(rating),
+        )
+        .where(
+            MoodEntry.user_id == user_id,
+            or_(*[
+                and_(MoodEntry.entry_date >= lo, MoodEntry.entry_date < hi)
+                for lo, hi in ranges
+            ]),
+        )
+        .group_by(MoodEntry.entry_date)
+    )
+    if tag:
+        stmt = stmt.where(MoodEntry.id.in_(tagged_entry_ids(user_id, tag)))
+    return {
+        row[0]: (row[1], row[2], list(row[3:]))
+        for row in db.session.execute(stmt)
+    }
+
+
+def bucket_days(user_id, year, month, bucket=None, tag=None):
+    """The days of a month whose calendar mood falls in `bucket`, in date order.
+
+    A day's calendar mood is its average rating rounded half up, as in
+    `month_view`.  The bucket becomes a rating range on that value in the
+    query's HAVING clause, so only the matching days are returned.  Without a
+    bucket every day with an entry is returned.  Returns [(date, mood)].
+    """
+    start, end = month_bounds(year, month)
+    mood = cast(
+        func.sum(MoodEntry.mood_rating) * 1.0 / func.count(MoodEntry.id) + 0.5, Integer
+    )
+    stmt = (
+        select(MoodEntry.entry_date, mood)
+        .where(
+            MoodEntry.user_id == user_id,
+            MoodEntry.entry_date >= start,
+            MoodEntry.entry_date < end,
+        )
+        .group_by(MoodEntry.entry_date)
+        .order_by(MoodEntry.entry_date)
+    )
+    if tag:
+        stmt = stmt.where(MoodEntry.id.in_(tagged_entry_ids(user_id, tag)))
+    if bucket:
+        stmt = stmt.having(_in_bucket(mood, bucket))
+    return [tuple(row) for row in db.session.execute(stmt)]
+
+
+def _day_average(day):
+    count, total, _ = day
+    return round(total / count, 1)
+
+
+def _recent_window(today):
+    """Monday of today's week and the half-open range both trends cover."""
+    week_start = today - timedelta(days=today.weekday())
+    return week_start, (
+        min(week_start, today - timedelta(days=6)),
+        max(week_start + timedelta(days=7), today + timedelta(days=1)),
+    )
+
+
+def _month_figures(days, year, month):
+    start, end = month_bounds(year, month)
+    calendar_dates = []
+    bucket_counts = dict.fromkeys(BUCKETS, 0)
+    for week in calendar.Calendar(calendar.SUNDAY).monthdayscalendar(year, month):
+        row = []
+        for d in week:
+            if d == 0:
+                row.append((None, None, None))
+                continue
+            cell_date = date(year, month, d)
+            day = days.get(cell_date)
+            mood = int(day[1] / day[0] + 0.5) if day else None
+            name = bucket_name(mood) if mood else None
+            if name:
+                bucket_counts[name] += 1
+            row.append((cell_date, mood, name))
+        calendar_dates.append(row)
+
+    total_entries = 0
+    rating_sum = 0
+    mood_distribution = [0] * len(BUCKETS)
+    for day_date, (count, total, dist) in days.items():
+        if start <= day_date < end:
+            total_entries += count
+            rating_sum += total
+            mood_distribution = [a + b for a, b in zip(mood_distribution, dist)]
+
+    return {
+        'calendar_dates': calendar_dates,
+        'bucket_counts': bucket_counts,
+        'total_entries': total_entries,
+        'average_mood': rating_sum / total_entries if total_entries else 0,
+        'mood_distribution': mood_distribution,
+    }
+
+
+def _trend_figures(days, today):
+    week_start, _ = _recent_window(today)
+    weekly_trend = []
+    for i in range(7):
+        day = days.get(week_start + timedelta(days=i))
+        weekly_trend.append(_day_average(day) if day else None)
+
+    last7_trend = []
+    for delta in range(6, -1, -1):
+        day = days.get(today - timedelta(days=delta))
+        last7_trend.append(_day_average(day) if day else None)
+
+    return {
+        'week_start': week_start,
+        'weekly_trend': weekly_trend,
+        'last7_trend': last7_trend,
+    }
+
+
+def month_summary(user_id, year, month, tag=None):
+    """The month-only part of `month_view` (calendar, counts, average, distribution)."""
+    days = daily_rows(user_id, [month_bounds(year, month)], tag=tag)
+    return _month_figures(days, year, month)
+
+
+def recent_trends(user_id, today, tag=None):
+    """The trend part of `month_view`: this week's and the last 7 days' daily averages."""
+    _, window = _recent_window(today)
+    return _trend_figures(daily_rows(user_id, [window], tag=tag), today)
+
+
+def month_view(user_id, year, month, today, tag=None):
+    """Aggregate the dashboard's month view for `user_id`.
+
+    Days with several entries show their average rating (rounded) in the
+    calendar; the distribution counts individual entries.  With `tag`, every
+    figure covers only the entries carrying that tag.  `month_summary` and
+    `recent_trends` compute the two halves separately for the JSON API; this
+    reads both with one query.
+    """
+    _, window = _recent_window(today)
+    days = daily_rows(user_id, [month_bounds(year, month), window], tag=tag)
+    return {**_month_figures(days, year, month), **_trend_figures(days, today)}
@@ -1,13 +1,12 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory, jsonify
-from flask import Flask, render_template, request, redirect, url_for, session, flash, make_response
+from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory, jsonify, get_template_attribute
+from flask import Flask, render_template, request, redirect, url_for, session, flash, Response, stream_with_context, abort
 import os
-import csv
-import io
 from extensions import db
-from datetime import datetime, date, timedelta
-import calendar
-from werkzeug.utils import secure_filename
-import uuid
+from datetime import datetime, date, timedelta, timezone
+from collections import defaultdict
+from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
+from itsdangerous import BadSignature, URLSafeTimedSerializer
 
 # Allow tests to bypass login restrictions
 def _is_testing():
@@ -17,8 +16,7 @@ def _is_testing():
 def _get_user_id_for_export():
     if _is_testing():
         return 1
-    return session.get('user_id')
-
+    return current_user_id()
 
 
 app = Flask(__name__)
@@ -36,6 +34,63 @@ MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB max file size
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+# Per-image limit, enforced while the upload streams in (see uploads.IngestStream)
+app.config['MAX_IMAGE_SIZE'] = 10 * 1024 * 1024
+
+# Number of entries rendered per page on /logs (and returned by /logs/more)
+app.config['ENTRIES_PAGE_SIZE'] = 50
+app.config['WEEKS_PAGE_SIZE'] = 12
+app.config['SEARCH_PAGE_SIZE'] = 20
+
+# Bulk imports (/import) may be larger than other requests
+app.config['IMPORT_MAX_SIZE'] = 256 * 1024 * 1024
+
+# Password hashing policy; stored hashes are upgraded on the next successful login
+app.config['PASSWORD_HASH_METHOD'] = 'scrypt:32768:8:1'
+app.config['PASSWORD_HASH_WORKERS'] = max(1, (os.cpu_count() or 2) - 1)
+app.config['PASSWORD_HASH_QUEUE'] = 32
+# PINs: cheaper hash, and PIN_MAX_ATTEMPTS wrong PINs lock PIN login for PIN_LOCKOUT_SECONDS
+app.config['PIN_HASH_METHOD'] = 'pbkdf2:sha256:10000'
+app.config['PIN_MAX_ATTEMPTS'] = 5
+app.config['PIN_LOCKOUT_SECONDS'] = 900
+# /check-password: a verified password is remembered this long (seconds), and
+# checks that need a hash are limited per user to a burst of 5, then one per 6s
+app.config['PASSWORD_VERIFIED_TTL'] = 300
+app.config['CHECK_PASSWORD_BURST'] = 5
+app.config['CHECK_PASSWORD_RATE'] = 1 / 6
+
+# How upload bytes leave the app: 'direct', 'x-sendfile' or 'x-accel' (see media.py)
+app.config['UPLOAD_SEND_MODE'] = 'direct'
+app.config['UPLOAD_ACCEL_PREFIX'] = '/protected-uploads/'
+
+# Sessions live server-side ('sqlite'; 'cookie' restores Flask's signed
+# cookies); each worker caches recently used ones for SESSION_CACHE_TTL seconds
+app.config['SESSION_BACKEND'] = 'sqlite'
+app.config['SESSION_CACHE_SIZE'] = 10_000
+app.config['SESSION_CACHE_TTL'] = 10.0
+# Rendered pages cached per (user, data version) (see caching.py): 'memory',
+# 'none' (ETags only) or a shared store object with get()/set(); change the
+# salt to drop every cached page and ETag, e.g. when templates change
+app.config['RESPONSE_CACHE_BACKEND'] = 'memory'
+app.config['RESPONSE_CACHE_MAX_BYTES'] = 32 * 1024 * 1024
+app.config['RESPONSE_CACHE_TIMEOUT'] = 300
+app.config['RESPONSE_CACHE_SALT'] = '1'
+
+
+@app.template_global()
+def image_url(image_path, variant=None):
+    """URL of an uploaded image, or of its resized variant once it exists."""
+    if variant:
+        found = variant_path(image_path, variant, app.static_folder)
+        if found == image_path and variant_pending(image_path, app.static_folder):
+            # Do not cache a page that would keep the original once the variant exists
+            skip_cache()
+        image_path = found
+    prefix = os.path.basename(app.config['UPLOAD_FOLDER']) + '/'
+    if image_path and image_path.startswith(prefix):
+        return url_for('uploaded_image', filename=image_path[len(prefix):])
+    return url_for('static', filename=image_path)
+
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -47,65 +102,59 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
 from models import MoodEntry, User
-
-
-def _to_date(val):
-    """Normalize an entry_date-like value to a datetime.date or return None.
-
-    Handles: date, datetime, ISO date/time strings, YYYYMMDD ints/strings, and unix timestamps.
-    """
-    if isinstance(val, date):
-        return val
-    if isinstance(val, datetime):
-        return val.date()
-    if isinstance(val, str):
-        s = val.strip()
-        # Try ISO date first
-        try:
-            return date.fromisoformat(s)
-        except Exception:
-            pass
-        # Try ISO datetime
-        try:
-            return datetime.fromisoformat(s).date()
-        except Exception:
-            pass
-        # Try YYYYMMDD
-        if s.isdigit():
-            if len(s) == 8:
-                try:
-                    return date(int(s[:4]), int(s[4:6]), int(s[6:8]))
-                except Exception:
-                    pass
-            # Try unix timestamp
-            try:
-                return datetime.fromtimestamp(int(s)).date()
-            except Exception:
-                pass
-        return None
-    if isinstance(val, int):
-        s = str(val)
-        if len(s) == 8:
-            try:
-                return date(int(s[:4]), int(s[4:6]), int(s[6:8]))
-            except Exception:
-                pass
-        try:
-            return datetime.fromtimestamp(val).date()
-        except Exception:
-            return None
-    return None
-
-
-def _normalize_entries(entries):
-    """Mutate a list of MoodEntry objects so their `entry_date` attributes are date objects when possible."""
-    if not entries:
-        return
-    for e in entries:
-        ed = _to_date(e.entry_date)
-        if ed is not None:
-            # assign back for template rendering (no commit)
-            e.entry_date = ed
+from streaks import streak_summary, get_user_stats, reset_user_stats, rebuild_all_user_stats
+from auth import current_user_id, get_current_user, load_current_user, login_required
+from aggregates import (
+    BUCKET_LABELS, BUCKETS, bucket_days, bucket_name, month_bounds, month_summary, month_view,
+    recent_trends,
+)
+from migrations import upgrade as upgrade_schema
+from pagination import entry_page, page_size
+from exports import FORMATS, export_stream
+from search import search_entries
+from tags import filter_by_tag, normalize_tag, parse_tags, tag_summary
+from imports import FORMATS as IMPORT_FORMATS, MAX_TIME_SPENT, ImportFormatError, import_entries
+from dates import to_date, normalize_entries
+from media import forget_image_access, send_upload
+from passwords import (
+    PasswordHashingBusyError, check_verified_token, is_pin_shaped, issue_verified_token,
+)
+from ratelimit import TokenBucketLimiter
+from sessions import init_sessions, regenerate_session
+from caching import bump_data_version, cached_response, init_response_cache, skip_cache
+from uploads import (
+    ImageUploadRequest, accepts_image_uploads, collect_garbage, discard_upload,
+    release_user_uploads, save_upload, variant_path, variant_pending, wait_for_uploads,
+    wants_image_stream,
+)
+from weekly import ensure_weekly_summaries, rebuild_all_weekly_summaries, reset_weekly_summaries, summaries_page, week_start_for
+
+@app.errorhandler(PasswordHashingBusyError)
+def password_hashing_busy(error):
+    """Every hashing slot is taken; ask the client to retry shortly."""
+    return "Too many sign-in attempts in progress, please try again.", 503, {'Retry-After': '1'}
+
+
+init_sessions(app)
+init_response_cache(app)
+app.before_request(load_current_user)
+
+# Image fields of upload views are validated and stored while the body streams in
+app.request_class = ImageUploadRequest
+
+
+@app.errorhandler(413)
+@app.errorhandler(415)
+def rejected_upload(error):
+    """Send image-form users back to the form instead of a bare error page."""
+    if not wants_image_stream(request.endpoint):
+        return error
+    if error.code == 413:
+        limit = app.config['MAX_IMAGE_SIZE'] // (1024 * 1024)
+        flash(f'Image is too large. Please upload an image under {limit} MB.', 'error')
+    else:
+        flash('Invalid file type. Please upload an image (PNG, JPG, JPEG, GIF, or WEBP).', 'error')
+    return redirect(request.path)
 
 
 @app.route('/', methods=['GET', 'POST'])
@@ -116,19 +165,47 @@ def login():
 
         user = User.query.filter_by(username=username).first()
 
-        if user and user.check_password(password):
-            session['logged_in'] = True
-            session['user_id'] = user.id
-            return redirect(url_for('home'))
+        # A PIN-shaped input is checked against the PIN, anything else against
+        # the password, so each sign-in runs one verifier.  Four-digit
+        # passwords were allowed before PIN sign-in: on accounts whose password
+        # is (or may be) one of them, a PIN-shaped input that is not the PIN is
+        # also tried as the password, at the cost of a second verification; if
+        # it is the password, no PIN failure is counted.  Shapes not yet known
+        # are recorded on the next successful password check.
+        verified = pin_locked = False
+        pin_attempt = bool(user and user.pin_hash and is_pin_shaped(password))
+        if pin_attempt:
+            pin_locked = user.pin_locked()
+            pin_state = (user.pin_failed_attempts, user.pin_locked_until)
+            verified = not pin_locked and user.check_pin(password)
+        try_password = user is not None and not (pin_attempt and user.password_pin_shaped is False)
+        if not verified and try_password and user.check_password(password):
+            verified = True
+            if pin_attempt:
+                user.pin_failed_attempts, user.pin_locked_until = pin_state
+            if user.password_needs_rehash():
+                # Hashing policy changed since this password was set
+                user.set_password(password)
+            elif user.password_pin_shaped is None:
+                user.password_pin_shaped = is_pin_shaped(password)
+        if user is not None and db.session.dirty:
+            db.session.commit()  # the PIN failure count / reset, a new hash or the shape
+
+        if pin_locked and not verified:
+            flash('Too many incorrect PIN attempts. Sign in with your password '
+                  'or try again later.', 'error')
+            return redirect(url_for('login'))
 
-        elif user and str(user.pin) == password:
+        if verified:
+            # A fresh id, so a session id known before sign-in is not authenticated
+            regenerate_session()
             session['logged_in'] = True
             session['user_id'] = user.id
             return redirect(url_for('home'))
-        else:
-            # Match test expectations: show a generic invalid credential message
-            flash("Invalid username or password", 'error')
-            return redirect(url_for('login'))
+
+        # Match test expectations: show a generic invalid credential message
+        flash("Invalid username or password", 'error')
+        return redirect(url_for('login'))
 
     return render_template('home/login.html')
 
@@ -147,6 +224,15 @@ def register():
             flash('Passwords do not match', 'error')
             return redirect(url_for('register'))
 
+        # Four-digit inputs are reserved for PIN sign-in
+        if is_pin_shaped(password):
+            flash('Password cannot be just a 4-digit number', 'error')
+            return redirect(url_for('register'))
+
+        if pin and not is_pin_shaped(pin):
+            flash('PIN must be 4 digits', 'error')
+            return redirect(url_for('register'))
+
         if User.query.filter_by(username=username).first():
             flash('Username already exists', 'error')
             return redirect(url_for('register'))
@@ -168,11 +254,9 @@ def register():
     return render_template('home/register.html')
 
 @app.route('/home')
+@login_required
 def home():
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    user_id = session.get('user_id')
+    user_id = current_user_id()
     today = datetime.utcnow().date()
 
     # check if user has logged today
@@ -192,19 +276,25 @@ def home():
     )
 
 
+def _profile_conflict(user, username, email):
+    """Error message if another user already has `username` or `email`, else None."""
+    taken = User.query.with_entities(User.username, User.email).filter(
+        User.id != user.id, or_(User.username == username, User.email == email)
+    ).all()
+    if any(row.username == username for row in taken):
+        return 'Username already taken. Please choose a different username.'
+    if taken:
+        return 'Email already taken. Please use a different email address.'
+    return None
+
 
 @app.route('/profile', methods=['GET', 'POST'])
+@login_required
+@cached_response
 def profile():
     """Display user's personal information"""
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    user_id = session.get('user_id')
-    if not user_id:
-        flash('Please log in to view your profile', 'error')
-        return redirect(url_for('login'))
-
-    user = User.query.get_or_404(user_id)
+    user = get_current_user()
+    user_id = user.id
 
     if request.method == 'POST':
         action = request.form.get('action')
@@ -218,12 +308,6 @@ def profile():
                 flash('Username cannot be empty', 'error')
                 return redirect(url_for('profile'))
 
-            # Check if username is already taken by another user
-            existing_user = User.query.filter_by(username=new_username).first()
-            if existing_user and existing_user.id != user.id:
-                flash('Username already taken. Please choose a different username.', 'error')
-                return redirect(url_for('profile'))
-
             # Validate email
             if not new_email:
                 flash('Email cannot be empty', 'error')
@@ -234,10 +318,10 @@ def profile():
                 flash('Please enter a valid email address', 'error')
                 return redirect(url_for('profile'))
 
-            # Check if email is already taken by another user
-            existing_email = User.query.filter_by(email=new_email).first()
-            if existing_email and existing_email.id != user.id:
-                flash('Email already taken. Please use a different email address.', 'error')
+            # Check if username or email is already taken by another user
+            conflict = _profile_conflict(user, new_username, new_email)
+            if conflict:
+                flash(conflict, 'error')
                 return redirect(url_for('profile'))
 
             # Update username and email
@@ -250,58 +334,163 @@ def profile():
     total_entries = MoodEntry.query.filter_by(user_id=user_id).count()
     recent_entries = MoodEntry.query.filter_by(user_id=user_id).order_by(MoodEntry.timestamp.desc()).limit(5).all()
     # Normalize recent entry dates for template rendering
-    _normalize_entries(recent_entries)
+    normalize_entries(recent_entries)
     return render_template('home/profile.html', user=user, total_entries=total_entries, recent_entries=recent_entries)
 
 
+def _split_by_privacy(entries):
+    """Partition entries into (public, private) lists for the logs page."""
+    public, private = [], []
+    for e in entries:
+        (private if e.is_private else public).append(e)
+    return public, private
+
+
+def _privacy_counts(user_id, tag=None):
+    """(public, private) entry totals for a user from one grouped query."""
+    query = db.session.query(MoodEntry.is_private, db.func.count(MoodEntry.id)).filter(
+        MoodEntry.user_id == user_id
+    )
+    counts = dict(filter_by_tag(query, user_id, tag).group_by(MoodEntry.is_private).all())
+    return counts.get(False, 0), counts.get(True, 0)
+
+
+def _user_entry_page(user_id, tag=None):
+    """Keyset page of a user's entries driven by ?cursor= and ?limit=, optionally one tag's."""
+    query = MoodEntry.query.filter_by(user_id=user_id).options(selectinload(MoodEntry.tag_links))
+    entries, next_cursor = entry_page(
+        filter_by_tag(query, user_id, tag),
+        cursor=request.args.get('cursor'),
+        limit=page_size(request.args.get('limit'), app.config['ENTRIES_PAGE_SIZE']),
+    )
+    normalize_entries(entries)
+    return entries, next_cursor
+
+
 @app.route('/logs')
+@login_required
+@cached_response
 def logs():
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
+    user_id = current_user_id()
+    tag = normalize_tag(request.args.get('tag'))
+    entries, next_cursor = _user_entry_page(user_id, tag)
+    public_total, private_total = _privacy_counts(user_id, tag)
 
-    user_id = session.get('user_id')
-    if user_id:
-        entries = MoodEntry.query.filter_by(user_id=user_id).order_by(MoodEntry.timestamp.desc()).all()
-        _normalize_entries(entries)
-    else:
-        entries = []
+    public_entries, private_entries = _split_by_privacy(entries)
+    return render_template(
+        'mood_journal/logs.html',
+        entries=entries,
+        public_entries=public_entries,
+        private_entries=private_entries,
+        next_cursor=next_cursor,
+        public_total=public_total,
+        private_total=private_total,
+        total_entries=public_total + private_total,
+        selected_tag=tag,
+        tag_stats=tag_summary(user_id),
+        page_id='home'
+    )
+
+
+@app.route('/search')
+@login_required
+def search():
+    """Ranked full-text search over the user's public entries (see search.py)."""
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    results, has_more = search_entries(
+        db.session, current_user_id(), query, page=page,
+        limit=page_size(request.args.get('limit'), app.config['SEARCH_PAGE_SIZE']),
+    )
+    return render_template(
+        'mood_journal/search.html',
+        query=query, results=results, page=max(page, 1), has_more=has_more,
+    )
+
+
+@app.route('/logs/more')
+@login_required
+def logs_more():
+    """JSON "load more" endpoint: the next page of entries after ?cursor=."""
+    entries, next_cursor = _user_entry_page(
+        current_user_id(), normalize_tag(request.args.get('tag'))
+    )
+    public_card = get_template_attribute('mood_journal/_entry_cards.html', 'public_card')
+    private_card = get_template_attribute('mood_journal/_entry_cards.html', 'private_card')
+
+    payload = []
+    for e in entries:
+        item = {
+            'id': e.id,
+            'entry_date': e.entry_date.isoformat(),
+            'is_private': e.is_private,
+        }
+        if item['is_private']:
+            item['html'] = str(private_card(e))
+        else:
+            item.update({
+                'mood_label': e.mood_label,
+                'mood_rating': e.mood_rating,
+                'notes': e.notes,
+                'timestamp': e.timestamp.isoformat() if e.timestamp else None,
+                'time_spent_seconds': e.time_spent_seconds,
+                'image_path': e.image_path,
+                'tags': e.tags,
+                'html': str(public_card(e)),
+            })
+        payload.append(item)
 
-    return render_template('mood_journal/logs.html', entries=entries, page_id='home')
+    return jsonify({'entries': payload, 'next_cursor': next_cursor})
+
+
+@app.before_request
+def hide_static_uploads():
+    """Uploads are only reachable through the authenticated /uploads route."""
+    if request.endpoint == 'static':
+        prefix = os.path.basename(app.config['UPLOAD_FOLDER']) + '/'
+        if (request.view_args or {}).get('filename', '').startswith(prefix):
+            abort(404)
+
+
+@app.route('/uploads/<path:filename>')
+def uploaded_image(filename):
+    return send_upload(filename)
 
 
 @app.route('/delete/<int:entry_id>', methods=['POST'])
+@login_required
 def delete_entry(entry_id):
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    user_id = session.get('user_id')
+    user_id = current_user_id()
     entry = MoodEntry.query.get_or_404(entry_id)
 
     if entry.user_id != user_id:
         flash('You can only delete your own entries', 'error')
         return redirect(url_for('logs'))
 
+    discard_upload(entry.image_path, app.static_folder)
     db.session.delete(entry)
     db.session.commit()
+    collect_garbage(app.config['UPLOAD_FOLDER'])
     flash('Entry deleted successfully!')
     return redirect(url_for('logs'))
 
 
 @app.route('/delete-all-entries', methods=['POST'])
+@login_required
 def delete_all_entries():
     """Delete all entries for the currently logged-in user."""
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    user_id = session.get('user_id')
-    if not user_id:
-        flash('Please log in to perform this action', 'error')
-        return redirect(url_for('login'))
+    user_id = current_user_id()
 
     # Remove all mood entries for this user
     try:
+        release_user_uploads(user_id, app.static_folder)
         MoodEntry.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+        reset_user_stats(user_id)
+        reset_weekly_summaries(user_id)
+        bump_data_version(user_id)
         db.session.commit()
+        forget_image_access()
+        collect_garbage(app.config['UPLOAD_FOLDER'])
         flash('All entries deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -312,17 +501,13 @@ def delete_all_entries():
 
 
 @app.route('/toggle-privacy/<int:entry_id>', methods=['POST'])
+@login_required
 def toggle_privacy(entry_id):
     # Support both normal form posts and AJAX requests
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest' or \
               request.headers.get('Accept', '').find('application/json') != -1
 
-    if not session.get('logged_in'):
-        if is_ajax:
-            return jsonify({'error': 'login_required'}), 401
-        return redirect(url_for('login'))
-
-    user_id = session.get('user_id')
+    user_id = current_user_id()
     entry = MoodEntry.query.get_or_404(entry_id)
     if entry.user_id != user_id:
         if is_ajax:
@@ -330,8 +515,7 @@ def toggle_privacy(entry_id):
         flash('You can only modify your own entries', 'error')
         return redirect(url_for('logs'))
 
-    # Use getattr for safe attribute access with fallback
-    entry.is_private = not getattr(entry, 'is_private', False)
+    entry.is_private = not entry.is_private
     db.session.commit()
     status = 'locked (private)' if entry.is_private else 'unlocked (public)'
     if is_ajax:
@@ -342,11 +526,10 @@ def toggle_privacy(entry_id):
 
 
 @app.route('/edit/<int:entry_id>', methods=['GET', 'POST'])
+@login_required
+@accepts_image_uploads
 def edit_entry(entry_id):
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    user_id = session.get('user_id')
+    user_id = current_user_id()
     entry = MoodEntry.query.get_or_404(entry_id)
 
     if entry.user_id != user_id:
@@ -362,13 +545,12 @@ def edit_entry(entry_id):
 
         entry.mood_rating = int(request.form.get('mood_rating', 5))
         entry.notes = request.form.get('notes')
+        if 'tags' in request.form:
+            entry.tags = parse_tags(request.form['tags'])
 
         # Handle image removal
         if request.form.get('remove_image') == '1' and entry.image_path:
-            # Delete the old image file
-            old_image_path = os.path.join(basedir, 'static', entry.image_path)
-            if os.path.exists(old_image_path):
-                os.remove(old_image_path)
+            discard_upload(entry.image_path, app.static_folder)
             entry.image_path = None
 
         # Handle new image upload
@@ -377,31 +559,108 @@ def edit_entry(entry_id):
             if file and file.filename != '' and allowed_file(file.filename):
                 # Delete old image if exists
                 if entry.image_path:
-                    old_image_path = os.path.join(basedir, 'static', entry.image_path)
-                    if os.path.exists(old_image_path):
-                        os.remove(old_image_path)
-                
-                # Save new image
-                filename = secure_filename(file.filename)
-                file_ext = filename.rsplit('.', 1)[1].lower()
-                unique_filename = f"{uuid.uuid4().hex}.{file_ext}"
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                file.save(file_path)
-                entry.image_path = os.path.join('uploads', unique_filename)
+                    discard_upload(entry.image_path, app.static_folder)
+
+                # Written (and thumbnailed) off the request thread
+                entry.image_path = save_upload(file, app.config['UPLOAD_FOLDER'])
             elif file and file.filename != '':
                 flash('Invalid file type. Please upload an image (PNG, JPG, JPEG, GIF, or WEBP).', 'error')
 
         db.session.commit()
+        collect_garbage(app.config['UPLOAD_FOLDER'])
         flash('Entry updated successfully!')
         return redirect(url_for('logs'))
 
     return render_template('mood_journal/edit.html', entry=entry)
 
 
+def _export_response(source, filename_stem):
+    """Stream `source` in the ?format= requested (csv by default) as an attachment.
+
+    Returns None for an unknown format so the caller can redirect.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return None
+    writer = FORMATS[fmt]
+    response = Response(stream_with_context(export_stream(source, fmt)))
+    response.headers["Content-Disposition"] = f"attachment; filename={filename_stem}.{writer.extension}"
+    response.headers["Content-type"] = writer.mimetype
+    return response
+
+
+def _unsupported_export_format():
+    flash('Unsupported export format.', 'error')
+    return redirect(url_for('logs'))
+
+
+_IMPORT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+
+
+def _import_format(filename):
+    """Format named by ?format=, else by the file extension or Content-Type."""
+    fmt = request.args.get('format') or request.form.get('format')
+    if not fmt and filename and '.' in filename:
+        ext = filename.rsplit('.', 1)[1].lower()
+        fmt = 'ndjson' if ext == 'jsonl' else ext
+    if not fmt:
+        fmt = _IMPORT_TYPES.get(request.mimetype)
+    return fmt if fmt in IMPORT_FORMATS else None
+
+
+@app.route('/import', methods=['POST'])
+@login_required
+def import_entries_view():
+    """Bulk-import entries from a CSV/NDJSON upload (form) or request body (API).
+
+    Form posts flash a summary and return to /logs; raw bodies get the
+    import report as JSON.
+    """
+    request.max_content_length = app.config['IMPORT_MAX_SIZE']
+    from_form = request.mimetype == 'multipart/form-data'
+    if from_form:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a CSV or NDJSON file to import.', 'error')
+            return redirect(url_for('logs'))
+        fmt, stream = _import_format(upload.filename), upload.stream
+    else:
+        fmt, stream = _import_format(None), request.stream
+
+    if fmt is None:
+        if from_form:
+            flash('Unsupported import format. Please upload a .csv or .ndjson file.', 'error')
+            return redirect(url_for('logs'))
+        return jsonify({'error': 'unsupported_format', 'formats': sorted(IMPORT_FORMATS)}), 415
+
+    try:
+        report = import_entries(current_user_id(), stream, fmt)
+    except ImportFormatError as e:
+        if from_form:
+            flash(f'Import failed: {e}', 'error')
+            return redirect(url_for('logs'))
+        return jsonify({'error': 'invalid_file', 'message': str(e)}), 400
+
+    if not from_form:
+        return jsonify(report)
+    if report['imported']:
+        flash(f"Imported {report['imported']} entries.", 'success')
+    if report['skipped']:
+        first = report['errors'][0]
+        flash(f"Skipped {report['skipped']} invalid rows (line {first['line']}: {first['error']}).", 'error')
+    if not report['imported'] and not report['skipped']:
+        flash('The file contained no entries.', 'error')
+    return redirect(url_for('logs'))
+
+
 @app.route('/export/<int:entry_id>')
 def export_single_entry(entry_id):
     # Require login normally, skip during automated tests
-    if not session.get('logged_in') and not _is_testing():
+    if not current_user_id() and not _is_testing():
         return redirect(url_for('login'))
 
     user_id = _get_user_id_for_export()
@@ -413,92 +672,34 @@ def export_single_entry(entry_id):
         return redirect(url_for('logs'))
 
     # Cannot export private entries
-    if getattr(entry, 'is_private', False):
+    if entry.is_private:
         flash('Cannot export private entries.', 'error')
         return redirect(url_for('logs'))
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    writer.writerow([
-        "Entry ID", "Date", "Mood Label", "Rating",
-        "Notes", "Time Spent (sec)", "Created At"
-    ])
-
-    ed = _to_date(entry.entry_date) or entry.entry_date
-    ed_str = ed.strftime("%Y-%m-%d") if hasattr(ed, 'strftime') else str(ed)
-
-    writer.writerow([
-        entry.id,
-        ed_str,
-        entry.mood_label,
-        entry.mood_rating,
-        entry.notes or "",
-        entry.time_spent_seconds or 0,
-        entry.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-    ])
-
-    response = make_response(output.getvalue())
-    response.headers["Content-Disposition"] = f"attachment; filename=entry_{entry.id}.csv"
-    response.headers["Content-type"] = "text/csv"
-    return response
+    response = _export_response([entry], f"entry_{entry.id}")
+    return response or _unsupported_export_format()
 
 @app.route('/export-all')
 def export_all_entries():
     # Require login normally, skip during tests
-    if not session.get('logged_in') and not _is_testing():
+    if not current_user_id() and not _is_testing():
         return redirect(url_for('login'))
 
     user_id = _get_user_id_for_export()
 
-    try:
-        entries = MoodEntry.query.filter(
-            MoodEntry.user_id == user_id,
-            MoodEntry.is_private == False
-        ).order_by(MoodEntry.entry_date.desc()).all()
-    except Exception:
-        entries = MoodEntry.query.filter(
-            MoodEntry.user_id == user_id
-        ).order_by(MoodEntry.entry_date.desc()).all()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    writer.writerow([
-        "Entry ID", "Date", "Mood Label", "Rating",
-        "Notes", "Time Spent (sec)", "Created At"
-    ])
-
-    for entry in entries:
-        ed = _to_date(entry.entry_date) or entry.entry_date
-        ed_str = ed.strftime("%Y-%m-%d") if hasattr(ed, 'strftime') else str(ed)
-
-        writer.writerow([
-            entry.id,
-            ed_str,
-            entry.mood_label,
-            entry.mood_rating,
-            entry.notes or "",
-            entry.time_spent_seconds or 0,
-            entry.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-        ])
-
-    response = make_response(output.getvalue())
-    response.headers["Content-Disposition"] = "attachment; filename=all_entries.csv"
-    response.headers["Content-type"] = "text/csv"
-    return response
-
-
-
-
-
+    entries = MoodEntry.query.filter(
+        MoodEntry.user_id == user_id,
+        MoodEntry.is_private.is_(False)
+    ).order_by(MoodEntry.entry_date.desc())
 
+    response = _export_response(entries, "all_entries")
+    return response or _unsupported_export_format()
 
 
 @app.route('/export-range')
 def export_range():
     # Require login normally, allow test suite to skip
-    if not session.get('logged_in') and not _is_testing():
+    if not current_user_id() and not _is_testing():
         return redirect(url_for('login'))
 
     user_id = _get_user_id_for_export()
@@ -517,74 +718,34 @@ def export_range():
         flash("Invalid date format.", "error")
         return redirect(url_for('logs'))
 
-    try:
-        entries = MoodEntry.query.filter(
-            MoodEntry.user_id == user_id,
-            MoodEntry.entry_date >= start_date,
-            MoodEntry.entry_date <= end_date,
-            MoodEntry.is_private == False
-        ).order_by(MoodEntry.entry_date.asc()).all()
-    except Exception:
-        entries = MoodEntry.query.filter(
-            MoodEntry.user_id == user_id,
-            MoodEntry.entry_date >= start_date,
-            MoodEntry.entry_date <= end_date
-        ).order_by(MoodEntry.entry_date.asc()).all()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    writer.writerow([
-        "Entry ID", "Date", "Mood Label", "Rating",
-        "Notes", "Time Spent (sec)", "Created At"
-    ])
-
-    for entry in entries:
-        ed = _to_date(entry.entry_date) or entry.entry_date
-        ed_str = ed.strftime("%Y-%m-%d") if hasattr(ed, 'strftime') else str(ed)
-
-        writer.writerow([
-            entry.id,
-            ed_str,
-            entry.mood_label,
-            entry.mood_rating,
-            entry.notes or "",
-            entry.time_spent_seconds or 0,
-            entry.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-        ])
-
-    response = make_response(output.getvalue())
-    response.headers["Content-Disposition"] = f"attachment; filename=entries_{start}_to_{end}.csv"
-    response.headers["Content-type"] = "text/csv"
-    return response
-
-
-
-
-
-
-
-
-
+    entries = MoodEntry.query.filter(
+        MoodEntry.user_id == user_id,
+        MoodEntry.is_private.is_(False),
+        MoodEntry.entry_date >= start_date,
+        MoodEntry.entry_date <= end_date
+    ).order_by(MoodEntry.entry_date.asc())
 
+    response = _export_response(entries, f"entries_{start}_to_{end}")
+    return response or _unsupported_export_format()
 
 
 @app.route('/logout')
 def logout():
     session.clear()
+    regenerate_session()
     return redirect(url_for('login'))
 
-@app.route('/dashboard')
-def dashboard():
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
+BUCKET_MESSAGES = {
+    "terrible": "Rough days, please be kind to yourself.",
+    "bad": "Tougher days, take note of what drains you.",
+    "neutral": "Pretty steady, a neutral baseline.",
+    "good": "Plenty of good days!",
+    "excellent": "Lots of amazing days, celebrate what’s working.",
+}
 
-    user_id = session.get('user_id')
-    if not user_id:
-        flash('Please log in to view dashboard', 'error')
-        return redirect(url_for('login'))
 
-    today = datetime.now()
+def _dashboard_month(today):
+    """(year, month) from ?year=&month=, defaulting to today's month."""
     try:
         year = int(request.args.get('year', today.year))
         month = int(request.args.get('month', today.month))
@@ -595,249 +756,81 @@ def dashboard():
     # Normalize month/year so month wraps across years (e.g., month=13 -> month=1, year+1)
     # Convert to a zero-based month index and recompute year/month
     total_months = year * 12 + (month - 1)
-    norm_year = total_months // 12
-    norm_month = (total_months % 12) + 1
-    year = norm_year
-    month = norm_month
-
-    calendar.setfirstweekday(calendar.SUNDAY)
-
-    cal = calendar.monthcalendar(year, month)
+    return total_months // 12, (total_months % 12) + 1
 
-    # start is first day of the normalized month; end is first day of next month
-    start_date = date(year, month, 1)
-    # compute next month/year using the same normalization logic
-    next_total = year * 12 + (month - 1) + 1
-    next_year = next_total // 12
-    next_month = (next_total % 12) + 1
-    end_date = date(next_year, next_month, 1)
 
-    entries = MoodEntry.query.filter(
-        MoodEntry.user_id == user_id,
-        MoodEntry.entry_date >= start_date,
-        MoodEntry.entry_date < end_date
-    ).order_by(MoodEntry.entry_date).all()
-
-    mood_lookup = {}
-    for entry in entries:
-        ed = _to_date(entry.entry_date)
-        if ed is not None:
-            mood_lookup[ed] = entry.mood_rating
-
-    # Original numeric bucket function (used for charts)
-    def bucket(r):
-        if r <= 2:
-            return 1
-        if r <= 4:
-            return 2
-        if r <= 6:
-            return 3
-        if r <= 8:
-            return 4
-        return 5
+def _has_logged(user_id, day):
+    return MoodEntry.query.filter_by(user_id=user_id, entry_date=day).first() is not None
 
-    selected_filter = request.args.get("filter") or None
 
-    # Named bucket for calendar/filter
-    def get_bucket(r):
-        if r is None:
-            return None
-        if r <= 2:
-            return "terrible"
-        if r <= 4:
-            return "bad"
-        if r <= 6:
-            return "neutral"
-        if r <= 8:
-            return "good"
-        return "excellent"
-
-    # Build full calendar data
-    calendar_dates = []
-    for week in cal:
-        row = []
-        for d in week:
-            if d == 0:
-                row.append((None, None, None))
-            else:
-                cell_date = date(year, month, d)
-                mood = mood_lookup.get(cell_date)
-                bucket_name = get_bucket(mood) if mood else None
-                row.append((cell_date, mood, bucket_name))
-        calendar_dates.append(row)
-
-    # Count bucket totals
-    bucket_counts = {
-        "terrible": 0,
-        "bad": 0,
-        "neutral": 0,
-        "good": 0,
-        "excellent": 0,
-    }
+def _selected_bucket():
+    """The ?filter= mood bucket, or None when absent or not a bucket name."""
+    selected = request.args.get("filter") or None
+    return selected if selected in BUCKETS else None
 
-    for week in calendar_dates:
-        for day, mood, bucket_name in week:
-            if bucket_name:
-                bucket_counts[bucket_name] += 1
 
+def _bucket_summary(bucket_counts, selected_filter):
+    """The summary line's bucket, day count, label and message."""
     # If no moods at all, default summary to neutral/0
     if any(bucket_counts.values()):
-        summary_bucket_name = selected_filter if selected_filter else max(
+        name = selected_filter if selected_filter else max(
             bucket_counts, key=lambda b: bucket_counts[b]
         )
     else:
-        summary_bucket_name = selected_filter or "neutral"
-
-    bucket_label_map = {
-        "terrible": "Terrible (1–2)",
-        "bad": "Bad (3–4)",
-        "neutral": "Neutral (5–6)",
-        "good": "Good (7–8)",
-        "excellent": "Excellent (9–10)",
-    }
-
-    bucket_msg_map = {
-        "terrible": "Rough days, please be kind to yourself.",
-        "bad": "Tougher days, take note of what drains you.",
-        "neutral": "Pretty steady, a neutral baseline.",
-        "good": "Plenty of good days!",
-        "excellent": "Lots of amazing days, celebrate what’s working.",
+        name = selected_filter or "neutral"
+    return {
+        'bucket': name,
+        'days': bucket_counts.get(name, 0),
+        'label': BUCKET_LABELS[name],
+        'message': BUCKET_MESSAGES[name],
     }
 
-    summary_days = bucket_counts.get(summary_bucket_name, 0)
-    summary_label = bucket_label_map[summary_bucket_name]
-    summary_message = bucket_msg_map[summary_bucket_name]
-    summary_day_word = "day" if summary_days == 1 else "days"
-
-    total_entries = len(entries)
-    average_mood = (
-        sum(e.mood_rating for e in entries) / total_entries
-        if total_entries > 0 else 0
-    )
-
-    mood_distribution = [0] * 5
-    for e in entries:
-        mood_distribution[bucket(e.mood_rating) - 1] += 1
-
-    week_start = (today - timedelta(days=today.weekday())).date()
-    week_entries = MoodEntry.query.filter(
-        MoodEntry.user_id == user_id,
-        MoodEntry.entry_date >= week_start,
-        MoodEntry.entry_date < week_start + timedelta(days=7)
-    ).all()
-    week_sums = [0] * 7
-    week_counts = [0] * 7
-    for e in week_entries:
-        ed = _to_date(e.entry_date)
-        if ed is None:
-            continue
-        idx = ed.weekday()
-        week_sums[idx] += e.mood_rating
-        week_counts[idx] += 1
-
-    weekly_trend = [
-        round(week_sums[i] / week_counts[i], 1) if week_counts[i] else None
-        for i in range(7)
-    ]
-
-    last7 = []
-    for delta in range(6, -1, -1):
-        d = (today - timedelta(days=delta)).date()
-        day_vals = [e.mood_rating for e in entries if _to_date(e.entry_date) == d]
-        last7.append(round(sum(day_vals) / len(day_vals), 1) if day_vals else None)
-
-    #  STREAK CALCULATION (FIXED)
-    # -------------------------------------
-    all_entries = MoodEntry.query.filter_by(user_id=user_id).all()
-
-    # Normalize and group by date (ignore duplicates)
-    cleaned_dates = { _to_date(e.entry_date) for e in all_entries if _to_date(e.entry_date) }
-
-    # Remove None and sort
-    entry_dates = sorted(d for d in cleaned_dates if d is not None)
-
-    current_streak = 0
-    longest_streak = 0
-
-    if entry_dates:
-        # Longest streak
-        streak = 1
-        for i in range(1, len(entry_dates)):
-            if entry_dates[i] == entry_dates[i-1] + timedelta(days=1):
-                streak += 1
-            else:
-                longest_streak = max(longest_streak, streak)
-                streak = 1
-        longest_streak = max(longest_streak, streak)
-
-        # Current streak
-        today_date = datetime.utcnow().date()  # <<< IMPORTANT FIX
-        if entry_dates[-1] == today_date:
-            current_streak = 1
-            i = len(entry_dates) - 1
-            while i > 0 and entry_dates[i] == entry_dates[i-1] + timedelta(days=1):
-                current_streak += 1
-                i -= 1
-        elif entry_dates[-1] == today_date - timedelta(days=1):
-            current_streak = 1
-            i = len(entry_dates) - 1
-            while i > 0 and entry_dates[i] == entry_dates[i-1] + timedelta(days=1):
-                current_streak += 1
-                i -= 1
-        else:
-            current_streak = 0
-
-    #  BADGE LOGIC
-
-    badges = []
-
-    # Streak badges
-    streak_milestones = [1, 3, 7, 14, 30]
-    for m in streak_milestones:
-        if current_streak >= m:
-            if m == 1:
-                badges.append("🥇 1-Day Streak")
-            elif m == 3:
-                badges.append("🥈 3-Day Streak")
-            elif m == 7:
-                badges.append("🔥 7-Day Streak")
-            elif m == 14:
-                badges.append("✨ 14-Day Streak")
-            elif m == 30:
-                badges.append("🌟 30-Day Streak")
-
-    # Total entry count badges
-    entry_milestones = [10, 25, 50, 100]
-    for m in entry_milestones:
-        if total_entries >= m:
-            badges.append(f"📘 {m} Entries")
 
-    # Sort badges
-    badges.sort()
+@app.route('/dashboard')
+@login_required
+@cached_response
+def dashboard():
+    user_id = current_user_id()
 
+    today = datetime.now()
+    year, month = _dashboard_month(today)
+
+    selected_tag = normalize_tag(request.args.get('tag'))
+    view = month_view(user_id, year, month, today.date(), tag=selected_tag)
+    calendar_dates = view['calendar_dates']
+    bucket_counts = view['bucket_counts']
+
+    selected_filter = _selected_bucket()
+    summary = _bucket_summary(bucket_counts, selected_filter)
+    summary_days = summary['days']
+    summary_label = summary['label']
+    summary_message = summary['message']
+    summary_day_word = "day" if summary_days == 1 else "days"
 
-    # --- AUTO DAILY REMINDER FOR DASHBOARD ---
+    #  STREAKS AND BADGES (materialized in user_stats, see streaks.py)
     today_date = datetime.utcnow().date()
-    has_logged_today = any(_to_date(e.entry_date) == today_date for e in all_entries)
-
-
-
+    streaks = streak_summary(user_id, today_date)
+    current_streak = streaks['current_streak']
+    longest_streak = streaks['longest_streak']
+    badges = streaks['badges']
 
+    # --- AUTO DAILY REMINDER FOR DASHBOARD ---
     reminder_banner = None
-    if not has_logged_today:
+    if not _has_logged(user_id, today_date):
         reminder_banner = "You haven't logged your mood today"
 
     return render_template(
         'mood_journal/dashboard.html',
         calendar_dates=calendar_dates,
         current_month=date(year, month, 1).strftime('%B %Y'),
-        average_mood=average_mood,
-        total_entries=total_entries,
-        mood_distribution=mood_distribution,
-        weekly_trend=weekly_trend,
-        last7_trend=last7,
+        average_mood=view['average_mood'],
+        total_entries=view['total_entries'],
+        mood_distribution=view['mood_distribution'],
+        weekly_trend=view['weekly_trend'],
+        last7_trend=view['last7_trend'],
         month=month,
         year=year,
+        selected_filter=selected_filter,
         summary_days=summary_days,
         summary_day_word=summary_day_word,
         summary_label=summary_label,
@@ -845,20 +838,129 @@ def dashboard():
         current_streak=current_streak,
         longest_streak=longest_streak,
         badges=badges,
+        selected_tag=selected_tag,
+        tag_stats=tag_summary(user_id, *month_bounds(year, month)),
         reminder_banner=reminder_banner
     )
 
 
+@app.route('/dashboard/filter')
+@login_required
+@cached_response
+def dashboard_filter():
+    """JSON for switching the calendar's mood filter without reloading the page.
+
+    Returns the days of the month whose calendar mood is in ?filter= (all days
+    with entries when it is empty), selected by the query itself, plus the
+    summary line for that bucket.
+    """
+    year, month = _dashboard_month(datetime.now())
+    selected_filter = request.args.get("filter") or None
+    if selected_filter is not None and selected_filter not in BUCKETS:
+        return jsonify({'error': 'unknown_filter', 'buckets': BUCKETS}), 400
+    tag = normalize_tag(request.args.get('tag'))
+
+    days = bucket_days(current_user_id(), year, month, selected_filter, tag=tag)
+    if selected_filter:
+        bucket_counts = {selected_filter: len(days)}
+    else:
+        bucket_counts = dict.fromkeys(BUCKETS, 0)
+        for _, mood in days:
+            bucket_counts[bucket_name(mood)] += 1
+
+    return jsonify({
+        'year': year,
+        'month': month,
+        'filter': selected_filter,
+        'tag': tag,
+        'dates': [{'date': day.isoformat(), 'mood': mood} for day, mood in days],
+        'summary': _bucket_summary(bucket_counts, selected_filter),
+    })
+
+
+# ----------------------------------------------------------------------
+# Dashboard JSON API.  Each part of the dashboard is its own endpoint so it
+# can be fetched and revalidated independently (ETags come from
+# cached_response): month navigation only needs /month, and streaks do not
+# depend on the month at all.  Payloads carry
+# DASHBOARD_API_VERSION; incompatible changes bump it.
+# ----------------------------------------------------------------------
+
+DASHBOARD_API_VERSION = 1
+
+
+@app.route('/api/dashboard/month')
+@login_required
+@cached_response
+def api_dashboard_month():
+    """Calendar, counts, average, distribution, summary and tags for one month."""
+    year, month = _dashboard_month(datetime.now())
+    tag = normalize_tag(request.args.get('tag'))
+    selected_filter = _selected_bucket()
+    user_id = current_user_id()
+    view = month_summary(user_id, year, month, tag=tag)
+    return jsonify({
+        'version': DASHBOARD_API_VERSION,
+        'year': year,
+        'month': month,
+        'title': date(year, month, 1).strftime('%B %Y'),
+        'filter': selected_filter,
+        'tag': tag,
+        'calendar': [
+            [
+                {'date': day.isoformat(), 'mood': mood, 'bucket': bucket} if day else None
+                for day, mood, bucket in week
+            ]
+            for week in view['calendar_dates']
+        ],
+        'bucket_counts': view['bucket_counts'],
+        'total_entries': view['total_entries'],
+        'average_mood': round(view['average_mood'], 1),
+        'mood_distribution': view['mood_distribution'],
+        'summary': _bucket_summary(view['bucket_counts'], selected_filter),
+        'tags': tag_summary(user_id, *month_bounds(year, month)),
+    })
+
+
+@app.route('/api/dashboard/streaks')
+@login_required
+@cached_response
+def api_dashboard_streaks():
+    """Current and longest streak, badges, and whether today has an entry."""
+    user_id = current_user_id()
+    today_date = datetime.utcnow().date()
+    streaks = streak_summary(user_id, today_date)
+    return jsonify({
+        'version': DASHBOARD_API_VERSION,
+        'current_streak': streaks['current_streak'],
+        'longest_streak': streaks['longest_streak'],
+        'badges': streaks['badges'],
+        'logged_today': _has_logged(user_id, today_date),
+    })
+
+
+@app.route('/api/dashboard/trends')
+@login_required
+@cached_response
+def api_dashboard_trends():
+    """Daily averages for this week (Mon→Sun) and the last 7 days."""
+    today = datetime.now().date()
+    tag = normalize_tag(request.args.get('tag'))
+    trends = recent_trends(current_user_id(), today, tag=tag)
+    return jsonify({
+        'version': DASHBOARD_API_VERSION,
+        'today': today.isoformat(),
+        'tag': tag,
+        'week_start': trends['week_start'].isoformat(),
+        'weekly_trend': trends['weekly_trend'],
+        'last7_trend': trends['last7_trend'],
+    })
+
 
 @app.route('/account', methods=['GET', 'POST'])
+@login_required
 def account():
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    user = User.query.get(session.get('user_id'))
-    if not user:
-        session.clear()
-        return redirect(url_for('login'))
+    user = get_current_user()
 
     if request.method == 'POST':
         action = request.form.get('action')
@@ -872,12 +974,6 @@ def account():
                 flash('Username cannot be empty', 'error')
                 return redirect(url_for('account'))
 
-            # Check if username is already taken by another user
-            existing_user = User.query.filter_by(username=new_username).first()
-            if existing_user and existing_user.id != user.id:
-                flash('Username already taken. Please choose a different username.', 'error')
-                return redirect(url_for('account'))
-
             # Validate email
             if not new_email:
                 flash('Email cannot be empty', 'error')
@@ -888,10 +984,10 @@ def account():
                 flash('Please enter a valid email address', 'error')
                 return redirect(url_for('account'))
 
-            # Check if email is already taken by another user
-            existing_email = User.query.filter_by(email=new_email).first()
-            if existing_email and existing_email.id != user.id:
-                flash('Email already taken. Please use a different email address.', 'error')
+            # Check if username or email is already taken by another user
+            conflict = _profile_conflict(user, new_username, new_email)
+            if conflict:
+                flash(conflict, 'error')
                 return redirect(url_for('account'))
 
             # Update username and email
@@ -914,15 +1010,24 @@ def account():
                 flash('New passwords do not match or are empty', 'error')
                 return redirect(url_for('account'))
 
+            if is_pin_shaped(new):
+                flash('Password cannot be just a 4-digit number', 'error')
+                return redirect(url_for('account'))
+
             user.set_password(new)
             db.session.commit()
             flash('Password updated successfully', 'success')
             return redirect(url_for('account'))
 
         if action == 'delete_account':
+            release_user_uploads(user.id, app.static_folder)
             MoodEntry.query.filter_by(user_id=user.id).delete()
+            reset_user_stats(user.id)
+            reset_weekly_summaries(user.id)
             db.session.delete(user)
             db.session.commit()
+            forget_image_access()
+            collect_garbage(app.config['UPLOAD_FOLDER'])
             session.clear()
             flash('Account deleted successfully', 'success')
             return redirect(url_for('login'))
@@ -931,91 +1036,122 @@ def account():
 
 
 @app.route('/resources')
+@login_required
 def resources():
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-    
     return render_template('mood_journal/resources.html')
 
 
+check_password_limiter = TokenBucketLimiter(
+    app.config['CHECK_PASSWORD_BURST'], app.config['CHECK_PASSWORD_RATE']
+)
+
+
 @app.route('/check-password', methods=['POST'])
 def check_password():
-    if not session.get('logged_in'):
-        return {'correct': False}
-
-    user = User.query.get(session.get('user_id'))
+    user = get_current_user()
     if not user:
         return {'correct': False}
 
     data = request.get_json()
     password = data.get('password', '')
 
+    # Same password verified recently: no hash needed
+    if check_verified_token(session.get('password_verified'), user, password):
+        return {'correct': True}
+
+    allowed, retry_after = check_password_limiter.acquire(user.id)
+    if not allowed:
+        return {'correct': False, 'retry_after': round(retry_after, 1)}, 429
+
     correct = user.check_password(password)
+    if correct:
+        session['password_verified'] = issue_verified_token(user, password)
     return {'correct': correct}
 
 
 @app.route('/weekly-summaries')
+@login_required
+@cached_response
 def weekly_summaries():
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
+    user_id = current_user_id()
+    ensure_weekly_summaries(user_id, get_user_stats(user_id)['total_entries'])
+
+    before = to_date(request.args.get('before'))
+    expanded = {d for d in (to_date(v) for v in request.args.getlist('expand')) if d is not None}
+    rows, next_before = summaries_page(
+        user_id, before=before,
+        limit=page_size(request.args.get('limit'), app.config['WEEKS_PAGE_SIZE']),
+    )
 
-    from collections import defaultdict
+    # Highs/lows for every week on the page in one lookup
+    ids = {r.min_entry_id for r in rows} | {r.max_entry_id for r in rows}
+    by_id = {e.id: e for e in MoodEntry.query.filter(MoodEntry.id.in_(ids))} if ids else {}
 
-    user_id = session.get('user_id')
+    # Individual entries only for the weeks the user has expanded
+    week_entries = defaultdict(list)
+    shown = [r.week_start for r in rows if r.week_start in expanded]
+    if shown:
+        for e in MoodEntry.query.filter(
+            MoodEntry.user_id == user_id,
+            or_(*[MoodEntry.entry_date.between(w, w + timedelta(days=6)) for w in shown]),
+        ).order_by(MoodEntry.entry_date, MoodEntry.id):
+            week_entries[week_start_for(e.entry_date)].append(e)
 
-    entries = MoodEntry.query.filter_by(user_id=user_id).order_by(MoodEntry.entry_date).all()
+    summaries = []
+    for r in rows:
+        summaries.append({
+            'week_start': r.week_start,
+            'week_end': r.week_start + timedelta(days=6),
+            'total': r.entry_count,
+            'average': round(r.rating_sum / r.entry_count, 1) if r.entry_count else None,
+            'highest': by_id.get(r.max_entry_id),
+            'lowest': by_id.get(r.min_entry_id),
+            'expanded': r.week_start in expanded,
+            'entries': week_entries.get(r.week_start, []),
+        })
 
-    weeks = defaultdict(list)
-    for e in entries:
-        d = _to_date(e.entry_date)
-        if d is None:
-            # skip entries with unparseable dates
-            continue
-        week_start = d - timedelta(days=d.weekday())
-        weeks[week_start].append(e)
+    return render_template(
+        'mood_journal/weekly_summaries.html',
+        summaries=summaries,
+        next_before=next_before,
+        expanded=sorted(expanded),
+        before=before,
+    )
 
-    summaries = []
-    for week_start in sorted(weeks.keys(), reverse=True):
-        week_entries = weeks[week_start]
-        # Normalize entry_date on the entries so templates can safely call .strftime
-        _normalize_entries(week_entries)
-        total = len(week_entries)
-        avg = round(sum(e.mood_rating for e in week_entries) / total, 1) if total else None
 
-        highest = max(week_entries, key=lambda x: x.mood_rating) if total else None
-        lowest = min(week_entries, key=lambda x: x.mood_rating) if total else None
+# When the entry form was shown travels in the form rather than the session,
+# so showing it writes nothing server-side; it is signed so the client cannot
+# choose its own time_spent_seconds.
+def _entry_started_serializer():
+    return URLSafeTimedSerializer(app.secret_key, salt='entry-started-at')
 
-        summaries.append({
-            'week_start': week_start,
-            'week_end': week_start + timedelta(days=6),
-            'total': total,
-            'average': avg,
-            'highest': highest,
-            'lowest': lowest,
-            'entries': week_entries,
-        })
 
-    return render_template('mood_journal/weekly_summaries.html', summaries=summaries)
+def _entry_started_token(user_id):
+    return _entry_started_serializer().dumps(user_id)
+
+
+def _time_spent_since(token, user_id):
+    """Seconds since the form carrying `token` was shown, capped; 0 if invalid."""
+    try:
+        signed_for, started = _entry_started_serializer().loads(token or '', return_timestamp=True)
+    except BadSignature:
+        return 0
+    if signed_for != user_id:
+        return 0
+    elapsed = (datetime.now(timezone.utc) - started).total_seconds()
+    return min(max(int(elapsed), 0), MAX_TIME_SPENT)
 
 
 @app.route("/mood-journal", methods=["GET", "POST"])
+@login_required
+@accepts_image_uploads
 def mood_journal():
     from datetime import datetime
 
-    if not session.get('logged_in'):
-        return redirect(url_for('login'))
-
-    user_id = session.get('user_id')
-    if not user_id:
-        flash('Please log in to create mood entries', 'error')
-        return redirect(url_for('login'))
+    user_id = current_user_id()
 
     if request.method == "POST":
-        start_time = session.get('entry_start_time')
-        time_spent = 0
-        if start_time:
-            time_spent = int((datetime.utcnow() - datetime.fromisoformat(start_time)).total_seconds())
-            session.pop('entry_start_time', None)
+        time_spent = _time_spent_since(request.form.get('entry_started_at'), user_id)
 
         title = request.form.get("title")
         date_str = request.form.get("date")
@@ -1027,14 +1163,8 @@ def mood_journal():
         if 'image' in request.files:
             file = request.files['image']
             if file and file.filename != '' and allowed_file(file.filename):
-                # Generate unique filename to prevent conflicts
-                filename = secure_filename(file.filename)
-                file_ext = filename.rsplit('.', 1)[1].lower()
-                unique_filename = f"{uuid.uuid4().hex}.{file_ext}"
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                file.save(file_path)
-                # Store relative path for database
-                image_path = os.path.join('uploads', unique_filename)
+                # Written (and thumbnailed) off the request thread
+                image_path = save_upload(file, app.config['UPLOAD_FOLDER'])
             elif file and file.filename != '':
                 flash('Invalid file type. Please upload an image (PNG, JPG, JPEG, GIF, or WEBP).', 'error')
 
@@ -1065,16 +1195,16 @@ def mood_journal():
             time_spent_seconds=time_spent,
             image_path=image_path
         )
+        new_entry.tags = parse_tags(request.form.get("tags"))
 
         db.session.add(new_entry)
         db.session.commit()
         return redirect("/mood-journal")
 
-    session['entry_start_time'] = datetime.utcnow().isoformat()
-
-    entries = MoodEntry.query.filter_by(user_id=user_id).order_by(MoodEntry.timestamp.desc()).all()
-    _normalize_entries(entries)
-    return render_template("mood_journal/index.html", entries=entries)
+    # The entry form does not list history; /logs pages through it instead.
+    return render_template(
+        "mood_journal/index.html", entry_started_at=_entry_started_token(user_id)
+    )
 
 
 def seed_test_entries():
@@ -1122,6 +1252,23 @@ def seed_test_entries():
 def init_db():
     with app.app_context():
         db.create_all()
+        upgrade_schema(db.engine)
+
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute every user's streak/badge state and weekly rollups from their mood entries."""
+    count = rebuild_all_user_stats()
+    weeks = rebuild_all_weekly_summaries()
+    print(f"Rebuilt streak stats for {count} user(s) and {weeks} weekly summaries.")
+
+
+@app.cli.command('gc-uploads')
+def gc_uploads_command():
+    """Delete stored images that no entry references any more."""
+    removed = collect_garbage(app.config['UPLOAD_FOLDER'])
+    wait_for_uploads()
+    print(f"Removed {removed} unreferenced upload(s).")
 
 
 if __name__ == '__main__':
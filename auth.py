@@ -0,0 +1,64 @@
+"""Who is making the request.
+
+`load_current_user` (a before_request hook) notes the session's user id;
+`get_current_user()` loads that `User` on first use and keeps it for the rest
+of the request, so a request reads the users table at most once.
+
+`login_required` replaces the per-view ``if not session.get('logged_in')``
+checks.  Anonymous visitors, and sessions whose user no longer exists, are
+sent to the login page, or get a 401 JSON error if they asked for JSON or
+called something under /api/.  The check loads the user through
+`get_current_user()`, so a view behind it always has a `User` and the load
+is shared with the view.  Nothing about users is cached across requests: an
+account deleted by another worker is noticed on its next request.
+"""
+from functools import wraps
+
+from flask import g, jsonify, redirect, request, session, url_for
+
+from extensions import db
+from models import User
+
+_UNLOADED = object()
+
+
+def load_current_user():
+    g.user_id = session.get('user_id') if session.get('logged_in') else None
+    g.user = _UNLOADED
+
+
+def current_user_id():
+    """The logged-in user's id, or None."""
+    if 'user_id' not in g:
+        load_current_user()
+    return g.user_id
+
+
+def get_current_user():
+    """The logged-in `User` (None if anonymous or deleted), loaded once per request."""
+    user_id = current_user_id()
+    if g.user is _UNLOADED:
+        g.user = db.session.get(User, user_id) if user_id else None
+    return g.user
+
+
+def _wants_json():
+    return (
+        request.path.startswith('/api/')
+        or request.is_json
+        or request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+        or request.accept_mimetypes.best == 'application/json'
+    )
+
+
+def login_required(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if get_current_user() is not None:
+            return view(*args, **kwargs)
+        if current_user_id():
+            session.clear()
+        if _wants_json():
+            return jsonify({'error': 'login_required'}), 401
+        return redirect(url_for('login'))
+    return wrapped
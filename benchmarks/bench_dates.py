@@ -0,0 +1,82 @@
+"""Micro-benchmark: per-row `_to_date` (as it was in app.py) vs dates.py.
+
+    python benchmarks/bench_dates.py [rows]
+
+Columns of typed `date` values (what the ORM returns for the Date column)
+and of legacy ISO datetime strings and YYYYMMDD integers are normalized.
+Per-row `to_date` parses every value, so comparing it with
+`normalize_dates` isolates the per-distinct-value memo.  The legacy columns
+are built with 1, 3 and 30 rows per distinct value: one entry a day across
+one user's history, a few a day, and an export spanning many users.
+"""
+import os
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dates import normalize_dates, to_date  # noqa: E402
+
+
+def legacy_to_date(val):
+    """The original per-row normalizer, kept verbatim as the baseline."""
+    if isinstance(val, date):
+        return val
+    if isinstance(val, datetime):
+        return val.date()
+    if isinstance(val, str):
+        s = val.strip()
+        try:
+            return date.fromisoformat(s)
+        except Exception:
+            pass
+        try:
+            return datetime.fromisoformat(s).date()
+        except Exception:
+            pass
+        if s.isdigit():
+            if len(s) == 8:
+                try:
+                    return date(int(s[:4]), int(s[4:6]), int(s[6:8]))
+                except Exception:
+                    pass
+            try:
+                return datetime.fromtimestamp(int(s)).date()
+            except Exception:
+                pass
+        return None
+    if isinstance(val, int):
+        s = str(val)
+        if len(s) == 8:
+            try:
+                return date(int(s[:4]), int(s[4:6]), int(s[6:8]))
+            except Exception:
+                pass
+        try:
+            return datetime.fromtimestamp(val).date()
+        except Exception:
+            return None
+    return None
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    start = date(2020, 1, 1)
+    columns = {'typed date': [start + timedelta(days=i) for i in range(rows)]}
+    for per_day in (1, 3, 30):
+        days = [start + timedelta(days=i // per_day) for i in range(rows)]
+        columns[f'iso str, {per_day}/value'] = [d.isoformat() + "T12:00:00" for d in days]
+        columns[f'yyyymmdd int, {per_day}/value'] = [int(d.strftime("%Y%m%d")) for d in days]
+    print(f"{rows} values per column (best of 5, ms)")
+    print(f"{'column':24s} {'per-row legacy':>15s} {'per-row to_date':>16s} {'normalize_dates':>16s}")
+    for name, values in columns.items():
+        old = min(timeit.repeat(lambda: [legacy_to_date(v) for v in values], number=1, repeat=5))
+        new = min(timeit.repeat(lambda: [to_date(v) for v in values], number=1, repeat=5))
+        batch = min(timeit.repeat(lambda: normalize_dates(values), number=1, repeat=5))
+        assert normalize_dates(values) == [legacy_to_date(v) for v in values]
+        print(f"{name:24s} {old * 1000:15.1f} {new * 1000:16.1f} {batch * 1000:16.1f}")
+
+
+if __name__ == '__main__':
+    main()
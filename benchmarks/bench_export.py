@@ -0,0 +1,112 @@
+"""Memory profile of CSV export: streamed (exports.export_stream) vs buffered.
+
+    python benchmarks/bench_export.py [rows]
+
+Fills a throwaway SQLite file with `rows` entries for one user, then exports
+them twice.  The streamed run samples process RSS every 100k rows while the
+response is being consumed; the buffered run reproduces the old
+`.all()` + StringIO + getvalue() path and reports RSS once it is built.
+The streamed run goes first so the buffered run's growth cannot hide in it.
+"""
+import csv
+import io
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from exports import EXPORT_HEADER, export_stream  # noqa: E402
+from extensions import db  # noqa: E402
+from models import MoodEntry  # noqa: E402
+
+INSERT_SQL = (
+    "INSERT INTO mood_entries (user_id, entry_date, mood_rating, mood_label, notes, "
+    "time_spent_seconds, timestamp) VALUES (1, ?, ?, 'Bench', ?, 30, ?)"
+)
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def populate(engine, rows):
+    db.metadata.create_all(engine)
+    rng = random.Random(1)
+    start = date(2000, 1, 1)
+    with engine.begin() as conn:
+        batch = []
+        for i in range(rows):
+            d = start + timedelta(days=i % 9000)
+            batch.append((d.isoformat(), rng.randint(1, 10), 'note %d ' % i + 'x' * 60,
+                          datetime(d.year, d.month, d.day).isoformat(' ')))
+            if len(batch) == 20_000:
+                conn.exec_driver_sql(INSERT_SQL, batch)
+                batch = []
+        if batch:
+            conn.exec_driver_sql(INSERT_SQL, batch)
+
+
+def streamed(session):
+    query = session.query(MoodEntry).filter(MoodEntry.user_id == 1).order_by(MoodEntry.entry_date)
+    total = 0
+    next_sample = 0
+    samples = []
+    t0 = time.perf_counter()
+    for chunk in export_stream(query, 'csv'):
+        total += len(chunk)
+        # sample about every 10 MB of output (~85k rows)
+        if total >= next_sample:
+            samples.append(rss_mb())
+            next_sample += 10 * 2**20
+    elapsed = time.perf_counter() - t0
+    print(f"streamed : {total / 2**20:7.1f} MB in {elapsed:5.1f}s, "
+          f"RSS samples (MB): {', '.join('%.0f' % s for s in samples)}")
+
+
+def buffered(session):
+    t0 = time.perf_counter()
+    entries = session.query(MoodEntry).filter(MoodEntry.user_id == 1).order_by(MoodEntry.entry_date).all()
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(EXPORT_HEADER)
+    for entry in entries:
+        writer.writerow([
+            entry.id,
+            entry.entry_date.strftime("%Y-%m-%d"),
+            entry.mood_label,
+            entry.mood_rating,
+            entry.notes or "",
+            entry.time_spent_seconds or 0,
+            entry.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        ])
+    body = output.getvalue()
+    elapsed = time.perf_counter() - t0
+    print(f"buffered : {len(body) / 2**20:7.1f} MB in {elapsed:5.1f}s, RSS after build: {rss_mb():.0f} MB")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        populate(engine, rows)
+        print(f"{rows} rows, baseline RSS {rss_mb():.0f} MB")
+        with Session(engine) as session:
+            streamed(session)
+        with Session(engine) as session:
+            buffered(session)
+
+
+if __name__ == '__main__':
+    main()
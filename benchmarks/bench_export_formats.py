@@ -0,0 +1,63 @@
+"""Throughput and output size of each export format.
+
+    python benchmarks/bench_export_formats.py [rows]
+
+Exports the same `rows` entries through `exports.export_stream()` in every
+registered format and reports rows/sec, output size, and (for the columnar
+format) how long `read_columnar()` takes to load it back compared with
+re-parsing the CSV.
+"""
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from bench_export import populate  # noqa: E402
+from exports import FORMATS, export_stream, read_columnar  # noqa: E402
+from models import MoodEntry  # noqa: E402
+
+
+def run_format(session, fmt):
+    query = session.query(MoodEntry).filter(MoodEntry.user_id == 1).order_by(MoodEntry.entry_date)
+    t0 = time.perf_counter()
+    chunks = list(export_stream(query, fmt))
+    elapsed = time.perf_counter() - t0
+    if chunks and isinstance(chunks[0], str):
+        body = "".join(chunks).encode()
+    else:
+        body = b"".join(chunks)
+    return body, elapsed
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        populate(engine, rows)
+        outputs = {}
+        print(f"{rows} rows")
+        for fmt in FORMATS:
+            with Session(engine) as session:
+                body, elapsed = run_format(session, fmt)
+            outputs[fmt] = body
+            print(f"{fmt:9s} {rows / elapsed:12,.0f} rows/s  {len(body) / 2**20:8.1f} MB")
+
+        t0 = time.perf_counter()
+        parsed = list(csv.reader(io.StringIO(outputs['csv'].decode())))
+        csv_load = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        columns = read_columnar(outputs['columnar'])
+        col_load = time.perf_counter() - t0
+        assert len(parsed) - 1 == len(columns['id']) == rows
+        print(f"load back: csv.reader {csv_load:.2f}s, read_columnar {col_load:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
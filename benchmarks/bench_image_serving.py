@@ -0,0 +1,108 @@
+"""Per-request cost of the authenticated /uploads route vs the plain static route.
+
+    python benchmarks/bench_image_serving.py [requests] [entries]
+
+Creates a throwaway database with `entries` entries for one user (each with
+an image path, one of them pointing at a real 64 KB file) and an upload
+folder holding that file, then issues `requests` GETs through the Flask
+test client for:
+
+* the same bytes through Flask's unauthenticated static handler
+* /uploads with the access lookup cached (the steady state)
+* /uploads with the cache cleared before every request (indexed lookup each time)
+* /uploads revalidations answered with 304
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app  # noqa: E402
+from common import use_database  # noqa: E402
+from extensions import db  # noqa: E402
+from media import forget_image_access  # noqa: E402
+from models import MoodEntry, User  # noqa: E402
+from uploads import blob_path  # noqa: E402
+
+DIGEST = 'ab' * 32
+
+
+def populate(entries):
+    user = User(username='bench', email='bench@example.com')
+    user.set_password('bench')
+    db.session.add(user)
+    db.session.flush()
+    start = date(2000, 1, 1)
+    db.session.execute(MoodEntry.__table__.insert(), [
+        {
+            'user_id': user.id,
+            'entry_date': start + timedelta(days=i),
+            'mood_rating': 5,
+            'mood_label': 'Bench',
+            'image_path': 'uploads/' + blob_path(('%064x' % i) if i else DIGEST, 'png'),
+        }
+        for i in range(entries)
+    ])
+    db.session.commit()
+    return user.id
+
+
+def timed(client, url, n, before=None, headers=None):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        if before:
+            before()
+        response = client.get(url, headers=headers)
+        response.close()
+    elapsed = time.perf_counter() - t0
+    return response.status_code, elapsed / n * 1e6
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    entries = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    tmp = tempfile.mkdtemp()
+    try:
+        upload_folder = os.path.join(tmp, 'uploads')
+        relative = blob_path(DIGEST, 'png')
+        payload = os.urandom(64 * 1024)
+        os.makedirs(os.path.join(upload_folder, os.path.dirname(relative)))
+        with open(os.path.join(upload_folder, relative), 'wb') as f:
+            f.write(payload)
+        os.makedirs(os.path.join(tmp, 'public'))
+        with open(os.path.join(tmp, 'public', 'image.png'), 'wb') as f:
+            f.write(payload)
+
+        app.config['UPLOAD_FOLDER'] = upload_folder
+        app.static_folder = tmp
+        use_database(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            user_id = populate(entries)
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['user_id'] = user_id
+
+        url = '/uploads/' + relative
+        etag = client.get(url).headers['ETag']
+        rows = [
+            ('static (no auth)', *timed(client, '/static/public/image.png', n)),
+            ('/uploads, cached access', *timed(client, url, n)),
+            ('/uploads, uncached access', *timed(client, url, n, before=forget_image_access)),
+            ('/uploads, 304 revalidation', *timed(client, url, n, headers={'If-None-Match': etag})),
+        ]
+        print(f"{n} requests each, {entries} entries for the user, 64 KB image")
+        for label, status, micros in rows:
+            print(f"{label:28s} {status}  {micros:8.1f} us/request")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Throughput of bulk import (imports.import_entries) vs per-entry ORM commits.
+
+    python benchmarks/bench_import.py [rows] [orm_rows]
+
+Builds a `rows`-line CSV (the /export-all layout) and the same data as
+NDJSON, imports each into a fresh throwaway database for one user, and
+reports rows/second.  For comparison, `orm_rows` entries are then added the
+way the /mood-journal form does it - one `MoodEntry` and one commit per
+entry, with the mapper events that maintain streaks and weekly rollups.
+"""
+import csv
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app  # noqa: E402
+from common import use_database  # noqa: E402
+from exports import EXPORT_HEADER  # noqa: E402
+from extensions import db  # noqa: E402
+from imports import import_entries  # noqa: E402
+from models import MoodEntry, User  # noqa: E402
+
+LABELS = ["Terrible", "Bad", "Neutral", "Good", "Excellent", "Amazing"]
+
+
+def records(rows):
+    rng = random.Random(1)
+    start = date(2000, 1, 1)
+    for i in range(rows):
+        rating = rng.randint(1, 10)
+        yield {
+            'date': (start + timedelta(days=i // 3)).isoformat(),
+            'mood_label': rng.choice(LABELS),
+            'rating': rating,
+            'notes': f"imported note {i}",
+            'time_spent_seconds': rng.randint(0, 600),
+            'created_at': f"2024-01-01 {i % 24:02d}:{i % 60:02d}:00",
+        }
+
+
+def as_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADER)
+    for i, r in enumerate(records(rows)):
+        writer.writerow([i, r['date'], r['mood_label'], r['rating'], r['notes'],
+                         r['time_spent_seconds'], r['created_at']])
+    return buffer.getvalue().encode()
+
+
+def as_ndjson(rows):
+    return "\n".join(json.dumps(r) for r in records(rows)).encode()
+
+
+def fresh_database(tmp, name):
+    use_database(os.path.join(tmp, name))
+    db.create_all()
+    user = User(username='bench', email='bench@example.com')
+    user.password = 'x'
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    orm_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    payloads = {'csv': as_csv(rows), 'ndjson': as_ndjson(rows)}
+    tmp = tempfile.mkdtemp()
+    try:
+        print(f"{rows} rows per bulk import")
+        for fmt, payload in payloads.items():
+            with app.app_context():
+                user_id = fresh_database(tmp, f'{fmt}.db')
+                t0 = time.perf_counter()
+                report = import_entries(user_id, io.BytesIO(payload), fmt)
+                elapsed = time.perf_counter() - t0
+                db.session.remove()
+            print(f"bulk {fmt:7s} {len(payload) / 1e6:6.1f} MB  {report['imported']:7d} rows  "
+                  f"{elapsed:6.2f} s  {report['imported'] / elapsed:9.0f} rows/s")
+
+        with app.app_context():
+            user_id = fresh_database(tmp, 'orm.db')
+            t0 = time.perf_counter()
+            for r in records(orm_rows):
+                db.session.add(MoodEntry(
+                    user_id=user_id, entry_date=date.fromisoformat(r['date']),
+                    mood_rating=r['rating'], mood_label=r['mood_label'], notes=r['notes'],
+                    time_spent_seconds=r['time_spent_seconds'],
+                ))
+                db.session.commit()
+            elapsed = time.perf_counter() - t0
+            db.session.remove()
+        print(f"per-entry ORM commits  {orm_rows:7d} rows  {elapsed:6.2f} s  "
+              f"{orm_rows / elapsed:9.0f} rows/s")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Query plans and timings for the hot MoodEntry queries, with and without
+the composite (user_id, entry_date) / (user_id, timestamp) indexes.
+
+    python benchmarks/bench_indexes.py [rows] [users]
+
+Builds a throwaway SQLite file with `rows` entries spread over `users`
+users, runs each query against the un-indexed schema, applies
+`migrations.upgrade()` and runs them again.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine  # noqa: E402
+
+import models  # noqa: E402,F401
+from extensions import db  # noqa: E402
+from migrations import upgrade  # noqa: E402
+
+QUERIES = {
+    'logs (order by timestamp)':
+        "SELECT * FROM mood_entries WHERE user_id = ? ORDER BY timestamp DESC LIMIT 50",
+    'dashboard month range':
+        "SELECT entry_date, count(*), sum(mood_rating) FROM mood_entries "
+        "WHERE user_id = ? AND entry_date >= '2024-03-01' AND entry_date < '2024-04-01' "
+        "GROUP BY entry_date",
+    'export range':
+        "SELECT * FROM mood_entries WHERE user_id = ? "
+        "AND entry_date BETWEEN '2023-01-01' AND '2023-06-30' ORDER BY entry_date",
+    'weekly (order by entry_date)':
+        "SELECT entry_date, mood_rating FROM mood_entries WHERE user_id = ? ORDER BY entry_date",
+    'profile count':
+        "SELECT count(*) FROM mood_entries WHERE user_id = ?",
+}
+
+
+INSERT_SQL = (
+    "INSERT INTO mood_entries (user_id, entry_date, mood_rating, mood_label, notes, timestamp) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+
+def populate(engine, rows, users):
+    db.metadata.create_all(engine)
+    rng = random.Random(42)
+    start = date(2020, 1, 1)
+    with engine.begin() as conn:
+        for index in models.MoodEntry.__table__.indexes:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+        conn.exec_driver_sql("PRAGMA user_version = 0")
+        batch = []
+        for i in range(rows):
+            d = start + timedelta(days=rng.randrange(1800))
+            batch.append((
+                rng.randrange(1, users + 1),
+                d.isoformat(),
+                rng.randint(1, 10),
+                'Bench',
+                'benchmark note %d' % i,
+                datetime(d.year, d.month, d.day, rng.randrange(24)).isoformat(' '),
+            ))
+            if len(batch) == 10_000:
+                conn.exec_driver_sql(INSERT_SQL, batch)
+                batch = []
+        if batch:
+            conn.exec_driver_sql(INSERT_SQL, batch)
+        conn.exec_driver_sql("ANALYZE")
+
+
+def run(engine, label, users, repeat=20):
+    print(f"\n== {label} ==")
+    with engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, (1,)).fetchall()
+            t0 = time.perf_counter()
+            for i in range(repeat):
+                conn.exec_driver_sql(sql, (i % users + 1,)).fetchall()
+            ms = (time.perf_counter() - t0) * 1000 / repeat
+            print(f"{name:32s} {ms:9.3f} ms   plan: {' | '.join(row[-1] for row in plan)}")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        t0 = time.perf_counter()
+        populate(engine, rows, users)
+        print(f"populated {rows} rows / {users} users in {time.perf_counter() - t0:.1f}s")
+        run(engine, "without indexes", users)
+        t0 = time.perf_counter()
+        version = upgrade(engine)
+        print(f"\nupgrade() to schema v{version} took {time.perf_counter() - t0:.2f}s")
+        run(engine, "with composite indexes", users)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Logins per second per core for candidate PASSWORD_HASH_METHOD settings.
+
+    python benchmarks/bench_password_hashing.py [seconds per method]
+
+Times `check_password_hash` (the work a login does) on a single thread for
+each method, then the same with one thread per core to show that scrypt and
+PBKDF2 release the GIL and scale across the hashing pool.
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from werkzeug.security import check_password_hash, generate_password_hash  # noqa: E402
+
+METHODS = [
+    'pbkdf2:sha256:260000',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:1000000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'scrypt:65536:8:1',
+]
+
+
+def rate(pwhash, seconds, threads=1):
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        done = 0
+        while time.perf_counter() < deadline:
+            check_password_hash(pwhash, 'correct horse battery staple')
+            done += 1
+        return done
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        total = sum(pool.map(lambda _: worker(), range(threads)))
+    return total / (time.perf_counter() - t0)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    cores = os.cpu_count() or 1
+    print(f"{'method':24s} {'ms/verify':>10s} {'logins/s/core':>14s} {f'logins/s x{cores}':>16s}")
+    for method in METHODS:
+        pwhash = generate_password_hash('correct horse battery staple', method=method)
+        single = rate(pwhash, seconds)
+        parallel = rate(pwhash, seconds, threads=cores)
+        print(f"{method:24s} {1000 / single:10.1f} {single:14.1f} {parallel:16.1f}")
+
+
+if __name__ == '__main__':
+    main()
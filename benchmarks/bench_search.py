@@ -0,0 +1,120 @@
+"""Entry search: FTS5 index (search.py) vs a LIKE '%term%' scan.
+
+    python benchmarks/bench_search.py [rows] [users]
+
+Fills a throwaway SQLite file with `rows` entries spread over `users` users
+(default: one user owning them all, the worst case for the LIKE scan, which
+can only narrow by user).  Notes are 8-24 words drawn from a Zipf-like
+vocabulary, so the queries below range from very common to rare terms, plus
+one word that appears in a single entry out of every 20,000.  The
+FTS index is maintained by its triggers while the rows go in; the report
+includes that load time and a full 'rebuild' of the index for reference.
+Each query then fetches the first page of 20 results both ways.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from itertools import accumulate
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import models  # noqa: E402,F401
+from extensions import db  # noqa: E402
+from search import create_search_index, search_entries  # noqa: E402
+
+VOCABULARY = [f"word{i}" for i in range(5000)] + [
+    "anxious", "beach", "exam", "football", "grateful", "lonely", "meditation", "tired",
+]
+# One entry in NEEDLE_EVERY mentions the needle: the rare-term case
+NEEDLE, NEEDLE_EVERY = "serendipity", 20_000
+QUERIES = ['word1', 'word250', 'word4999', 'beach', 'grateful meditation', 'medit*', NEEDLE]
+
+INSERT_SQL = (
+    "INSERT INTO mood_entries (user_id, entry_date, mood_rating, mood_label, notes, "
+    "is_private, timestamp) VALUES (?, ?, ?, ?, ?, 0, ?)"
+)
+
+LIKE_SQL = (
+    "SELECT id, entry_date, mood_rating, mood_label, notes FROM mood_entries "
+    "WHERE user_id = ? AND is_private = 0 AND ({}) "
+    "ORDER BY timestamp DESC LIMIT 20"
+)
+
+
+def populate(engine, rows, users):
+    db.metadata.create_all(engine)
+    rng = random.Random(7)
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+    start = date(2000, 1, 1)
+    with engine.begin() as conn:
+        batch = []
+        for i in range(rows):
+            d = start + timedelta(days=i % 9000)
+            words = rng.choices(VOCABULARY, cum_weights=cum_weights, k=rng.randint(8, 24))
+            if i % NEEDLE_EVERY == 0:
+                words.append(NEEDLE)
+            batch.append((
+                rng.randrange(1, users + 1), d.isoformat(), rng.randint(1, 10),
+                rng.choice(['Good', 'Bad', 'Neutral', 'Excellent']), ' '.join(words),
+                f"{d.isoformat()} 12:00:00.000000",
+            ))
+            if len(batch) == 10_000:
+                conn.exec_driver_sql(INSERT_SQL, batch)
+                batch = []
+        if batch:
+            conn.exec_driver_sql(INSERT_SQL, batch)
+
+
+def like_search(conn, user_id, query):
+    terms = query.rstrip('*').split()
+    clause = " AND ".join("(notes LIKE ? OR mood_label LIKE ?)" for _ in terms)
+    params = [user_id]
+    for t in terms:
+        params += [f"%{t}%", f"%{t}%"]
+    return conn.exec_driver_sql(LIKE_SQL.format(clause), tuple(params)).fetchall()
+
+
+def timed(fn, repeat):
+    fn()  # warm the page cache
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        t0 = time.perf_counter()
+        populate(engine, rows, users)
+        load = time.perf_counter() - t0
+        with engine.begin() as conn:
+            t0 = time.perf_counter()
+            create_search_index(conn)
+            rebuild = time.perf_counter() - t0
+        print(f"{rows} entries, {users} user(s); load with FTS triggers {load:.1f} s, "
+              f"index rebuild {rebuild:.1f} s")
+
+        session = Session(engine)
+        print(f"{'query':22s} {'LIKE ms':>10s} {'FTS ms':>10s}   rows")
+        with engine.connect() as conn:
+            for query in QUERIES:
+                like_rows, like_ms = timed(lambda: like_search(conn, 1, query), 3)
+                (fts_rows, _), fts_ms = timed(
+                    lambda: search_entries(session, 1, query, limit=20), 3
+                )
+                print(f"{query:22s} {like_ms:10.1f} {fts_ms:10.1f}   "
+                      f"{len(like_rows):2d} / {len(fts_rows):2d}")
+        session.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+"""Helpers shared by the benchmarks that drive the Flask app itself."""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app  # noqa: E402
+from extensions import db  # noqa: E402
+
+
+def use_database(path):
+    """Point `app` at the SQLite file `path` instead of instance/app.db.
+
+    app.py binds its engine when it is imported, so changing the URI alone
+    is not enough; the extension is initialised again for the new URI.
+    """
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    del app.extensions['sqlalchemy']
+    db.init_app(app)
@@ -0,0 +1,224 @@
+"""Per-user response caching for read-heavy pages, keyed by a data version.
+
+Every user has a ``data_version`` counter (`models.User.data_version`).  An
+``after_flush`` hook bumps it whenever a flush inserts, changes or deletes
+one of the user's entries or tags, or changes the user row itself, so every
+ORM write path is covered without the views having to remember.  Bulk
+``Query.delete()`` calls and Core inserts skip the flush; their callers
+(delete all entries, /import) call `bump_data_version()` themselves.  The
+counter starts at a random value, so a reused user id never matches a
+deleted account's cached pages.
+
+`cached_response` wraps a GET view.  The cache key is derived from
+(user, version, endpoint, query string, today's date) plus
+``RESPONSE_CACHE_SALT``.  Pages are never invalidated explicitly: a write
+moves the user to a new version, and entries for old versions age out of
+the cache.  The same key is the response's weak ETag.  A browser
+revalidating a page whose data has not changed therefore gets a 304 after
+reading the user row (`auth.get_current_user()`, which the view would have
+read anyway), before the view runs at all.
+
+``RESPONSE_CACHE_BACKEND`` picks where rendered bodies are kept:
+``memory`` (a per-process LRU bounded by ``RESPONSE_CACHE_MAX_BYTES``),
+``none`` (ETags only), or any object with ``get(key)`` and
+``set(key, value, timeout)``.  That covers a shared store such as
+cachelib's RedisCache or MemcachedCache, so all workers share one cache.
+Values are plain bytes.
+
+Requests with flashed messages pending bypass the cache, so the messages
+still show and are consumed.  A view whose output depends on something other
+than the user's data calls `skip_cache()`; for example, a page that links an
+image's original because its thumbnail is not written yet.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from functools import wraps
+
+from flask import current_app, g, make_response, request, session
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from auth import get_current_user
+from extensions import db
+from models import EntryTag, MoodEntry, User
+
+RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+RESPONSE_CACHE_TIMEOUT = 300
+
+_users = User.__table__
+
+
+# -- data versions --------------------------------------------------------
+
+def bump_data_version(user_id, connection=None):
+    """Move `user_id` to a new data version, e.g. after a bulk write."""
+    (connection or db.session).execute(
+        update(_users).where(_users.c.id == user_id)
+        .values(data_version=_users.c.data_version + 1)
+    )
+
+
+def _owner(obj):
+    if isinstance(obj, (MoodEntry, EntryTag)):
+        return obj.user_id
+    if isinstance(obj, User):
+        return obj.id
+    return None
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_written_users(session, flush_context):
+    # new/dirty/deleted still describe what this flush wrote
+    owners = {_owner(obj) for obj in session.deleted}
+    owners.update(_owner(obj) for obj in session.new if not isinstance(obj, User))
+    owners.update(
+        _owner(obj) for obj in session.dirty
+        if session.is_modified(obj, include_collections=True)
+    )
+    owners.discard(None)
+    if owners:
+        connection = session.connection()
+        for user_id in sorted(owners):
+            bump_data_version(user_id, connection)
+
+
+# -- backends -------------------------------------------------------------
+
+class MemoryCache:
+    """A per-process LRU of byte strings, bounded by their total size."""
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                self._pop(key)
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=RESPONSE_CACHE_TIMEOUT):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._items[key] = (time.monotonic() + timeout, value)
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                self._pop(next(iter(self._items)))
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+    def _pop(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._size -= len(item[1])
+
+
+def init_response_cache(app):
+    """Install the backend named by RESPONSE_CACHE_BACKEND."""
+    backend = app.config.get('RESPONSE_CACHE_BACKEND', 'memory')
+    if backend == 'memory':
+        backend = MemoryCache(app.config.get('RESPONSE_CACHE_MAX_BYTES', RESPONSE_CACHE_MAX_BYTES))
+    elif backend == 'none':
+        backend = None
+    elif not (hasattr(backend, 'get') and hasattr(backend, 'set')):
+        raise ValueError(
+            "RESPONSE_CACHE_BACKEND must be 'memory', 'none' or an object with get() and set()"
+        )
+    app.extensions['response_cache'] = backend
+
+
+def clear_response_cache():
+    backend = current_app.extensions.get('response_cache')
+    if isinstance(backend, MemoryCache):
+        backend.clear()
+
+
+# -- the decorator --------------------------------------------------------
+
+def skip_cache():
+    """Keep the current response out of the cache and without an ETag."""
+    g.skip_response_cache = True
+
+
+def _cache_key(user_id, version):
+    parts = [
+        current_app.config.get('RESPONSE_CACHE_SALT', ''),
+        str(user_id),
+        str(version),
+        request.endpoint,
+        request.query_string.decode('latin-1'),
+        # Pages show "today" (reminders, streaks, trends), local and UTC
+        date.today().isoformat(),
+        datetime.utcnow().date().isoformat(),
+    ]
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()[:32]
+
+
+def _encode(response):
+    head = json.dumps({'status': response.status_code, 'mimetype': response.mimetype})
+    return head.encode() + b'\n' + response.get_data()
+
+
+def _decode(value):
+    head, body = value.split(b'\n', 1)
+    head = json.loads(head)
+    return current_app.response_class(body, status=head['status'], mimetype=head['mimetype'])
+
+
+def _revalidate(response, etag):
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
+def cached_response(view):
+    """Serve a GET view from the response cache (see the module docstring)."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        g.pop('skip_response_cache', None)
+        user = get_current_user()
+        if request.method != 'GET' or user is None or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        key = _cache_key(user.id, user.data_version)
+        if request.if_none_match.contains_weak(key):
+            return _revalidate(current_app.response_class(status=304), key)
+
+        backend = current_app.extensions.get('response_cache')
+        stored = backend.get(key) if backend is not None else None
+        if stored is not None:
+            return _revalidate(_decode(stored), key)
+
+        response = make_response(view(*args, **kwargs))
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or g.get('skip_response_cache')
+        ):
+            return response
+        if backend is not None:
+            backend.set(
+                key, _encode(response),
+                current_app.config.get('RESPONSE_CACHE_TIMEOUT', RESPONSE_CACHE_TIMEOUT),
+            )
+        return _revalidate(response, key)
+    return wrapped
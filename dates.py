@@ -0,0 +1,94 @@
+"""Normalization of entry_date-like values to `datetime.date`.
+
+`MoodEntry.entry_date` is a SQL Date column, so rows loaded through
+SQLAlchemy already hold `date` objects and need no work at all.  The parsing
+fallbacks (ISO strings, YYYYMMDD, unix timestamps) only matter for legacy
+data, and `normalize_dates()` handles that case a whole column at a time,
+parsing each distinct raw value once.
+"""
+from datetime import date, datetime
+
+_PARSE_ERRORS = (ValueError, OverflowError, OSError)
+_MISSING = object()
+
+
+def _parse(val):
+    """Slow path for anything that is not already a plain `date`."""
+    if isinstance(val, datetime):
+        return val.date()
+    if isinstance(val, date):
+        return val
+    if isinstance(val, str):
+        s = val.strip()
+        # Try ISO date first
+        try:
+            return date.fromisoformat(s)
+        except ValueError:
+            pass
+        # Try ISO datetime
+        try:
+            return datetime.fromisoformat(s).date()
+        except ValueError:
+            pass
+        if s.isdigit():
+            return _parse(int(s))
+        return None
+    if isinstance(val, int):
+        s = str(val)
+        # Try YYYYMMDD
+        if len(s) == 8:
+            try:
+                return date(int(s[:4]), int(s[4:6]), int(s[6:8]))
+            except ValueError:
+                pass
+        # Try unix timestamp
+        try:
+            return datetime.fromtimestamp(val).date()
+        except _PARSE_ERRORS:
+            return None
+    return None
+
+
+def to_date(val):
+    """Normalize one value to a date, or None if it cannot be parsed."""
+    if type(val) is date:
+        return val
+    return _parse(val)
+
+
+def normalize_dates(values):
+    """Normalize a column of values in one pass.
+
+    Returns the input list untouched when every value is already a date;
+    otherwise each distinct raw value is parsed once.
+    """
+    values = list(values)
+    if all(type(v) is date for v in values):
+        return values
+
+    cache = {}
+    result = []
+    for v in values:
+        if type(v) is date:
+            result.append(v)
+            continue
+        try:
+            parsed = cache.get(v, _MISSING)
+        except TypeError:
+            parsed = _parse(v)
+        else:
+            if parsed is _MISSING:
+                # a miss costs a lookup and an insert, not a raised KeyError
+                parsed = cache[v] = _parse(v)
+        result.append(parsed)
+    return result
+
+
+def normalize_entries(entries):
+    """Make `entry_date` a date on each entry; a no-op for ORM-loaded rows."""
+    if not entries or all(type(e.entry_date) is date for e in entries):
+        return
+    for e, d in zip(entries, normalize_dates([e.entry_date for e in entries])):
+        if d is not None:
+            # assign back for template rendering (no commit)
+            e.entry_date = d
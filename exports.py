@@ -0,0 +1,286 @@
+"""Export pipeline for mood entries.
+
+`export_stream(source, fmt)` turns a MoodEntry query (or a list of entries)
+into an incremental stream of output chunks in one of the registered
+formats:
+
+* ``csv``      - the spreadsheet-friendly format the UI has always offered
+* ``ndjson``   - one JSON object per line
+* ``columnar`` - a compact binary column layout for analytics (see below)
+
+Queries are narrowed to the exported columns with `with_entities()` and read
+with `yield_per()`, so rows arrive as plain tuples in batches of
+`BATCH_SIZE`; each batch is encoded and yielded as one chunk.  Memory use is
+therefore bounded by the batch size, not the export size.
+
+Columnar format (``.mjc``)
+--------------------------
+All integers are little-endian.  The layout is modelled on Arrow's
+array-per-column buffers so that a reader can load a column with a single
+``array.frombytes()`` call instead of parsing text::
+
+    file       := b"MJC2" schema row_group* u32(0)
+    schema     := u16(ncols) { u8(type) u16(len) name:utf8 }*
+    row_group  := u32(nrows) column*            (columns in schema order)
+    column     := validity values
+    validity   := u8[(nrows + 7) // 8]          (bit i, LSB first: row i is not null)
+    values     := i32[nrows]                    (type 1: int32)
+                | i32[nrows]                    (type 2: date32, days since 1970-01-01)
+                | i64[nrows]                    (type 3: timestamp, microseconds since epoch)
+                | u32[nrows + 1] offsets bytes  (type 4: utf8, offsets into bytes)
+
+As in Arrow, a null still occupies its slot in the values (0, or an empty
+string) and only the validity bitmap says it is null; e.g. a missing
+``time_spent_seconds`` or ``created_at`` is not the same as 0 or the epoch.
+`read_columnar()` decodes a file back into ``{name: list}`` with None for
+nulls (files written before the bitmap, magic ``MJC1``, have no nulls).
+"""
+import csv
+import io
+import json
+import struct
+import sys
+from array import array
+from datetime import date, datetime, timedelta
+
+from dates import normalize_dates
+from models import MoodEntry
+
+# Rows fetched from the database per round trip and encoded per output chunk
+BATCH_SIZE = 1000
+
+INT32, DATE32, TIMESTAMP, UTF8 = 1, 2, 3, 4
+
+# (record key, CSV header, columnar type, source attribute)
+COLUMNS = [
+    ('id', "Entry ID", INT32, 'id'),
+    ('date', "Date", DATE32, 'entry_date'),
+    ('mood_label', "Mood Label", UTF8, 'mood_label'),
+    ('rating', "Rating", INT32, 'mood_rating'),
+    ('notes', "Notes", UTF8, 'notes'),
+    ('time_spent_seconds', "Time Spent (sec)", INT32, 'time_spent_seconds'),
+    ('created_at', "Created At", TIMESTAMP, 'timestamp'),
+]
+
+EXPORT_HEADER = [header for _, header, _, _ in COLUMNS]
+_SOURCE_ATTRS = [attr for _, _, _, attr in COLUMNS]
+
+_EPOCH_DATE = date(1970, 1, 1)
+_EPOCH = datetime(1970, 1, 1)
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _fmt_date(value):
+    return value.strftime("%Y-%m-%d") if hasattr(value, 'strftime') else str(value)
+
+
+def _fmt_timestamp(value):
+    return value.strftime(_TIMESTAMP_FORMAT) if value is not None else ""
+
+
+class CsvWriter:
+    mimetype = 'text/csv'
+    extension = 'csv'
+
+    def header(self):
+        return self._encode([EXPORT_HEADER])
+
+    def batch(self, rows):
+        return self._encode(
+            [r[0], _fmt_date(r[1]), r[2], r[3], r[4] or "", r[5] or 0, _fmt_timestamp(r[6])]
+            for r in rows
+        )
+
+    def footer(self):
+        return ""
+
+    @staticmethod
+    def _encode(rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+
+
+class NdjsonWriter:
+    mimetype = 'application/x-ndjson'
+    extension = 'ndjson'
+
+    def header(self):
+        return ""
+
+    def batch(self, rows):
+        keys = [key for key, _, _, _ in COLUMNS]
+        lines = []
+        for r in rows:
+            values = [r[0], _fmt_date(r[1]), r[2], r[3], r[4], r[5], _fmt_timestamp(r[6])]
+            lines.append(json.dumps(dict(zip(keys, values)), ensure_ascii=False))
+        lines.append("")
+        return "\n".join(lines)
+
+    def footer(self):
+        return ""
+
+
+def _le(arr):
+    if sys.byteorder != 'little':
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _validity(values):
+    size = (len(values) + 7) // 8
+    if None not in values:
+        return b"\xff" * size  # bits past the last row are ignored
+    bits = bytearray(size)
+    for i, v in enumerate(values):
+        if v is not None:
+            bits[i >> 3] |= 1 << (i & 7)
+    return bytes(bits)
+
+
+class ColumnarWriter:
+    mimetype = 'application/octet-stream'
+    extension = 'mjc'
+
+    def header(self):
+        parts = [b"MJC2", struct.pack('<H', len(COLUMNS))]
+        for key, _, col_type, _ in COLUMNS:
+            name = key.encode()
+            parts.append(struct.pack('<BH', col_type, len(name)))
+            parts.append(name)
+        return b"".join(parts)
+
+    def batch(self, rows):
+        parts = [struct.pack('<I', len(rows))]
+        for idx, (_, _, col_type, _) in enumerate(COLUMNS):
+            values = [r[idx] for r in rows]
+            if col_type == DATE32:
+                # an unreadable legacy date is null rather than the epoch
+                values = [v if isinstance(v, date) else None for v in values]
+            parts.append(_validity(values))
+            if col_type == INT32:
+                parts.append(_le(array('i', (v or 0 for v in values))))
+            elif col_type == DATE32:
+                parts.append(_le(array('i', (
+                    (v - _EPOCH_DATE).days if v is not None else 0 for v in values
+                ))))
+            elif col_type == TIMESTAMP:
+                parts.append(_le(array('q', (
+                    (v - _EPOCH) // timedelta(microseconds=1) if v is not None else 0
+                    for v in values
+                ))))
+            else:
+                encoded = [(v or "").encode() for v in values]
+                offsets = array('I', [0])
+                total = 0
+                for b in encoded:
+                    total += len(b)
+                    offsets.append(total)
+                parts.append(_le(offsets))
+                parts.append(b"".join(encoded))
+        return b"".join(parts)
+
+    def footer(self):
+        return struct.pack('<I', 0)
+
+
+FORMATS = {
+    'csv': CsvWriter,
+    'ndjson': NdjsonWriter,
+    'columnar': ColumnarWriter,
+}
+
+
+def _rows(source, batch_size):
+    if hasattr(source, 'with_entities'):
+        return source.with_entities(
+            *[getattr(MoodEntry, attr) for attr in _SOURCE_ATTRS]
+        ).yield_per(batch_size)
+    return (tuple(getattr(e, attr) for attr in _SOURCE_ATTRS) for e in source)
+
+
+def _normalized(batch):
+    """Normalize the batch's date column in one pass (free when already dates)."""
+    dates = normalize_dates([row[1] for row in batch])
+    if all(d is row[1] for row, d in zip(batch, dates)):
+        return batch
+    return [
+        (row[0], d if d is not None else row[1]) + tuple(row[2:])
+        for row, d in zip(batch, dates)
+    ]
+
+
+def export_stream(source, fmt='csv', batch_size=None):
+    """Yield encoded chunks of `source` (a MoodEntry query or iterable of entries)."""
+    writer = FORMATS[fmt]()
+    batch_size = batch_size or BATCH_SIZE
+
+    header = writer.header()
+    if header:
+        yield header
+    pending = []
+    for row in _rows(source, batch_size):
+        pending.append(row)
+        if len(pending) >= batch_size:
+            yield writer.batch(_normalized(pending))
+            pending = []
+    if pending:
+        yield writer.batch(_normalized(pending))
+    footer = writer.footer()
+    if footer:
+        yield footer
+
+
+def read_columnar(data):
+    """Decode a columnar export (bytes) into {column name: list of values}."""
+    view = memoryview(data)
+    magic = bytes(view[:4])
+    if magic not in (b"MJC1", b"MJC2"):
+        raise ValueError("not a columnar mood export")
+    has_validity = magic == b"MJC2"
+    pos = 4
+    (ncols,) = struct.unpack_from('<H', view, pos)
+    pos += 2
+    schema = []
+    for _ in range(ncols):
+        col_type, name_len = struct.unpack_from('<BH', view, pos)
+        pos += 3
+        schema.append((bytes(view[pos:pos + name_len]).decode(), col_type))
+        pos += name_len
+
+    def take(typecode, count):
+        nonlocal pos
+        arr = array(typecode)
+        arr.frombytes(view[pos:pos + count * arr.itemsize])
+        if sys.byteorder != 'little':
+            arr.byteswap()
+        pos += count * arr.itemsize
+        return arr
+
+    columns = {name: [] for name, _ in schema}
+    while True:
+        (nrows,) = struct.unpack_from('<I', view, pos)
+        pos += 4
+        if nrows == 0:
+            break
+        for name, col_type in schema:
+            bits = None
+            if has_validity:
+                size = (nrows + 7) // 8
+                bits = bytes(view[pos:pos + size])
+                pos += size
+            if col_type == INT32:
+                values = take('i', nrows)
+            elif col_type == DATE32:
+                values = [_EPOCH_DATE + timedelta(days=d) for d in take('i', nrows)]
+            elif col_type == TIMESTAMP:
+                values = [_EPOCH + timedelta(microseconds=t) for t in take('q', nrows)]
+            else:
+                offsets = take('I', nrows + 1)
+                blob = bytes(view[pos:pos + offsets[-1]])
+                pos += offsets[-1]
+                values = [blob[offsets[i]:offsets[i + 1]].decode() for i in range(nrows)]
+            if bits is not None and bits.count(0xff) * 8 < nrows:
+                values = [v if bits[i >> 3] >> (i & 7) & 1 else None for i, v in enumerate(values)]
+            columns[name].extend(values)
+    return columns
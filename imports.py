@@ -0,0 +1,215 @@
+"""Bulk import of mood entries from CSV or NDJSON.
+
+`import_entries(user_id, stream, fmt)` reads the same formats `exports.py`
+writes (for CSV, columns are matched by their header names; the Entry ID
+column is ignored and every imported row gets a new id).  The stream is
+parsed incrementally and collected into batches of `BATCH_SIZE` records.
+Each batch is validated in one pass, with its dates normalized together
+(see `dates.normalize_dates`).  It is then written with a single
+executemany INSERT and committed, so memory stays bounded and a failure
+late in a large file keeps the batches already written.
+
+The INSERTs go through Core, which fires no mapper events.  The user's
+streak state and weekly rollups are therefore rebuilt once at the end, and
+the user's data version (see caching.py) is bumped.
+Imported rows carry no images, so blob refcounts need no update.  Rows
+that fail validation are skipped and reported.
+"""
+import csv
+import io
+import json
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+
+from caching import bump_data_version
+from dates import normalize_dates
+from exports import COLUMNS
+from extensions import db
+from models import MoodEntry
+from streaks import rebuild_user_stats
+from weekly import rebuild_weekly_summaries
+
+# Records validated and inserted per transaction
+BATCH_SIZE = 1000
+# Validation errors listed in the report (the rest are only counted)
+MAX_REPORTED_ERRORS = 20
+
+MIN_RATING, MAX_RATING = 1, 10
+# Longest time spent on one entry that is stored as given (a day)
+MAX_TIME_SPENT = 24 * 60 * 60
+_LABEL_LENGTH = MoodEntry.__table__.c.mood_label.type.length
+
+_entries = MoodEntry.__table__
+_HEADER_KEYS = {header: key for key, header, _, _ in COLUMNS}
+
+
+class ImportFormatError(ValueError):
+    """The upload cannot be read as the requested format at all."""
+
+
+def _csv_records(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [_HEADER_KEYS.get(name.strip()) for name in header]
+    if 'date' not in columns or 'rating' not in columns:
+        raise ImportFormatError("CSV header must include the 'Date' and 'Rating' columns")
+    for row in reader:
+        if row:
+            yield reader.line_num, {key: value for key, value in zip(columns, row) if key}
+
+
+def _ndjson_records(stream):
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_no, record if isinstance(record, dict) else None
+
+
+FORMATS = {
+    'csv': _csv_records,
+    'ndjson': _ndjson_records,
+}
+
+
+def _optional_int(value, name):
+    """A whole number from CSV text or a JSON number; None if empty.
+
+    JSON booleans and fractional numbers are rejected rather than coerced.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{name} must be a whole number")
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a whole number") from None
+
+
+def _optional_text(value, name):
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{name} must be text")
+    return value
+
+
+def _timestamp(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError("created_at must be a timestamp")
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value)
+    parsed = datetime.fromisoformat(str(value).strip())
+    if parsed.tzinfo is not None:
+        # Stored timestamps are naive UTC
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _row(record, entry_date, user_id, now):
+    """The INSERT parameters for one record; raises ValueError if it is invalid."""
+    if entry_date is None:
+        raise ValueError("missing or unreadable date")
+    rating = _optional_int(record.get('rating'), 'rating')
+    if rating is None or not MIN_RATING <= rating <= MAX_RATING:
+        raise ValueError(f"rating must be between {MIN_RATING} and {MAX_RATING}")
+    label = (_optional_text(record.get('mood_label'), 'mood label') or '').strip() or None
+    if label is not None and len(label) > _LABEL_LENGTH:
+        raise ValueError(f"mood label longer than {_LABEL_LENGTH} characters")
+    time_spent = _optional_int(record.get('time_spent_seconds'), 'time spent') or 0
+    if not 0 <= time_spent <= MAX_TIME_SPENT:
+        raise ValueError(f"time spent must be between 0 and {MAX_TIME_SPENT} seconds")
+    notes = _optional_text(record.get('notes'), 'notes')
+    created = _timestamp(record.get('created_at')) or now
+    return {
+        'user_id': user_id,
+        'entry_date': entry_date,
+        'mood_rating': rating,
+        'mood_label': label,
+        'notes': notes or None,
+        'time_spent_seconds': time_spent,
+        'timestamp': created,
+        'created_at': created,
+    }
+
+
+def _raw_date(record):
+    """The record's date for `normalize_dates`; None (unreadable) for non-dates."""
+    value = record.get('date') if record is not None else None
+    # A JSON true/false would otherwise be read as the unix timestamp 1 or 0
+    return None if isinstance(value, bool) else value
+
+
+def _validated(batch, user_id, now, errors):
+    """INSERT parameters for the valid records of `batch`; problems go to `errors`."""
+    dates = normalize_dates([_raw_date(record) for _, record in batch])
+    rows = []
+    for (line_no, record), entry_date in zip(batch, dates):
+        try:
+            if record is None:
+                raise ValueError("not a JSON object")
+            rows.append(_row(record, entry_date, user_id, now))
+        except (ValueError, TypeError, OverflowError, OSError) as e:
+            errors.append((line_no, str(e)))
+    return rows
+
+
+def import_entries(user_id, stream, fmt='csv', batch_size=None):
+    """Insert the entries read from binary `stream` for `user_id`; returns a report dict."""
+    records = FORMATS[fmt](stream)
+    batch_size = batch_size or BATCH_SIZE
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    imported = 0
+    errors = []
+
+    def write(batch):
+        nonlocal imported
+        rows = _validated(batch, user_id, now, errors)
+        if rows:
+            db.session.execute(insert(_entries), rows)
+            db.session.commit()
+            imported += len(rows)
+
+    try:
+        batch = []
+        for item in records:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                write(batch)
+                batch = []
+        write(batch)
+    except UnicodeDecodeError as e:
+        raise ImportFormatError("the file is not UTF-8 text") from e
+    except csv.Error as e:
+        raise ImportFormatError(f"unreadable CSV: {e}") from e
+    finally:
+        if imported:
+            db.session.rollback()  # a failed batch leaves nothing pending; committed ones stay
+            connection = db.session.connection()
+            rebuild_user_stats(connection, user_id)
+            rebuild_weekly_summaries(connection, user_id)
+            bump_data_version(user_id, connection)
+            db.session.commit()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'imported': imported,
+        'skipped': len(errors),
+        'errors': [
+            {'line': line_no, 'error': message}
+            for line_no, message in errors[:MAX_REPORTED_ERRORS]
+        ],
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(imported / elapsed) if elapsed > 0 else None,
+    }
@@ -1,9 +1,11 @@
 # init_db.py
 from app import app
 from extensions import db
+from migrations import upgrade
 from models import *
 
 if __name__ == "__main__":
     with app.app_context():
         db.create_all()
-        print("Database initialized — all tables are ready!")
+        version = upgrade(db.engine)
+        print(f"Database initialized — all tables are ready! (schema version {version})")
@@ -0,0 +1,190 @@
+"""Authenticated serving of uploaded images.
+
+Only the owner of an entry that uses an image may fetch it.  The ownership
+and privacy lookup is one indexed query on (user_id, image_path), memoized
+per (user, image) for ACCESS_CACHE_TTL seconds and dropped whenever an entry
+changes its image or privacy (routes that bulk-delete entries, which fires
+no events, call `forget_image_access()`).  Images used only by private entries are sent
+with ``no-store``; the rest may be cached, but only by the user's browser.
+
+Blob names are the SHA-256 of their content (see uploads.py), so a URL's
+bytes never change: responses are marked immutable for a year and the file
+name itself is a strong ETag, which lets a revalidation be answered with
+``304 Not Modified`` without touching the disk.
+
+``UPLOAD_SEND_MODE`` selects who moves the bytes:
+
+* ``direct``     - the worker sends the file (`flask.send_file`, which hands the
+  open file to the server's ``wsgi.file_wrapper``, i.e. ``sendfile()`` under
+  gunicorn/uWSGI)
+* ``x-sendfile`` - an ``X-Sendfile`` header with the absolute path (Apache, lighttpd)
+* ``x-accel``    - an ``X-Accel-Redirect`` to ``UPLOAD_ACCEL_PREFIX`` + path (nginx
+  ``internal`` location aliasing the upload folder)
+
+In the proxy modes the worker only authorizes, resolves the file and sets
+headers.
+"""
+import mimetypes
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from flask import abort, current_app, request, send_file
+from sqlalchemy import event, func, inspect
+from werkzeug.security import safe_join
+
+from auth import current_user_id
+from extensions import db
+from models import MoodEntry
+
+CACHE_FOREVER = 'private, max-age=31536000, immutable'
+CACHE_NEVER = 'private, no-store'
+SEND_MODES = ('direct', 'x-sendfile', 'x-accel')
+
+ACCESS_CACHE_SIZE = 4096
+ACCESS_CACHE_TTL = 60.0
+
+_BLOB_NAME = re.compile(r'^[0-9a-f]{64}(\.[a-z]+)?\.[a-z0-9]+$')
+_MISSING = object()
+
+
+class _AccessCache:
+    """Bounded LRU of (user_id, image stem) -> access, with a time-to-live."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return _MISSING
+            expires, value = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return _MISSING
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_access = _AccessCache(ACCESS_CACHE_SIZE, ACCESS_CACHE_TTL)
+
+
+def forget_image_access():
+    """Drop all memoized access decisions, e.g. after a bulk delete."""
+    _access.clear()
+
+
+@event.listens_for(MoodEntry, 'after_insert')
+@event.listens_for(MoodEntry, 'after_delete')
+def _entry_added_or_removed(mapper, connection, target):
+    if target.image_path:
+        _access.clear()
+
+
+@event.listens_for(MoodEntry, 'after_update')
+def _entry_updated(mapper, connection, target):
+    attrs = inspect(target).attrs
+    if any(attrs[name].history.has_changes() for name in ('image_path', 'is_private', 'user_id')):
+        _access.clear()
+
+
+def _image_stem(filename):
+    """'ab/cd/<digest>.thumb.webp' -> 'ab/cd/<digest>': the part shared by all variants."""
+    directory, name = os.path.split(filename)
+    return os.path.join(directory, name.split('.', 1)[0])
+
+
+def image_access(user_id, filename):
+    """How `user_id` may see `filename`: None (no entry of theirs uses it),
+    'private' (only private entries do) or 'public'.
+    """
+    stem = _image_stem(filename)
+    key = (user_id, stem)
+    access = _access.get(key)
+    if access is not _MISSING:
+        return access
+
+    # image_path is 'uploads/<stem>.<ext>'; '/' sorts right after '.', so this
+    # range matches every extension of the stem and nothing else
+    low = os.path.basename(current_app.config['UPLOAD_FOLDER']) + '/' + stem + '.'
+    high = low[:-1] + '/'
+    all_private = db.session.query(func.min(MoodEntry.is_private)).filter(
+        MoodEntry.user_id == user_id,
+        MoodEntry.image_path >= low,
+        MoodEntry.image_path < high,
+    ).scalar()
+    access = None if all_private is None else ('private' if all_private else 'public')
+    _access.put(key, access)
+    return access
+
+
+def etag_for(filename):
+    """Strong ETag for a blob or blob variant (its file name), else None."""
+    name = os.path.basename(filename)
+    return name if _BLOB_NAME.match(name) else None
+
+
+def _not_modified(etag, cache_control):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def send_upload(filename):
+    """Response for `filename` relative to UPLOAD_FOLDER.
+
+    404 unless the logged-in user owns an entry using the image, so the
+    endpoint does not reveal which images exist.
+    """
+    user_id = current_user_id()
+    access = image_access(user_id, filename) if user_id else None
+    if access is None:
+        abort(404)
+    etag = etag_for(filename)
+    cache_control = CACHE_NEVER if access == 'private' else CACHE_FOREVER
+    if etag is not None and etag in request.if_none_match:
+        return _not_modified(etag, cache_control)
+
+    path = safe_join(current_app.config['UPLOAD_FOLDER'], filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    mode = current_app.config.get('UPLOAD_SEND_MODE', 'direct')
+    if mode == 'direct':
+        response = send_file(path, etag=etag or True, conditional=True)
+    else:
+        response = current_app.response_class()
+        response.headers['Content-Type'] = (
+            mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        )
+        if mode == 'x-accel':
+            prefix = current_app.config.get('UPLOAD_ACCEL_PREFIX', '/protected-uploads/')
+            response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + filename
+        elif mode == 'x-sendfile':
+            response.headers['X-Sendfile'] = os.path.abspath(path)
+        else:
+            raise ValueError(f"UPLOAD_SEND_MODE must be one of {SEND_MODES}, not {mode!r}")
+        if etag is not None:
+            response.set_etag(etag)
+
+    if etag is not None or access == 'private':
+        response.headers['Cache-Control'] = cache_control
+    return response
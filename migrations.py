@@ -0,0 +1,162 @@
+"""Lightweight, versioned schema upgrades for existing SQLite databases.
+
+`db.create_all()` creates missing tables but never alters tables that already
+exist, so an old `instance/app.db` would never gain new indexes or columns.
+Each step registered here brings the schema from version N-1 to N.  The
+current version lives in SQLite's `PRAGMA user_version`, and every step is
+written to be idempotent so it is also safe on a database that
+`create_all()` has just built with the latest models.
+"""
+from sqlalchemy import inspect
+
+MIGRATIONS = []
+
+
+def migration(version):
+    """Register `fn(connection)` as the upgrade step to schema `version`."""
+    def decorator(fn):
+        MIGRATIONS.append((version, fn))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return fn
+    return decorator
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def get_schema_version(connection):
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def _create_indexes(connection, table, *names):
+    for index in table.indexes:
+        if index.name in names:
+            index.create(connection, checkfirst=True)
+
+
+def _has_column(connection, table_name, column):
+    return any(c['name'] == column for c in inspect(connection).get_columns(table_name))
+
+
+@migration(1)
+def add_mood_entry_indexes(connection):
+    from models import MoodEntry
+    _create_indexes(
+        connection, MoodEntry.__table__,
+        'ix_mood_entries_user_date', 'ix_mood_entries_user_timestamp',
+    )
+
+
+@migration(2)
+def normalize_entry_timestamps(connection):
+    # Rows written with the old CURRENT_TIMESTAMP default lack the ".ffffff"
+    # suffix SQLAlchemy uses, which breaks string ordering against new rows.
+    connection.exec_driver_sql(
+        "UPDATE mood_entries SET timestamp = timestamp || '.000000' "
+        "WHERE length(timestamp) = 19"
+    )
+
+
+@migration(3)
+def add_entry_privacy_flag(connection):
+    from models import MoodEntry
+    if not _has_column(connection, 'mood_entries', 'is_private'):
+        connection.exec_driver_sql(
+            "ALTER TABLE mood_entries ADD COLUMN is_private BOOLEAN NOT NULL DEFAULT 0"
+        )
+    _create_indexes(connection, MoodEntry.__table__, 'ix_mood_entries_user_private_date')
+
+
+@migration(4)
+def add_image_owner_index(connection):
+    # Authorizing /uploads requests looks entries up by (user_id, image_path)
+    from models import MoodEntry
+    _create_indexes(connection, MoodEntry.__table__, 'ix_mood_entries_user_image')
+
+
+@migration(5)
+def hash_user_pins(connection):
+    # PINs used to be a plaintext INTEGER column; hash them into pin_hash and
+    # clear the old column (left in place, unmapped, as SQLite cannot drop it)
+    from passwords import hash_pin
+    for column, ddl in (
+        ('pin_hash', 'VARCHAR(200)'),
+        ('pin_failed_attempts', 'INTEGER NOT NULL DEFAULT 0'),
+        ('pin_locked_until', 'DATETIME'),
+    ):
+        if not _has_column(connection, 'users', column):
+            connection.exec_driver_sql(f"ALTER TABLE users ADD COLUMN {column} {ddl}")
+    if not _has_column(connection, 'users', 'pin'):
+        return
+    legacy = connection.exec_driver_sql(
+        "SELECT id, pin FROM users WHERE pin IS NOT NULL AND pin_hash IS NULL"
+    ).all()
+    for user_id, pin in legacy:
+        # INTEGER affinity dropped leading zeros ('0123' was stored as 123)
+        pin = str(pin).zfill(4) if isinstance(pin, int) else str(pin)
+        connection.exec_driver_sql(
+            "UPDATE users SET pin_hash = ?, pin = NULL WHERE id = ?", (hash_pin(pin), user_id)
+        )
+
+
+@migration(6)
+def add_entry_search_index(connection):
+    from search import create_search_index
+    create_search_index(connection)
+
+
+@migration(7)
+def add_entry_tags(connection):
+    # Tags move from the unused free-text mood_entries.tags column (left in
+    # place, unmapped) to the entry_tags table
+    from models import EntryTag
+    from tags import create_tag_trigger, parse_tags
+    EntryTag.__table__.create(connection, checkfirst=True)
+    _create_indexes(connection, EntryTag.__table__, 'ix_entry_tags_user_tag')
+    create_tag_trigger(connection)
+    if not _has_column(connection, 'mood_entries', 'tags'):
+        return
+    legacy = connection.exec_driver_sql(
+        "SELECT id, user_id, tags FROM mood_entries WHERE tags IS NOT NULL AND tags != ''"
+    ).all()
+    rows = [
+        {'entry_id': entry_id, 'user_id': user_id, 'tag': tag}
+        for entry_id, user_id, text in legacy
+        for tag in parse_tags(text)
+    ]
+    if rows:
+        connection.execute(EntryTag.__table__.insert().prefix_with('OR IGNORE'), rows)
+
+
+@migration(8)
+def add_user_data_version(connection):
+    # Random starting points, as for new users (see models.User.data_version)
+    if not _has_column(connection, 'users', 'data_version'):
+        connection.exec_driver_sql(
+            "ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"
+        )
+    connection.exec_driver_sql(
+        "UPDATE users SET data_version = random() & 281474976710655 WHERE data_version = 0"
+    )
+
+
+@migration(9)
+def add_password_shape(connection):
+    # Left NULL: a stored hash does not say whether its password was four
+    # digits, so login records it on the next successful password check
+    if not _has_column(connection, 'users', 'password_pin_shaped'):
+        connection.exec_driver_sql("ALTER TABLE users ADD COLUMN password_pin_shaped BOOLEAN")
+
+
+def upgrade(engine):
+    """Apply all pending steps in order; returns the resulting schema version."""
+    with engine.begin() as connection:
+        current = get_schema_version(connection)
+        for version, step in MIGRATIONS:
+            if version <= current:
+                continue
+            step(connection)
+            connection.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+            current = version
+    return current
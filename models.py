@@ -1,6 +1,11 @@
+import secrets
+
 from extensions import db
-from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import datetime, timedelta
+from passwords import (
+    hash_password, hash_pin, is_pin_shaped, needs_rehash, pin_lockout_policy, verify_password,
+    verify_pin,
+)
 
 
 # ============================
@@ -13,19 +18,64 @@ class User(db.Model):
     username = db.Column(db.String(100), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(200), nullable=False)
-
-    # PIN is optional; do not reference users.id as a foreign key
-    pin = db.Column(db.Integer, nullable=True)
-
+    # Whether the password is itself four digits (allowed before PIN sign-in),
+    # so login knows which verifier a PIN-shaped input needs; NULL until known
+    # for passwords set before this was recorded
+    password_pin_shaped = db.Column(db.Boolean, nullable=True)
+
+    # PIN is optional and stored hashed (assign through `pin`); failed PIN
+    # logins count towards a temporary lockout
+    pin_hash = db.Column(db.String(200), nullable=True)
+    pin_failed_attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    pin_locked_until = db.Column(db.DateTime, nullable=True)
+
+    # Bumped by every write to the user's data; keys cached pages (caching.py).
+    # Starts at a random value so a reused id never matches an old account's
+    data_version = db.Column(
+        db.Integer, nullable=False, default=lambda: secrets.randbits(48), server_default='0'
+    )
 
     # Relationship
     mood_entries = db.relationship('MoodEntry', backref='user', lazy=True)
 
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = hash_password(password)
+        self.password_pin_shaped = is_pin_shaped(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        return verify_password(self.password, password)
+
+    def password_needs_rehash(self):
+        """True when the stored hash predates the current PASSWORD_HASH_METHOD."""
+        return needs_rehash(self.password)
+
+    @property
+    def pin(self):
+        raise AttributeError('PINs are write-only; use check_pin()')
+
+    @pin.setter
+    def pin(self, pin):
+        self.pin_hash = hash_pin(pin) if pin else None
+
+    def pin_locked(self, now=None):
+        return self.pin_locked_until is not None and self.pin_locked_until > (now or datetime.utcnow())
+
+    def check_pin(self, pin, now=None):
+        """Verify `pin`, counting failures; always False while locked out."""
+        now = now or datetime.utcnow()
+        if self.pin_locked(now):
+            return False
+        if verify_pin(self.pin_hash, pin):
+            if self.pin_failed_attempts or self.pin_locked_until:
+                self.pin_failed_attempts = 0
+                self.pin_locked_until = None
+            return True
+        max_attempts, lockout_seconds = pin_lockout_policy()
+        self.pin_failed_attempts = (self.pin_failed_attempts or 0) + 1
+        if self.pin_failed_attempts >= max_attempts:
+            self.pin_failed_attempts = 0
+            self.pin_locked_until = now + timedelta(seconds=lockout_seconds)
+        return False
 
 
 # ============================
@@ -33,6 +83,14 @@ class User(db.Model):
 # ============================
 class MoodEntry(db.Model):
     __tablename__ = 'mood_entries'
+    # Every per-user query filters on user_id and then ranges/orders on one of these.
+    # Existing databases pick these up through migrations.py.
+    __table_args__ = (
+        db.Index('ix_mood_entries_user_date', 'user_id', 'entry_date'),
+        db.Index('ix_mood_entries_user_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_mood_entries_user_private_date', 'user_id', 'is_private', 'entry_date'),
+        db.Index('ix_mood_entries_user_image', 'user_id', 'image_path'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -50,16 +108,129 @@ class MoodEntry(db.Model):
 
     # Extra fields from incoming branch
     viewed_at = db.Column(db.DateTime)
-    tags = db.Column(db.Text)
-
-    # Standard timestamp
-    timestamp = db.Column(db.DateTime, default=db.func.now())
-
-    viewed_at = db.Column(db.DateTime)
-    tags = db.Column(db.Text)
 
-    # Standard timestamp
-    timestamp = db.Column(db.DateTime, default=db.func.now())
+    # Standard timestamp (set in Python so stored values share SQLAlchemy's
+    # microsecond format, which keyset pagination compares against)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
     time_spent_seconds = db.Column(db.Integer)
     image_path = db.Column(db.String(255))  # Path to uploaded image
+
+    # Private entries are hidden on /logs and excluded from exports
+    is_private = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+    # Tags live in entry_tags (see tags.py); assign a list of names through `tags`
+    tag_links = db.relationship(
+        'EntryTag', back_populates='entry', order_by='EntryTag.tag',
+        cascade='all, delete-orphan', passive_deletes=True,
+    )
+
+    @property
+    def tags(self):
+        return [link.tag for link in self.tag_links]
+
+    @tags.setter
+    def tags(self, names):
+        kept = {link.tag: link for link in self.tag_links}
+        self.tag_links = [kept.get(name) or EntryTag(tag=name) for name in dict.fromkeys(names)]
+
+
+# ============================
+# ENTRY TAGS
+# ============================
+class EntryTag(db.Model):
+    """One tag on one entry.
+
+    `user_id` repeats the entry's owner so per-user tag lookups and
+    aggregates are served by ix_entry_tags_user_tag alone.
+    """
+    __tablename__ = 'entry_tags'
+    __table_args__ = (
+        db.Index('ix_entry_tags_user_tag', 'user_id', 'tag', 'entry_id'),
+    )
+
+    entry_id = db.Column(
+        db.Integer, db.ForeignKey('mood_entries.id', ondelete='CASCADE'), primary_key=True
+    )
+    tag = db.Column(db.String(40), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+
+    entry = db.relationship('MoodEntry', back_populates='tag_links')
+
+
+# ============================
+# USER STATS MODEL
+# ============================
+class UserStats(db.Model):
+    """Materialized streak/badge counters so the dashboard never rescans history.
+
+    `current_run` is the length of the run of consecutive entry days ending at
+    `last_entry_date`; whether that run is still "current" depends on today's
+    date and is decided at read time.
+    """
+    __tablename__ = 'user_stats'
+
+    user_id = db.Column(db.Integer, primary_key=True)
+    total_entries = db.Column(db.Integer, nullable=False, default=0)
+    last_entry_date = db.Column(db.Date)
+    current_run = db.Column(db.Integer, nullable=False, default=0)
+    longest_run = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# ============================
+# WEEKLY SUMMARY ROLLUP
+# ============================
+class WeeklySummary(db.Model):
+    """Per-user, per-ISO-week rollup of mood entries (weeks start on Monday).
+
+    Maintained on write by weekly.py so /weekly-summaries can page through
+    weeks without loading every entry.
+    """
+    __tablename__ = 'weekly_summaries'
+
+    user_id = db.Column(db.Integer, primary_key=True)
+    week_start = db.Column(db.Date, primary_key=True)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    min_rating = db.Column(db.Integer)
+    min_entry_id = db.Column(db.Integer)
+    max_rating = db.Column(db.Integer)
+    max_entry_id = db.Column(db.Integer)
+
+
+# ============================
+# UPLOAD BLOBS
+# ============================
+class UploadBlob(db.Model):
+    """A stored image, named by the SHA-256 of its contents.
+
+    `refcount` counts the entries whose image_path points at the blob and is
+    kept by uploads.py; blobs nobody references are removed by its GC sweep.
+    """
+    __tablename__ = 'upload_blobs'
+    __table_args__ = (
+        db.Index('ix_upload_blobs_refcount_touched', 'refcount', 'touched_at'),
+    )
+
+    digest = db.Column(db.String(64), primary_key=True)
+    ext = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    # Last time an upload resolved to this blob; protects in-flight uploads from GC
+    touched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+# ============================
+# SESSIONS
+# ============================
+class SessionRecord(db.Model):
+    """Server-side session data, keyed by the id in the session cookie (see sessions.py)."""
+    __tablename__ = 'sessions'
+    __table_args__ = (
+        db.Index('ix_sessions_expires', 'expires'),
+    )
+
+    sid = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires = db.Column(db.DateTime, nullable=False)
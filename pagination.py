@@ -0,0 +1,59 @@
+"""Keyset (cursor) pagination over mood entries, newest first.
+
+Pages are ordered by (timestamp, id) descending and the cursor encodes the
+last row of the previous page, so fetching page N costs the same as page 1
+(an index range scan on (user_id, timestamp)) instead of an OFFSET that
+walks every earlier row.
+"""
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from models import MoodEntry
+
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(entry):
+    raw = f"{entry.timestamp.isoformat()}|{entry.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (timestamp, id) for a cursor string, or None if it is malformed."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        ts, entry_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(ts), int(entry_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def page_size(requested, default):
+    try:
+        size = int(requested) if requested is not None else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def entry_page(query, cursor=None, limit=50):
+    """Fetch one page from a MoodEntry query.
+
+    Returns (entries, next_cursor); next_cursor is None on the last page.
+    """
+    position = decode_cursor(cursor)
+    if position is not None:
+        ts, entry_id = position
+        query = query.filter(or_(
+            MoodEntry.timestamp < ts,
+            and_(MoodEntry.timestamp == ts, MoodEntry.id < entry_id),
+        ))
+    rows = query.order_by(MoodEntry.timestamp.desc(), MoodEntry.id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
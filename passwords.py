@@ -0,0 +1,168 @@
+"""Password hashing policy and the bounded pool that runs it.
+
+The policy is the Werkzeug method string in ``PASSWORD_HASH_METHOD`` (e.g.
+``scrypt:32768:8:1`` or ``pbkdf2:sha256:600000``).  Hashes record the
+method they were made with, so stored hashes from an older policy still
+verify; `needs_rehash()` tells the login route to replace them.
+
+Hashing is CPU-bound but both scrypt and PBKDF2 release the GIL, so they run
+on a dedicated pool of ``PASSWORD_HASH_WORKERS`` threads.  At most
+``PASSWORD_HASH_QUEUE`` hashes may be running or waiting at once; a request
+that cannot get a slot within ``PASSWORD_HASH_WAIT`` seconds raises
+`PasswordHashingBusyError` instead of piling up behind a burst of logins.
+
+A successful verification can also be remembered for a few minutes as a
+signed "verified" token (`issue_verified_token`): it binds the user, the
+stored hash (so a password change voids it) and a keyed digest of the
+password, letting a repeat check of the same password skip the hash.
+
+PINs are four digits, so no KDF setting keeps a stolen PIN hash from being
+brute-forced; what protects them is the per-account lockout after
+``PIN_MAX_ATTEMPTS`` wrong guesses.  They are hashed with the cheaper
+``PIN_HASH_METHOD`` so the PIN path stays fast, and `is_pin_shaped()` lets
+login pick the PIN or the password verifier up front instead of trying both.
+"""
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from flask import current_app, has_app_context
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULTS = {
+    'PASSWORD_HASH_METHOD': 'scrypt:32768:8:1',
+    'PASSWORD_SALT_LENGTH': 16,
+    'PASSWORD_HASH_WORKERS': max(1, (os.cpu_count() or 2) - 1),
+    'PASSWORD_HASH_QUEUE': 32,
+    'PASSWORD_HASH_WAIT': 5.0,
+    'PASSWORD_VERIFIED_TTL': 300,
+    'PIN_HASH_METHOD': 'pbkdf2:sha256:10000',
+    'PIN_LENGTH': 4,
+    'PIN_MAX_ATTEMPTS': 5,
+    'PIN_LOCKOUT_SECONDS': 900,
+}
+
+
+class PasswordHashingBusyError(Exception):
+    """Raised when every hashing slot stayed taken for PASSWORD_HASH_WAIT seconds."""
+
+
+def _config(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULTS[key])
+    return DEFAULTS[key]
+
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=_config('PASSWORD_HASH_WORKERS'), thread_name_prefix='passwords'
+            )
+            _slots = threading.BoundedSemaphore(_config('PASSWORD_HASH_QUEUE'))
+        return _pool, _slots
+
+
+def _run(fn, *args):
+    pool, slots = _executor()
+    if not slots.acquire(timeout=_config('PASSWORD_HASH_WAIT')):
+        raise PasswordHashingBusyError()
+    try:
+        return pool.submit(fn, *args).result()
+    finally:
+        slots.release()
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    """The prefix Werkzeug stores for `method`, with its default parameters filled in."""
+    return generate_password_hash('', method=method, salt_length=1).split('$', 1)[0]
+
+
+def hash_password(password):
+    return _run(
+        generate_password_hash, password,
+        _config('PASSWORD_HASH_METHOD'), _config('PASSWORD_SALT_LENGTH'),
+    )
+
+
+def verify_password(pwhash, password):
+    if not pwhash or password is None:
+        return False
+    return _run(check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """True if `pwhash` was not made with the current policy."""
+    return pwhash.split('$', 1)[0] != _method_prefix(_config('PASSWORD_HASH_METHOD'))
+
+
+def is_pin_shaped(value):
+    """True if `value` looks like a PIN (PIN_LENGTH ASCII digits) rather than a password."""
+    return (
+        value is not None
+        and len(value) == _config('PIN_LENGTH')
+        and value.isascii()
+        and value.isdigit()
+    )
+
+
+def hash_pin(pin):
+    return _run(
+        generate_password_hash, str(pin),
+        _config('PIN_HASH_METHOD'), _config('PASSWORD_SALT_LENGTH'),
+    )
+
+
+def verify_pin(pinhash, pin):
+    if not pinhash or pin is None:
+        return False
+    return _run(check_password_hash, pinhash, str(pin))
+
+
+def pin_lockout_policy():
+    """(failed attempts allowed, lockout in seconds) for PIN logins."""
+    return _config('PIN_MAX_ATTEMPTS'), _config('PIN_LOCKOUT_SECONDS')
+
+
+def _digest(*parts):
+    key = current_app.secret_key.encode()
+    return hmac.new(key, '\0'.join(parts).encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='password-verified')
+
+
+def issue_verified_token(user, password):
+    """Signed proof that `password` verified for `user` (requires an app context)."""
+    return _serializer().dumps({
+        'u': user.id,
+        'h': _digest('hash', user.password),
+        'p': _digest('password', str(user.id), password),
+    })
+
+
+def check_verified_token(token, user, password):
+    """True if `token` proves `password` verified for `user` within the TTL."""
+    if not token:
+        return False
+    try:
+        claims = _serializer().loads(token, max_age=_config('PASSWORD_VERIFIED_TTL'))
+    except BadSignature:
+        return False
+    return (
+        claims.get('u') == user.id
+        and hmac.compare_digest(claims.get('h', ''), _digest('hash', user.password))
+        and hmac.compare_digest(claims.get('p', ''), _digest('password', str(user.id), password))
+    )
@@ -0,0 +1,42 @@
+"""In-process token-bucket rate limiting.
+
+Each key (a user id, a session, ...) owns a bucket holding up to `capacity`
+tokens that refills at `rate` tokens per second.  A request spends one token
+or is refused with the number of seconds until the next token is available.
+Buckets live in a bounded LRU map, so idle keys cost nothing; being
+in-process, limits apply per worker.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    def __init__(self, capacity, rate, max_keys=10_000):
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key, cost=1):
+        """Spend `cost` tokens for `key`; returns (allowed, retry_after_seconds)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        retry_after = 0.0 if allowed else (cost - tokens) / self.rate
+        return allowed, retry_after
+
+    def reset(self, key=None):
+        with self._lock:
+            if key is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(key, None)
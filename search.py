@@ -0,0 +1,200 @@
+"""Full-text search over entry labels and notes (SQLite FTS5).
+
+``mood_entries_fts`` is an external-content FTS5 index over the
+``mood_entries_search`` view: it stores only the inverted index, and reads
+text back from mood_entries when building snippets.  Triggers on
+mood_entries keep it in sync, so every write path stays covered, including
+the bulk deletes and Core inserts that bypass the ORM.  Besides
+``mood_label`` and ``notes`` the index has an ``owner`` column holding
+``u<user_id>``.  A search ANDs ``owner:u<id>`` into the query, so the index
+only ever returns that user's entries, however many other users match, and
+the cost of a search grows with the user's own history rather than the
+whole table.  The user's own terms are matched against the label and notes
+only.
+
+The index is created with mood_entries (`create_all`) and added to existing
+databases by migration 6.
+
+Results are ranked by bm25, with label hits weighted above notes hits.
+Every candidate has to be scored before the first page can be sorted, so
+pages are plain LIMIT/OFFSET: a later page costs what the first one does.
+To bound that cost for very common words, only the user's newest
+``RANK_WINDOW`` matches are ranked.  FTS5 walks rowids in descending order,
+so finding that window stops early.  A term ending in ``*`` matches by prefix.  Otherwise
+terms are matched whole, after Porter stemming.
+Private entries are never returned, matching how /logs keeps their contents
+hidden.
+"""
+import re
+import secrets
+
+from markupsafe import Markup, escape
+from sqlalchemy import Date, DateTime, bindparam, event, text
+
+from models import MoodEntry
+
+FTS_TABLE = 'mood_entries_fts'
+# bm25 weights for (owner, mood_label, notes)
+LABEL_WEIGHT, NOTES_WEIGHT = 4.0, 1.0
+SNIPPET_TOKENS = 16
+# Only the newest RANK_WINDOW matches are ranked (see module docstring)
+RANK_WINDOW = 10_000
+MAX_TERMS = 16
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+_SCHEMA = [
+    """CREATE VIEW IF NOT EXISTS mood_entries_search AS
+       SELECT id, 'u' || user_id AS owner, mood_label, notes FROM mood_entries""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+       owner, mood_label, notes,
+       content='mood_entries_search', content_rowid='id',
+       tokenize='porter unicode61')""",
+    f"""CREATE TRIGGER IF NOT EXISTS mood_entries_fts_ai AFTER INSERT ON mood_entries BEGIN
+       INSERT INTO {FTS_TABLE}(rowid, owner, mood_label, notes)
+       VALUES (new.id, 'u' || new.user_id, new.mood_label, new.notes);
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS mood_entries_fts_ad AFTER DELETE ON mood_entries BEGIN
+       INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, owner, mood_label, notes)
+       VALUES ('delete', old.id, 'u' || old.user_id, old.mood_label, old.notes);
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS mood_entries_fts_au
+       AFTER UPDATE OF user_id, mood_label, notes ON mood_entries BEGIN
+       INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, owner, mood_label, notes)
+       VALUES ('delete', old.id, 'u' || old.user_id, old.mood_label, old.notes);
+       INSERT INTO {FTS_TABLE}(rowid, owner, mood_label, notes)
+       VALUES (new.id, 'u' || new.user_id, new.mood_label, new.notes);
+       END""",
+]
+
+
+def create_search_index(connection, rebuild=True):
+    """Create the view, index and triggers if missing; `rebuild` re-reads every entry."""
+    for statement in _SCHEMA:
+        connection.exec_driver_sql(statement)
+    if rebuild:
+        connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _create_for_new_table(target, connection, **kw):
+    # A freshly created mood_entries is empty: nothing to rebuild
+    create_search_index(connection, rebuild=False)
+
+
+def _drop_with_table(target, connection, **kw):
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    connection.exec_driver_sql("DROP VIEW IF EXISTS mood_entries_search")
+
+
+event.listen(MoodEntry.__table__, 'after_create', _create_for_new_table)
+event.listen(MoodEntry.__table__, 'before_drop', _drop_with_table)
+
+
+def match_expression(query):
+    """An FTS5 query requiring all of the user's words ('walk*' matches by prefix).
+
+    Only word characters are kept, each term quoted, so user input can never
+    be parsed as FTS5 syntax.  Returns None if there is nothing to search for.
+    """
+    words = (query or '').split()[:MAX_TERMS]
+    quoted = []
+    for word in words:
+        terms = _TERM.findall(word)
+        if terms:
+            quoted.append(' '.join('"%s"' % t for t in terms))
+            if word.endswith('*'):
+                quoted[-1] += '*'
+    return ' '.join(quoted) or None
+
+
+def _markers():
+    """Stand-ins for the highlight tags until the text has been escaped.
+
+    Stored text can hold any character (forms and imports pass control
+    characters through), so the stand-ins carry a random token per search
+    that no entry can contain; escaping leaves them intact.
+    """
+    token = secrets.token_hex(8)
+    return f'\x02{token}', f'\x03{token}'
+
+
+def _highlighted(fragment, markers):
+    """Escape `fragment` and turn the highlight stand-ins into <mark> tags."""
+    if fragment is None:
+        return None
+    opening, closing = markers
+    return Markup(
+        str(escape(fragment)).replace(opening, '<mark>').replace(closing, '</mark>')
+    )
+
+
+# The lowest rowid among the user's RANK_WINDOW newest matches
+_WINDOW_FLOOR = text(f"""
+    SELECT min(rowid) FROM (
+        SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match
+        ORDER BY rowid DESC LIMIT :window
+    )
+""")
+
+_RANK = text(f"""
+    SELECT {FTS_TABLE}.rowid AS id
+    FROM {FTS_TABLE}
+    JOIN mood_entries AS e ON e.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH :match AND {FTS_TABLE}.rowid >= :floor AND e.is_private = 0
+    ORDER BY bm25({FTS_TABLE}, 0.0, :label_weight, :notes_weight), e.id DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+# Highlighting is a separate query: SQLite evaluates every result column
+# before sorting, so snippet() in the ranking query would run on every match
+_HIGHLIGHT = text(f"""
+    SELECT e.id, e.entry_date, e.mood_rating, e.timestamp,
+           highlight({FTS_TABLE}, 1, :open, :close) AS label,
+           snippet({FTS_TABLE}, 2, :open, :close, '…', :tokens) AS snippet
+    FROM {FTS_TABLE}
+    JOIN mood_entries AS e ON e.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH :match AND {FTS_TABLE}.rowid IN :ids
+""").bindparams(bindparam('ids', expanding=True)).columns(entry_date=Date, timestamp=DateTime)
+
+
+def search_entries(session, user_id, query, page=1, limit=20):
+    """One page of `user_id`'s entries matching `query`, best first.
+
+    Returns (results, has_more); each result is a dict with the entry's id,
+    date, rating and timestamp plus ``label`` and ``snippet`` as escaped
+    Markup with the matched terms in <mark>.
+    """
+    terms = match_expression(query)
+    if terms is None:
+        return [], False
+    terms = f'{{mood_label notes}}: ({terms})'
+    match = f'owner:u{int(user_id)} AND {terms}'
+    floor = session.execute(_WINDOW_FLOOR, {'match': match, 'window': RANK_WINDOW}).scalar()
+    if floor is None:
+        return [], False
+    ids = session.execute(_RANK, {
+        'match': match, 'floor': floor,
+        'label_weight': LABEL_WEIGHT, 'notes_weight': NOTES_WEIGHT,
+        'limit': limit + 1, 'offset': (max(page, 1) - 1) * limit,
+    }).scalars().all()
+    has_more = len(ids) > limit
+    ids = ids[:limit]
+    if not ids:
+        return [], has_more
+    markers = _markers()
+    rows = session.execute(_HIGHLIGHT, {
+        'match': terms, 'ids': ids,
+        'open': markers[0], 'close': markers[1], 'tokens': SNIPPET_TOKENS,
+    }).mappings()
+    by_id = {
+        row['id']: {
+            'id': row['id'],
+            'entry_date': row['entry_date'],
+            'mood_rating': row['mood_rating'],
+            'timestamp': row['timestamp'],
+            'label': _highlighted(row['label'], markers),
+            'snippet': _highlighted(row['snippet'], markers),
+        }
+        for row in rows
+    }
+    return [by_id[i] for i in ids if i in by_id], has_more
@@ -0,0 +1,249 @@
+"""Server-side sessions: an in-process LRU in front of a SQLite table.
+
+The cookie carries only a random session id (256 bits, so there is nothing
+to sign); the data lives in the ``sessions`` table (`models.SessionRecord`)
+as Flask's tagged JSON.  Recently used sessions are also kept, serialized, in
+a bounded per-process LRU for ``SESSION_CACHE_TTL`` seconds, so most requests
+read their session without a query.  With several worker processes a change
+made by one is seen by the others once their cached copy expires.
+
+Writes are lazy: a request that leaves the session's contents as they were
+writes no row and sends no cookie.  The cookie is only set when the session
+is new, or when a permanent session is saved and its expiry moves.  Rows
+expire ``PERMANENT_SESSION_LIFETIME`` after their last write; a session that
+is only read gets its expiry pushed back once it is half used up.  Expired
+rows are swept whenever a new session is stored.
+
+`regenerate_session()` moves the current session to a new id; sign-in and
+sign-out call it so a session id known before the change stops working.
+
+``SESSION_BACKEND`` selects ``sqlite`` (this module) or ``cookie`` (Flask's
+signed cookie sessions) in `init_sessions()`.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import current_app, session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert
+from werkzeug.datastructures import CallbackDict
+
+from extensions import db
+from models import SessionRecord
+
+SESSION_CACHE_SIZE = 10_000
+SESSION_CACHE_TTL = 10.0
+SID_BYTES = 32
+
+_table = SessionRecord.__table__
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, payload=None, expires=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        # The stored form and expiry as loaded (None for a new session)
+        self.payload = payload
+        self.expires = expires
+        self.modified = False
+        self.accessed = False
+        # Set by regenerate(): the browser still holds the old id's cookie
+        self.replaced = False
+
+    @property
+    def new(self):
+        return self.payload is None
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class SqliteSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSideSession
+
+    def __init__(self, cache_size=SESSION_CACHE_SIZE, cache_ttl=SESSION_CACHE_TTL):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    # -- cache ---------------------------------------------------------
+
+    def _cached(self, sid):
+        with self._lock:
+            item = self._cache.get(sid)
+            if item is None:
+                return None
+            cached_at, payload, expires = item
+            if cached_at + self.cache_ttl < time.monotonic():
+                del self._cache[sid]
+                return None
+            self._cache.move_to_end(sid)
+            return payload, expires
+
+    def _remember(self, sid, payload, expires):
+        if not self.cache_ttl:
+            return
+        with self._lock:
+            self._cache[sid] = (time.monotonic(), payload, expires)
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _forget(self, sid=None):
+        with self._lock:
+            if sid is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(sid, None)
+
+    def clear_cache(self):
+        """Drop every cached session, e.g. after rows were removed directly."""
+        self._forget()
+
+    # -- storage -------------------------------------------------------
+
+    def _load(self, sid, now):
+        found = self._cached(sid)
+        if found is None:
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    select(_table.c.data, _table.c.expires).where(_table.c.sid == sid)
+                ).first()
+            if row is None:
+                return None
+            found = tuple(row)
+            self._remember(sid, *found)
+        if found[1] <= now:
+            return None
+        return found
+
+    def _store(self, sid, payload, expires, now, sweep=False):
+        with db.engine.begin() as conn:
+            if sweep:
+                conn.execute(delete(_table).where(_table.c.expires <= now))
+            stmt = insert(_table).values(sid=sid, data=payload, expires=expires)
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=[_table.c.sid],
+                set_={'data': stmt.excluded.data, 'expires': stmt.excluded.expires},
+            ))
+        self._remember(sid, payload, expires)
+
+    def _touch(self, sid, payload, expires):
+        with db.engine.begin() as conn:
+            conn.execute(update(_table).where(_table.c.sid == sid).values(expires=expires))
+        self._remember(sid, payload, expires)
+
+    def _delete(self, sid):
+        with db.engine.begin() as conn:
+            conn.execute(delete(_table).where(_table.c.sid == sid))
+        self._forget(sid)
+
+    def regenerate(self, session):
+        """Move `session` to a fresh id, deleting the row stored under the old one.
+
+        The contents are kept and saved under the new id at the end of the
+        request.  Call it whenever the session's privileges change (sign-in,
+        sign-out), so an id obtained beforehand, e.g. one planted in the
+        victim's browser, never becomes authenticated.
+        """
+        if not session.new:
+            self._delete(session.sid)
+        session.sid = secrets.token_urlsafe(SID_BYTES)
+        session.payload = session.expires = None
+        session.modified = session.replaced = True
+
+    # -- SessionInterface ----------------------------------------------
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and len(sid) <= 64:
+            found = self._load(sid, datetime.utcnow())
+            if found is not None:
+                payload, expires = found
+                return self.session_class(
+                    self.serializer.loads(payload), sid=sid, payload=payload, expires=expires
+                )
+        # Unknown or expired ids are never adopted; a new session gets a fresh id
+        return self.session_class(sid=secrets.token_urlsafe(SID_BYTES))
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        cookie = {
+            'domain': self.get_cookie_domain(app),
+            'path': self.get_cookie_path(app),
+            'secure': self.get_cookie_secure(app),
+            'httponly': self.get_cookie_httponly(app),
+            'samesite': self.get_cookie_samesite(app),
+            'partitioned': self.get_cookie_partitioned(app),
+        }
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if not session.new:
+                self._delete(session.sid)
+            if not session.new or session.replaced:
+                response.delete_cookie(name, **cookie)
+            return
+
+        now = datetime.utcnow()
+        lifetime = app.permanent_session_lifetime
+        payload = session.payload
+        if session.modified:
+            payload = self.serializer.dumps(dict(session))
+        if payload != session.payload:
+            self._store(session.sid, payload, now + lifetime, now, sweep=session.new)
+        elif session.expires - now < lifetime / 2:
+            self._touch(session.sid, payload, now + lifetime)
+        else:
+            return
+
+        if session.new or session.permanent:
+            response.set_cookie(
+                name, session.sid, expires=self.get_expiration_time(app, session), **cookie
+            )
+
+
+def regenerate_session():
+    """Give the current session a fresh id (see `SqliteSessionInterface.regenerate`).
+
+    Cookie sessions carry their data rather than an id, so there is nothing
+    server-side for an old cookie to refer to and nothing to do.
+    """
+    interface = current_app.session_interface
+    if isinstance(interface, SqliteSessionInterface):
+        interface.regenerate(session)
+
+
+def init_sessions(app):
+    """Install the session backend named by SESSION_BACKEND."""
+    backend = app.config.get('SESSION_BACKEND', 'sqlite')
+    if backend == 'sqlite':
+        app.session_interface = SqliteSessionInterface(
+            cache_size=app.config.get('SESSION_CACHE_SIZE', SESSION_CACHE_SIZE),
+            cache_ttl=app.config.get('SESSION_CACHE_TTL', SESSION_CACHE_TTL),
+        )
+    elif backend == 'cookie':
+        app.session_interface = SecureCookieSessionInterface()
+    else:
+        raise ValueError(f"SESSION_BACKEND must be 'sqlite' or 'cookie', not {backend!r}")
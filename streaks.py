@@ -0,0 +1,222 @@
+"""Per-user streak and badge state, maintained incrementally on every write.
+
+The dashboard used to rebuild streaks by loading a user's whole history on
+every request.  Instead, `models.UserStats` holds the counters and the mapper
+events below keep them current whenever a `MoodEntry` is inserted, updated or
+deleted through the ORM; the changes of a flush are applied together once
+it has written its rows.  Bulk deletes (`Query.delete()`) bypass mapper events,
+so the routes that use them call `reset_user_stats()` explicitly.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session, object_session
+
+from extensions import db
+from models import MoodEntry, UserStats
+
+_stats = UserStats.__table__
+_entries = MoodEntry.__table__
+
+STREAK_BADGES = [
+    (1, "🥇 1-Day Streak"),
+    (3, "🥈 3-Day Streak"),
+    (7, "🔥 7-Day Streak"),
+    (14, "✨ 14-Day Streak"),
+    (30, "🌟 30-Day Streak"),
+]
+ENTRY_MILESTONES = [10, 25, 50, 100]
+
+
+def _compute_runs(dates):
+    """Return (last date, run ending at last date, longest run) for sorted unique dates."""
+    if not dates:
+        return None, 0, 0
+    run = longest = 1
+    for prev, cur in zip(dates, dates[1:]):
+        if cur == prev + timedelta(days=1):
+            run += 1
+        else:
+            run = 1
+        longest = max(longest, run)
+    return dates[-1], run, longest
+
+
+def _load(connection, user_id):
+    return connection.execute(
+        select(_stats).where(_stats.c.user_id == user_id)
+    ).mappings().first()
+
+
+def _write(connection, user_id, values):
+    values = dict(values, updated_at=datetime.utcnow())
+    result = connection.execute(
+        update(_stats).where(_stats.c.user_id == user_id).values(**values)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(_stats).values(user_id=user_id, **values))
+
+
+def _entries_on(connection, user_id, day):
+    return connection.execute(
+        select(func.count()).select_from(_entries).where(
+            _entries.c.user_id == user_id,
+            _entries.c.entry_date == day,
+        )
+    ).scalar()
+
+
+def rebuild_user_stats(connection, user_id):
+    """Recompute a user's state from their entries (repair path and first use)."""
+    total = connection.execute(
+        select(func.count()).select_from(_entries).where(_entries.c.user_id == user_id)
+    ).scalar()
+    dates = connection.execute(
+        select(_entries.c.entry_date)
+        .where(_entries.c.user_id == user_id)
+        .distinct()
+        .order_by(_entries.c.entry_date)
+    ).scalars().all()
+    last, run, longest = _compute_runs(dates)
+    values = {
+        'total_entries': total,
+        'last_entry_date': last,
+        'current_run': run,
+        'longest_run': longest,
+    }
+    _write(connection, user_id, values)
+    return values
+
+
+def rebuild_all_user_stats():
+    """Rebuild state for every user that has entries or existing state."""
+    connection = db.session.connection()
+    user_ids = set(connection.execute(select(_entries.c.user_id).distinct()).scalars())
+    user_ids.update(connection.execute(select(_stats.c.user_id)).scalars())
+    for user_id in sorted(user_ids):
+        rebuild_user_stats(connection, user_id)
+    db.session.commit()
+    return len(user_ids)
+
+
+def reset_user_stats(user_id):
+    """Drop a user's state after a bulk delete; it is rebuilt lazily on next read."""
+    db.session.execute(delete(_stats).where(_stats.c.user_id == user_id))
+
+
+def _is_new_day(connection, user_id, day, added, removed):
+    """Whether `day` had no entries before this flush added/removed some on it."""
+    before = _entries_on(connection, user_id, day) - added.count(day) + removed.count(day)
+    return before == 0
+
+
+def entries_changed(connection, user_id, added, removed):
+    """Apply one flush's worth of inserted/deleted entry dates for a user.
+
+    The ORM writes a flush's rows in batches before any after_insert/after_delete
+    event runs, so by now mood_entries already holds every row of the flush.
+    Counting rows on a day therefore says nothing about a single insert; the
+    changes are applied together, against the stored state from before the flush.
+    """
+    state = _load(connection, user_id)
+    if state is None:
+        if added:
+            rebuild_user_stats(connection, user_id)
+        return
+
+    last = state['last_entry_date']
+    if any(_entries_on(connection, user_id, day) == 0 for day in set(removed)):
+        # Removing the only entries on a day can split a run; recount.
+        rebuild_user_stats(connection, user_id)
+        return
+    if any(
+        day <= last and _is_new_day(connection, user_id, day, added, removed)
+        for day in set(added) if last is not None
+    ):
+        # A back-dated entry can bridge two earlier runs; recount.
+        rebuild_user_stats(connection, user_id)
+        return
+
+    values = {'total_entries': max(state['total_entries'] + len(added) - len(removed), 0)}
+    run, longest = state['current_run'], state['longest_run']
+    for day in sorted({day for day in added if last is None or day > last}):
+        run = run + 1 if last is not None and day == last + timedelta(days=1) else 1
+        longest = max(longest, run)
+        last = day
+        values.update(last_entry_date=last, current_run=run, longest_run=longest)
+    _write(connection, user_id, values)
+
+
+def _changes(target, user_id):
+    """The (added, removed) entry dates recorded for `user_id` in the current flush."""
+    pending = object_session(target).info.setdefault('streak_changes', {})
+    return pending.setdefault(user_id, ([], []))
+
+
+@event.listens_for(MoodEntry, 'after_insert')
+def _after_insert(mapper, connection, target):
+    _changes(target, target.user_id)[0].append(target.entry_date)
+
+
+@event.listens_for(MoodEntry, 'after_delete')
+def _after_delete(mapper, connection, target):
+    _changes(target, target.user_id)[1].append(target.entry_date)
+
+
+@event.listens_for(MoodEntry, 'after_update')
+def _after_update(mapper, connection, target):
+    attrs = inspect(target).attrs
+    user_hist = attrs.user_id.history
+    date_hist = attrs.entry_date.history
+    old_user = user_hist.deleted[0] if user_hist.deleted else target.user_id
+    old_date = date_hist.deleted[0] if date_hist.deleted else target.entry_date
+    if old_user == target.user_id and old_date == target.entry_date:
+        return
+    _changes(target, old_user)[1].append(old_date)
+    _changes(target, target.user_id)[0].append(target.entry_date)
+
+
+@event.listens_for(Session, 'before_flush')
+def _forget_failed_flush(session, flush_context, instances):
+    session.info.pop('streak_changes', None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_changes(session, flush_context):
+    changes = session.info.pop('streak_changes', None)
+    if changes:
+        connection = session.connection()
+        for user_id in sorted(changes):
+            entries_changed(connection, user_id, *changes[user_id])
+
+
+def badges_for(current_streak, total_entries):
+    badges = [label for days, label in STREAK_BADGES if current_streak >= days]
+    badges.extend(f"📘 {m} Entries" for m in ENTRY_MILESTONES if total_entries >= m)
+    badges.sort()
+    return badges
+
+
+def get_user_stats(user_id):
+    """Return the stored state for a user, building it on first access."""
+    stats = _load(db.session.connection(), user_id)
+    if stats is None:
+        stats = rebuild_user_stats(db.session.connection(), user_id)
+        db.session.commit()
+    return stats
+
+
+def streak_summary(user_id, today):
+    """O(1) streak/badge view of a user's state as of `today`."""
+    stats = get_user_stats(user_id)
+    last = stats['last_entry_date']
+    if last is not None and last in (today, today - timedelta(days=1)):
+        current_streak = stats['current_run']
+    else:
+        current_streak = 0
+    return {
+        'current_streak': current_streak,
+        'longest_streak': stats['longest_run'],
+        'total_entries': stats['total_entries'],
+        'badges': badges_for(current_streak, stats['total_entries']),
+    }
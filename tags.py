@@ -0,0 +1,99 @@
+"""Entry tags: parsing, filtering and per-tag aggregates.
+
+Tags are stored one row per (entry, tag) in ``entry_tags`` (`models.EntryTag`)
+and assigned through ``MoodEntry.tags``.  Each row repeats the entry's
+``user_id``, so "which of my entries carry this tag" and "how many entries and
+what average mood per tag" are answered from the ``(user_id, tag, entry_id)``
+index and a primary-key lookup per entry, without reading any other user's
+rows or splitting tag text in Python.
+
+A trigger removes an entry's tags when the entry is deleted, so the bulk
+``Query.delete()`` calls (delete all, delete account) that bypass the ORM
+cascade leave no tags behind for a reused entry id to pick up.  Like the
+search index it is created with the table and by migration 7.
+"""
+import re
+
+from sqlalchemy import event, func, select
+
+from extensions import db
+from models import EntryTag, MoodEntry
+
+MAX_TAGS = 10
+TAG_LENGTH = EntryTag.__table__.c.tag.type.length
+# Tags listed as filters on /logs and /dashboard, most used first
+MAX_FACETS = 20
+
+_SPACE = re.compile(r'\s+')
+
+_TRIGGER = """CREATE TRIGGER IF NOT EXISTS mood_entries_tags_ad AFTER DELETE ON mood_entries BEGIN
+    DELETE FROM entry_tags WHERE entry_id = old.id;
+    END"""
+
+
+def create_tag_trigger(connection):
+    connection.exec_driver_sql(_TRIGGER)
+
+
+def _create_for_new_table(target, connection, **kw):
+    create_tag_trigger(connection)
+
+
+event.listen(EntryTag.__table__, 'after_create', _create_for_new_table)
+
+
+@event.listens_for(EntryTag, 'before_insert')
+def _copy_owner(mapper, connection, target):
+    target.user_id = target.entry.user_id
+
+
+def normalize_tag(name):
+    """Lower-case `name`, drop a leading '#' and collapse whitespace; None if empty."""
+    name = _SPACE.sub(' ', (name or '').strip().lstrip('#').strip()).lower()
+    return name[:TAG_LENGTH] or None
+
+
+def parse_tags(text):
+    """The distinct tags in comma-separated `text`, in order, at most MAX_TAGS."""
+    tags = []
+    for part in (text or '').split(','):
+        tag = normalize_tag(part)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags[:MAX_TAGS]
+
+
+def tagged_entry_ids(user_id, tag):
+    """A subquery of the ids of `user_id`'s entries tagged `tag`."""
+    return select(EntryTag.entry_id).where(EntryTag.user_id == user_id, EntryTag.tag == tag)
+
+
+def filter_by_tag(query, user_id, tag):
+    """Narrow a MoodEntry query to entries carrying `tag` (no-op if `tag` is empty)."""
+    if not tag:
+        return query
+    return query.filter(MoodEntry.id.in_(tagged_entry_ids(user_id, tag)))
+
+
+def tag_summary(user_id, start=None, end=None, limit=MAX_FACETS):
+    """Per-tag entry counts and average rating, most used first.
+
+    `start`/`end` restrict to entries dated in [start, end).  Returns a list
+    of {'tag', 'count', 'average'} dicts.
+    """
+    stmt = (
+        select(EntryTag.tag, func.count(), func.avg(MoodEntry.mood_rating))
+        .join(MoodEntry, MoodEntry.id == EntryTag.entry_id)
+        .where(EntryTag.user_id == user_id)
+        .group_by(EntryTag.tag)
+        .order_by(func.count().desc(), EntryTag.tag)
+        .limit(limit)
+    )
+    if start is not None:
+        stmt = stmt.where(MoodEntry.entry_date >= start)
+    if end is not None:
+        stmt = stmt.where(MoodEntry.entry_date < end)
+    return [
+        {'tag': tag, 'count': count, 'average': round(average, 1)}
+        for tag, count, average in db.session.execute(stmt)
+    ]
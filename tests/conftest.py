@@ -4,9 +4,9 @@ This version ensures CI runs all tests in-memory and isolated.
 """
 
 import pytest
+
 from app import app as flask_app
 from extensions import db
-from models import MoodEntry, User  # Import models to ensure they are loaded
 
 
 @pytest.fixture(scope="session")
@@ -43,7 +43,30 @@ def clear_db(app):
     """Clear all data between tests to ensure isolation."""
     yield
     with app.app_context():
-        from models import MoodEntry, User
+        from app import check_password_limiter
+        from caching import clear_response_cache
+        from media import forget_image_access
+        from models import (
+            EntryTag,
+            MoodEntry,
+            SessionRecord,
+            UploadBlob,
+            User,
+            UserStats,
+            WeeklySummary,
+        )
         db.session.query(MoodEntry).delete()
+        db.session.query(EntryTag).delete()
         db.session.query(User).delete()
-        db.session.commit()
\ No newline at end of file
+        db.session.query(UserStats).delete()
+        db.session.query(WeeklySummary).delete()
+        db.session.query(UploadBlob).delete()
+        db.session.query(SessionRecord).delete()
+        db.session.commit()
+        app.session_interface.clear_cache()
+        clear_response_cache()
+        forget_image_access()
+        check_password_limiter.reset()
+    # Requests and bare db.session calls outside `app.app_context()` share the
+    # session-wide context's session; drop the previous test's objects from it
+    db.session.remove()
@@ -277,6 +277,53 @@ class TestCheckPasswordEndpoint:
             assert response.status_code == 200
             assert response.json == {'correct': False}
 
+    def test_check_password_reuses_recent_verification(self, app, client, monkeypatch):
+        """Test that re-checking a just-verified password does not hash again."""
+        with app.app_context():
+            user = User(username='testuser', email='test@example.com')
+            user.set_password('mypassword')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+
+            with client.session_transaction() as sess:
+                sess['logged_in'] = True
+                sess['user_id'] = user_id
+
+            assert client.post('/check-password', json={'password': 'mypassword'}).json == {'correct': True}
+
+            calls = []
+            monkeypatch.setattr(User, 'check_password', lambda self, pw: calls.append(pw) or False)
+            for _ in range(10):
+                response = client.post('/check-password', json={'password': 'mypassword'})
+                assert response.json == {'correct': True}
+            assert calls == []
+
+            # A different password still goes through (and fails) verification
+            assert client.post('/check-password', json={'password': 'other'}).json == {'correct': False}
+            assert calls == ['other']
+
+    def test_check_password_is_rate_limited(self, app, client):
+        """Test that repeated failing checks are throttled per user."""
+        with app.app_context():
+            user = User(username='testuser', email='test@example.com')
+            user.set_password('mypassword')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+
+            with client.session_transaction() as sess:
+                sess['logged_in'] = True
+                sess['user_id'] = user_id
+
+            burst = app.config['CHECK_PASSWORD_BURST']
+            for _ in range(burst):
+                assert client.post('/check-password', json={'password': 'nope'}).status_code == 200
+            response = client.post('/check-password', json={'password': 'mypassword'})
+            assert response.status_code == 429
+            assert response.json['correct'] is False
+            assert response.json['retry_after'] > 0
+
 
 class TestWeeklySummaries:
     """Tests for the /weekly-summaries route and weekly aggregation logic."""
@@ -544,3 +591,146 @@ class TestWeeklySummaries:
             assert b'User1Entry' in response.data
             # Should not contain user2's mood label
             assert b'User2Entry' not in response.data
+
+    def test_weekly_rollup_tracks_writes(self, app):
+        """Test that the weekly rollup follows inserts, edits and deletes."""
+        from models import WeeklySummary
+        with app.app_context():
+            user = User(username='testuser', email='test@example.com')
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+
+            monday = date(2025, 11, 10)
+            entries = [
+                MoodEntry(user_id=user_id, entry_date=monday + timedelta(days=i),
+                          mood_rating=rating, mood_label=f'Mood{rating}')
+                for i, rating in enumerate([3, 9, 5])
+            ]
+            db.session.add_all(entries)
+            db.session.commit()
+
+            week = db.session.get(WeeklySummary, (user_id, monday))
+            assert (week.entry_count, week.rating_sum) == (3, 17)
+            assert (week.min_rating, week.min_entry_id) == (3, entries[0].id)
+            assert (week.max_rating, week.max_entry_id) == (9, entries[1].id)
+
+            # Deleting the highest entry recomputes the week's max
+            db.session.delete(entries[1])
+            db.session.commit()
+            db.session.expire_all()
+            week = db.session.get(WeeklySummary, (user_id, monday))
+            assert (week.entry_count, week.rating_sum, week.max_rating) == (2, 8, 5)
+
+            # Moving an entry to the next week updates both weeks
+            entries[0].entry_date = monday + timedelta(days=7)
+            db.session.commit()
+            db.session.expire_all()
+            week = db.session.get(WeeklySummary, (user_id, monday))
+            assert (week.entry_count, week.min_rating, week.max_rating) == (1, 5, 5)
+            next_week = db.session.get(WeeklySummary, (user_id, monday + timedelta(days=7)))
+            assert (next_week.entry_count, next_week.rating_sum) == (1, 3)
+
+    def test_weekly_rollup_counts_each_change_once_per_flush(self, app):
+        """Test that several deletes and edits in one commit are each applied once."""
+        from models import WeeklySummary
+        with app.app_context():
+            user = User(username='testuser', email='test@example.com')
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+
+            monday = date(2025, 11, 10)
+            entries = [
+                MoodEntry(user_id=user_id, entry_date=monday + timedelta(days=i),
+                          mood_rating=rating, mood_label=f'Mood{rating}')
+                for i, rating in enumerate([6, 9, 8, 4, 7])
+            ]
+            db.session.add_all(entries)
+            db.session.commit()
+
+            # The week's max and an ordinary entry go in the same flush
+            db.session.delete(entries[1])
+            db.session.delete(entries[4])
+            db.session.commit()
+            db.session.expire_all()
+            week = db.session.get(WeeklySummary, (user_id, monday))
+            assert (week.entry_count, week.rating_sum) == (3, 18)
+            assert (week.max_rating, week.max_entry_id) == (8, entries[2].id)
+
+            # An edit into the week alongside a new entry there
+            entries[3].mood_rating = 5
+            db.session.add(MoodEntry(user_id=user_id, entry_date=monday + timedelta(days=5),
+                                     mood_rating=2, mood_label='Mood2'))
+            db.session.commit()
+            db.session.expire_all()
+            week = db.session.get(WeeklySummary, (user_id, monday))
+            assert (week.entry_count, week.rating_sum, week.min_rating) == (4, 21, 2)
+
+    def test_weekly_summaries_pages_and_expands(self, app, client):
+        """Test that weeks are paged newest first and entries load only when expanded."""
+        with app.app_context():
+            app.config['WEEKS_PAGE_SIZE'] = 2
+            try:
+                user = User(username='testuser', email='test@example.com')
+                user.set_password('password')
+                db.session.add(user)
+                db.session.commit()
+                user_id = user.id
+
+                for week in range(3):
+                    monday = date(2025, 11, 3) + timedelta(weeks=week)
+                    db.session.add_all([
+                        MoodEntry(user_id=user_id, entry_date=monday, mood_rating=4, mood_label=f'Low{week}'),
+                        MoodEntry(user_id=user_id, entry_date=monday + timedelta(days=1),
+                                  mood_rating=6, mood_label=f'Mid{week}'),
+                        MoodEntry(user_id=user_id, entry_date=monday + timedelta(days=2),
+                                  mood_rating=8, mood_label=f'High{week}'),
+                    ])
+                db.session.commit()
+
+                with client.session_transaction() as sess:
+                    sess['logged_in'] = True
+                    sess['user_id'] = user_id
+
+                response = client.get('/weekly-summaries')
+                assert b'High2' in response.data and b'High1' in response.data
+                assert b'High0' not in response.data
+                assert b'Mid2' not in response.data  # collapsed weeks show only highs/lows
+                assert b'before=2025-11-10' in response.data
+
+                response = client.get('/weekly-summaries?before=2025-11-10')
+                assert b'High0' in response.data and b'High1' not in response.data
+                assert b'Older weeks' not in response.data
+
+                response = client.get('/weekly-summaries?expand=2025-11-17')
+                assert b'Mid2' in response.data
+                assert b'Mid1' not in response.data
+            finally:
+                app.config['WEEKS_PAGE_SIZE'] = 12
+
+    def test_weekly_summaries_backfills_missing_rollup(self, app, client):
+        """Test that rows written before the rollup existed are summarized on first view."""
+        from models import WeeklySummary
+        with app.app_context():
+            user = User(username='testuser', email='test@example.com')
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+
+            db.session.add(MoodEntry(user_id=user_id, entry_date=date(2025, 11, 10),
+                                     mood_rating=7, mood_label='Legacy'))
+            db.session.commit()
+            db.session.query(WeeklySummary).delete()
+            db.session.commit()
+
+            with client.session_transaction() as sess:
+                sess['logged_in'] = True
+                sess['user_id'] = user_id
+
+            response = client.get('/weekly-summaries')
+            assert b'Legacy' in response.data
+            assert WeeklySummary.query.filter_by(user_id=user_id).count() == 1
@@ -0,0 +1,83 @@
+"""
+Tests for the request-scoped current user and login_required (auth.py).
+"""
+from sqlalchemy import event
+
+from extensions import db
+from models import User
+
+
+def _login(app, client, username='current'):
+    with app.app_context():
+        user = User(username=username, email=f'{username}@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        with client.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['user_id'] = user.id
+        return user.id
+
+
+def _count_user_queries(app):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if 'FROM users' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    return statements, lambda: event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def test_profile_reads_the_user_once(app, client):
+    _login(app, client)
+    statements, stop = _count_user_queries(app)
+    try:
+        assert client.get('/profile').status_code == 200
+    finally:
+        stop()
+    assert len(statements) == 1
+
+
+def test_user_deleted_by_another_worker_is_logged_out(app, client):
+    user_id = _login(app, client)
+    assert client.get('/profile').status_code == 200
+    with app.app_context():
+        # A Core delete fires no mapper events, like a delete in another process
+        db.session.execute(User.__table__.delete().where(User.__table__.c.id == user_id))
+        db.session.commit()
+
+    for path in ('/profile', '/account'):
+        response = client.get(path)
+        assert response.status_code == 302
+    with client.session_transaction() as sess:
+        assert not sess.get('logged_in')
+
+
+def test_deleted_user_is_logged_out(app, client):
+    user_id = _login(app, client)
+    with app.app_context():
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+
+    response = client.get('/home')
+    assert response.status_code == 302
+    with client.session_transaction() as sess:
+        assert not sess.get('logged_in')
+
+
+def test_anonymous_json_request_gets_401(client):
+    response = client.post('/toggle-privacy/1', headers={'Accept': 'application/json'})
+    assert response.status_code == 401
+    assert response.get_json() == {'error': 'login_required'}
+
+
+def test_profile_rejects_taken_email(app, client):
+    _login(app, client, 'other')
+    _login(app, client)
+    response = client.post('/profile', data={
+        'action': 'update_profile', 'username': 'current', 'email': 'other@example.com',
+    }, follow_redirects=True)
+    assert b'Email already taken' in response.data
@@ -102,3 +102,104 @@ def test_entry_count_badges(client, app):
 
         # Badge should appear
         assert b"10 Entries" in res.data
+
+
+def test_streak_state_tracks_deletes_and_backfill(client, app):
+    """Stored streak state follows inserts, back-dated entries and deletes."""
+    from streaks import get_user_stats
+
+    with app.app_context():
+        user = create_user()
+        today = date.today()
+
+        # Two runs separated by a one-day gap: [-5, -4] and [-2, -1]
+        add_entries(user.id, [today - timedelta(days=d) for d in (5, 4, 2, 1)])
+        stats = get_user_stats(user.id)
+        assert stats['total_entries'] == 4
+        assert stats['current_run'] == 2
+        assert stats['longest_run'] == 2
+
+        # Back-filling the gap joins the runs
+        add_entries(user.id, [today - timedelta(days=3)])
+        stats = get_user_stats(user.id)
+        assert stats['current_run'] == 5
+        assert stats['longest_run'] == 5
+
+        # Deleting the middle day splits them again
+        middle = MoodEntry.query.filter_by(user_id=user.id, entry_date=today - timedelta(days=3)).first()
+        db.session.delete(middle)
+        db.session.commit()
+        stats = get_user_stats(user.id)
+        assert stats['total_entries'] == 4
+        assert stats['current_run'] == 2
+        assert stats['longest_run'] == 2
+
+
+def test_delete_all_entries_resets_streak(client, app):
+    """Bulk deleting entries clears the stored streak state."""
+    with app.app_context():
+        user = create_user()
+        login(client)
+
+        today = date.today()
+        add_entries(user.id, [today - timedelta(days=i) for i in range(3)])
+
+        client.post("/delete-all-entries")
+        res = client.get("/dashboard")
+        assert b"0 days" in res.data
+        assert b"1-Day Streak" not in res.data
+
+
+def test_rebuild_stats_command(client, app):
+    """The rebuild-stats CLI command repairs stale state."""
+    from models import UserStats
+
+    with app.app_context():
+        user = create_user()
+        today = date.today()
+        add_entries(user.id, [today - timedelta(days=i) for i in range(3)])
+
+        stats = db.session.get(UserStats, user.id)
+        stats.current_run = 99
+        stats.total_entries = 0
+        db.session.commit()
+
+        result = app.test_cli_runner().invoke(args=["rebuild-stats"])
+        assert "Rebuilt streak stats" in result.output
+
+        db.session.expire_all()
+        stats = db.session.get(UserStats, user.id)
+        assert stats.current_run == 3
+        assert stats.total_entries == 3
+
+
+def test_streak_state_with_several_entries_in_one_flush(client, app):
+    """Entries added together (one ORM batch) still advance the runs once per day."""
+    from streaks import get_user_stats, rebuild_user_stats
+
+    with app.app_context():
+        user = create_user()
+        today = date.today()
+        yesterday = today - timedelta(days=1)
+
+        # No stored state yet: same-day duplicates are counted once each
+        db.session.add_all([
+            MoodEntry(user_id=user.id, entry_date=yesterday, mood_rating=5),
+            MoodEntry(user_id=user.id, entry_date=yesterday, mood_rating=6),
+        ])
+        db.session.commit()
+        assert get_user_stats(user.id)['total_entries'] == 2
+
+        # Two entries for a new day in one flush
+        db.session.add_all([
+            MoodEntry(user_id=user.id, entry_date=today, mood_rating=5),
+            MoodEntry(user_id=user.id, entry_date=today, mood_rating=6),
+        ])
+        db.session.commit()
+        stats = dict(get_user_stats(user.id))
+        assert stats['last_entry_date'] == today
+        assert stats['current_run'] == 2
+        assert stats['total_entries'] == 4
+
+        expected = rebuild_user_stats(db.session.connection(), user.id)
+        assert {key: stats[key] for key in expected} == expected
@@ -0,0 +1,160 @@
+"""
+Tests for per-user response caching and data-version ETags (caching.py).
+"""
+import io
+import os
+from datetime import date
+
+from sqlalchemy import event
+
+from caching import MemoryCache, init_response_cache
+from extensions import db
+from models import MoodEntry, User
+
+
+def _login(app, client, username='cached'):
+    with app.app_context():
+        user = User(username=username, email=f'{username}@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        with client.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['user_id'] = user.id
+        return user.id
+
+
+def _count_entry_queries(app):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if 'FROM mood_entries' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    return statements, lambda: event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def _version(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).data_version
+
+
+def test_pages_are_served_from_cache_until_a_write(app, client):
+    _login(app, client)
+    client.post('/mood-journal', data={'title': 'Sunny', 'date': '2025-05-01', 'mood_rating': '7'})
+    assert b'Sunny' in client.get('/logs').data
+
+    statements, stop = _count_entry_queries(app)
+    try:
+        assert b'Sunny' in client.get('/logs').data
+    finally:
+        stop()
+    assert statements == []
+
+    client.post('/mood-journal', data={'title': 'Rainy', 'date': '2025-05-02', 'mood_rating': '4'})
+    assert b'Rainy' in client.get('/logs').data
+
+
+def test_etag_revalidates_until_the_data_version_moves(app, client):
+    user_id = _login(app, client)
+    with app.app_context():
+        entry = MoodEntry(user_id=user_id, entry_date=date(2025, 5, 1), mood_rating=6)
+        db.session.add(entry)
+        db.session.commit()
+        entry_id = entry.id
+
+    first = client.get('/dashboard')
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+    assert client.get('/dashboard', headers={'If-None-Match': etag}).status_code == 304
+
+    before = _version(app, user_id)
+    client.post(f'/toggle-privacy/{entry_id}', headers={'X-Requested-With': 'XMLHttpRequest'})
+    assert _version(app, user_id) == before + 1
+    again = client.get('/dashboard', headers={'If-None-Match': etag})
+    assert again.status_code == 200
+    assert again.headers['ETag'] != etag
+
+
+def test_bulk_write_paths_bump_the_version(app, client):
+    user_id = _login(app, client)
+    before = _version(app, user_id)
+    client.post('/import', data={
+        'file': (io.BytesIO(b'Date,Rating\n2025-01-01,5\n'), 'entries.csv'),
+    }, content_type='multipart/form-data')
+    after_import = _version(app, user_id)
+    assert after_import > before
+
+    client.post('/delete-all-entries')
+    assert _version(app, user_id) > after_import
+    assert b'No entries yet' in client.get('/logs').data
+
+
+def test_flash_messages_bypass_the_cache(app, client):
+    _login(app, client)
+    client.get('/profile')
+    response = client.post('/profile', data={
+        'action': 'update_profile', 'username': '', 'email': 'x@example.com',
+    }, follow_redirects=True)
+    assert b'Username cannot be empty' in response.data
+
+
+def test_shared_backend_and_memory_lru(app, client):
+    class DictStore:
+        def __init__(self):
+            self.data = {}
+
+        def get(self, key):
+            return self.data.get(key)
+
+        def set(self, key, value, timeout=None):
+            self.data[key] = value
+
+    store = DictStore()
+    app.config['RESPONSE_CACHE_BACKEND'] = store
+    try:
+        init_response_cache(app)
+        _login(app, client)
+        client.get('/weekly-summaries')
+        assert len(store.data) == 1
+        assert all(isinstance(v, bytes) for v in store.data.values())
+    finally:
+        app.config['RESPONSE_CACHE_BACKEND'] = 'memory'
+        init_response_cache(app)
+
+    lru = MemoryCache(max_bytes=10)
+    lru.set('a', b'12345')
+    lru.set('b', b'12345')
+    lru.get('a')
+    lru.set('c', b'12345')
+    assert lru.get('a') == b'12345'
+    assert lru.get('b') is None
+
+
+def test_pages_with_images_cache_unless_a_variant_is_pending(app, client, tmp_path, monkeypatch):
+    upload_folder = tmp_path / 'uploads'
+    upload_folder.mkdir()
+    monkeypatch.setattr(app, 'static_folder', str(tmp_path))
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(upload_folder))
+    original = upload_folder / 'pic.png'
+    original.write_bytes(b'png')
+    user_id = _login(app, client)
+    with app.app_context():
+        db.session.add(MoodEntry(user_id=user_id, entry_date=date(2025, 5, 1), mood_rating=6,
+                                 image_path='uploads/pic.png'))
+        db.session.commit()
+
+    # Just written: the thumbnail may follow, so the page is not cached
+    assert 'ETag' not in client.get('/logs').headers
+
+    # An old original will not get one any more
+    os.utime(original, (0, 0))
+    assert 'ETag' in client.get('/logs').headers
+
+    # Nor will anything once variants are off (no Pillow)
+    original.touch()
+    monkeypatch.setattr('uploads.Image', None)
+    client.post('/mood-journal', data={'title': 'Bump', 'date': '2025-05-02', 'mood_rating': '5'})
+    assert 'ETag' in client.get('/logs').headers
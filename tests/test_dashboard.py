@@ -199,4 +199,86 @@ def test_calendar_edge_cases(client, app):
         response = client.get("/dashboard?year=2024&month=2")
         assert response.status_code == 200
         # February 2024 should show 29 days in the calendar
-        assert b"29" in response.data
\ No newline at end of file
+        assert b"29" in response.data
+
+def test_month_view_aggregates(app):
+    """The aggregation layer computes month, week and last-7 stats in one pass."""
+    from aggregates import month_view
+
+    with app.app_context():
+        user = create_test_user()
+        today = date.today()
+        create_test_entries(user.id, base_date=today)
+        # Second entry on today's date: counted in the distribution, averaged in the calendar
+        db.session.add(MoodEntry(user_id=user.id, entry_date=today, mood_rating=10, mood_label="Great"))
+        db.session.commit()
+
+        view = month_view(user.id, today.year, today.month, today)
+
+        in_month = [today - timedelta(days=i) for i in range(3) if (today - timedelta(days=i)).month == today.month]
+        ratings = {today: [8, 10], today - timedelta(days=1): [5], today - timedelta(days=2): [3]}
+        expected = [r for d in in_month for r in ratings[d]]
+        assert view['total_entries'] == len(expected)
+        assert view['average_mood'] == sum(expected) / len(expected)
+        assert sum(view['mood_distribution']) == len(expected)
+
+        assert view['last7_trend'][-1] == 9.0
+        assert view['last7_trend'][-2] == 5.0
+        assert view['last7_trend'][-3] == 3.0
+        assert view['weekly_trend'][today.weekday()] == 9.0
+
+        cells = {d: (mood, bucket) for week in view['calendar_dates'] for d, mood, bucket in week if d}
+        assert cells[today] == (9, "excellent")
+
+
+def test_api_month_matches_rendered_dashboard(client, app):
+    """The month endpoint carries the figures the page renders, for any month."""
+    with app.app_context():
+        user = create_test_user()
+        create_test_entries(user.id, date(2025, 6, 15))
+        login(client)
+
+        data = client.get("/api/dashboard/month?year=2025&month=6").get_json()
+        assert data["version"] == 1
+        assert data["title"] == "June 2025"
+        assert data["total_entries"] == 3
+        assert data["average_mood"] == 5.3
+        assert data["mood_distribution"] == [0, 1, 1, 1, 0]
+        cells = {c["date"]: c["bucket"] for week in data["calendar"] for c in week if c}
+        assert len(cells) == 30
+        assert cells["2025-06-15"] == "good" and cells["2025-06-13"] == "bad"
+        # Weeks start on Sunday: June 2025 runs from Sunday the 1st to Monday the 30th
+        assert data["calendar"][0][0]["date"] == "2025-06-01"
+        assert data["calendar"][-1][2] is None
+        assert client.get("/api/dashboard/month?year=2025&month=13").get_json()["title"] == "January 2026"
+
+
+def test_api_streaks_and_trends(client, app):
+    """Streaks and trends are separate endpoints that ignore the month."""
+    with app.app_context():
+        user = create_test_user()
+        create_test_entries(user.id)
+        login(client)
+
+        streaks = client.get("/api/dashboard/streaks").get_json()
+        assert streaks["current_streak"] == 3
+        assert streaks["logged_today"] is True
+
+        trends = client.get("/api/dashboard/trends").get_json()
+        assert trends["last7_trend"][-3:] == [3.0, 5.0, 8.0]
+        assert len(trends["weekly_trend"]) == 7
+
+
+def test_api_requires_login_and_revalidates(client, app):
+    """API calls answer 401 JSON when anonymous and 304 when unchanged."""
+    with app.app_context():
+        response = client.get("/api/dashboard/month")
+        assert response.status_code == 401
+        assert response.get_json() == {"error": "login_required"}
+
+        create_test_user()
+        login(client)
+        first = client.get("/api/dashboard/streaks")
+        assert "no-cache" in first.headers["Cache-Control"]
+        again = client.get("/api/dashboard/streaks", headers={"If-None-Match": first.headers["ETag"]})
+        assert again.status_code == 304
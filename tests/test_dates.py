@@ -0,0 +1,31 @@
+from datetime import date, datetime
+
+from dates import normalize_dates, to_date
+
+
+def test_to_date_fast_path_returns_same_object():
+    d = date(2025, 1, 2)
+    assert to_date(d) is d
+
+
+def test_to_date_legacy_formats():
+    assert to_date(datetime(2025, 1, 2, 15, 30)) == date(2025, 1, 2)
+    assert to_date("2025-01-02") == date(2025, 1, 2)
+    assert to_date("2025-01-02T08:00:00") == date(2025, 1, 2)
+    assert to_date("20250102") == date(2025, 1, 2)
+    assert to_date(20250102) == date(2025, 1, 2)
+    assert to_date(0) == datetime.fromtimestamp(0).date()
+    assert to_date("not a date") is None
+    assert to_date(None) is None
+
+
+def test_normalize_dates_batches_legacy_values():
+    values = ["2025-01-02", "2025-01-02", 20250103, date(2025, 1, 4), "bad"]
+    assert normalize_dates(values) == [
+        date(2025, 1, 2), date(2025, 1, 2), date(2025, 1, 3), date(2025, 1, 4), None
+    ]
+
+
+def test_normalize_dates_typed_column_untouched():
+    values = [date(2025, 1, d) for d in range(1, 10)]
+    assert normalize_dates(values) == values
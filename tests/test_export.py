@@ -73,3 +73,111 @@ def test_export_range():
     reader = list(csv.reader(StringIO(response.data.decode())))
     assert len(reader) == 2   # header + 1 row
     assert reader[1][2] == "Good"
+
+
+def test_export_all_streams_in_chunks():
+    import exports
+
+    tester = app.test_client()
+    with app.app_context():
+        seed_entries()
+        db.session.add_all([
+            MoodEntry(user_id=1, entry_date=date(2024, 1, 1), mood_rating=5,
+                      mood_label="Bulk", notes="x" * 200)
+            for _ in range(50)
+        ])
+        db.session.commit()
+
+    original = exports.BATCH_SIZE
+    exports.BATCH_SIZE = 10
+    try:
+        response = tester.get("/export-all", buffered=False)
+        assert response.is_streamed
+        chunks = list(response.response)
+    finally:
+        exports.BATCH_SIZE = original
+        response.close()
+
+    assert len(chunks) > 1
+    reader = list(csv.reader(StringIO("".join(c.decode() if isinstance(c, bytes) else c for c in chunks))))
+    assert len(reader) == 1 + 52
+
+
+def test_export_all_ndjson():
+    import json
+
+    tester = app.test_client()
+    with app.app_context():
+        seed_entries()
+
+    response = tester.get("/export-all?format=ndjson")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    assert "all_entries.ndjson" in response.headers["Content-Disposition"]
+
+    records = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [r["mood_label"] for r in records] == ["Tired", "Good"]
+    assert records[1]["date"] == "2025-01-01"
+    assert records[1]["time_spent_seconds"] == 45
+
+
+def test_export_range_columnar_round_trip():
+    from exports import read_columnar
+
+    tester = app.test_client()
+    with app.app_context():
+        seed_entries()
+
+    response = tester.get("/export-range?start_date=2025-01-01&end_date=2025-01-31&format=columnar")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/octet-stream"
+
+    columns = read_columnar(response.data)
+    assert columns["date"] == [date(2025, 1, 1), date(2025, 1, 3)]
+    assert columns["mood_label"] == ["Good", "Tired"]
+    assert columns["rating"] == [7, 4]
+    assert columns["notes"] == ["Test note 1", "Test note 2"]
+
+
+def test_columnar_marks_missing_values_as_null():
+    from datetime import datetime
+
+    from exports import export_stream, read_columnar
+
+    entries = [
+        MoodEntry(id=1, entry_date=date(2025, 1, 1), mood_rating=7, mood_label="Good",
+                  notes="", time_spent_seconds=0, timestamp=datetime(1970, 1, 1)),
+        MoodEntry(id=2, entry_date="not a date", mood_rating=4, mood_label=None,
+                  notes=None, time_spent_seconds=None, timestamp=None),
+    ]
+    columns = read_columnar(b"".join(export_stream(entries, "columnar")))
+    # zero, the epoch and "" are values; missing ones come back as None
+    assert columns["time_spent_seconds"] == [0, None]
+    assert columns["created_at"] == [datetime(1970, 1, 1), None]
+    assert columns["notes"] == ["", None]
+    assert columns["mood_label"] == ["Good", None]
+    assert columns["date"] == [date(2025, 1, 1), None]
+    assert columns["rating"] == [7, 4]
+
+
+def test_export_unknown_format_redirects():
+    tester = app.test_client()
+    response = tester.get("/export-all?format=xlsx")
+    assert response.status_code == 302
+
+
+def test_exports_skip_private_entries():
+    tester = app.test_client()
+    with app.app_context():
+        seed_entries()
+        db.session.add(MoodEntry(user_id=1, entry_date=date(2025, 1, 2), mood_rating=2,
+                                 mood_label="Secret", is_private=True))
+        db.session.commit()
+
+    all_rows = list(csv.reader(StringIO(tester.get("/export-all").data.decode())))
+    range_rows = list(csv.reader(StringIO(
+        tester.get("/export-range?start_date=2025-01-01&end_date=2025-01-31").data.decode()
+    )))
+    assert "Secret" not in [r[2] for r in all_rows]
+    assert "Secret" not in [r[2] for r in range_rows]
+    assert len(range_rows) == 3
@@ -0,0 +1,155 @@
+"""
+Tests for bulk entry import (imports.py and the /import route).
+"""
+import io
+import json
+from datetime import date, datetime
+
+from exports import export_stream
+from extensions import db
+from models import MoodEntry, User, WeeklySummary
+from streaks import get_user_stats
+
+
+def _login(app, client):
+    with app.app_context():
+        user = User(username='importer', email='importer@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        with client.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['user_id'] = user.id
+        return user.id
+
+
+def test_csv_export_round_trips_through_import(app, client):
+    user_id = _login(app, client)
+    with app.app_context():
+        db.session.add_all([
+            MoodEntry(user_id=user_id, entry_date=date(2025, 3, d), mood_rating=d,
+                      mood_label=f'Day {d}', notes='note, with comma', time_spent_seconds=d)
+            for d in range(1, 4)
+        ])
+        db.session.commit()
+        exported = ''.join(export_stream(MoodEntry.query.filter_by(user_id=user_id), 'csv'))
+        MoodEntry.query.filter_by(user_id=user_id).delete()
+        db.session.commit()
+
+    response = client.post('/import?format=csv', data=exported.encode(),
+                           content_type='text/csv')
+    report = response.get_json()
+    assert report['imported'] == 3
+    assert report['skipped'] == 0
+
+    with app.app_context():
+        entries = MoodEntry.query.filter_by(user_id=user_id).order_by(MoodEntry.entry_date).all()
+        assert [e.mood_label for e in entries] == ['Day 1', 'Day 2', 'Day 3']
+        assert entries[0].notes == 'note, with comma'
+        # Derived tables were rebuilt despite the Core inserts
+        assert get_user_stats(user_id)['total_entries'] == 3
+        assert WeeklySummary.query.filter_by(user_id=user_id).count() == 2
+
+
+def test_ndjson_import_reports_invalid_rows(app, client):
+    user_id = _login(app, client)
+    lines = [
+        {'date': '2025-04-01', 'rating': 6, 'mood_label': 'Fine'},
+        {'date': 'not a date', 'rating': 6},
+        {'date': '2025-04-02', 'rating': 11},
+        'not json',
+        {'date': '2025-04-03', 'rating': '8', 'created_at': '2025-04-03 09:30:00'},
+    ]
+    body = '\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+    report = client.post('/import', data=body.encode(),
+                         content_type='application/x-ndjson').get_json()
+
+    assert report['imported'] == 2
+    assert [e['line'] for e in report['errors']] == [2, 3, 4]
+    with app.app_context():
+        assert MoodEntry.query.filter_by(user_id=user_id).count() == 2
+
+
+def test_ndjson_values_of_the_wrong_type_are_rejected(app, client):
+    user_id = _login(app, client)
+    lines = [
+        {'date': '2025-04-01', 'rating': 5.7},
+        {'date': '2025-04-02', 'rating': True},
+        {'date': '2025-04-03', 'rating': 6, 'notes': {'mood': 'ok'}},
+        {'date': '2025-04-04', 'rating': 6, 'notes': ['a', 'b']},
+        {'date': '2025-04-05', 'rating': 6, 'mood_label': 7},
+        {'date': '2025-04-06', 'rating': 6.0, 'notes': 'whole floats are fine'},
+    ]
+    body = '\n'.join(json.dumps(line) for line in lines)
+    report = client.post('/import', data=body.encode(),
+                         content_type='application/x-ndjson').get_json()
+
+    assert report['imported'] == 1
+    assert [(e['line'], e['error']) for e in report['errors']] == [
+        (1, 'rating must be a whole number'),
+        (2, 'rating must be a whole number'),
+        (3, 'notes must be text'),
+        (4, 'notes must be text'),
+        (5, 'mood label must be text'),
+    ]
+    with app.app_context():
+        entry = MoodEntry.query.filter_by(user_id=user_id).one()
+        assert (entry.mood_rating, entry.notes) == (6, 'whole floats are fine')
+
+
+def test_ndjson_out_of_range_values_are_reported_per_row(app, client):
+    user_id = _login(app, client)
+    lines = [
+        {'date': '2025-04-01', 'rating': 5, 'time_spent_seconds': 10**30},
+        {'date': '2025-04-02', 'rating': 5, 'time_spent_seconds': 1e300},
+        {'date': True, 'rating': 5},
+        {'date': '2025-04-04', 'rating': 5, 'created_at': 10**30},
+        {'date': '2025-04-05', 'rating': 5, 'time_spent_seconds': 90,
+         'created_at': '2025-04-05T09:30:00+02:00'},
+    ]
+    body = '\n'.join(json.dumps(line) for line in lines)
+    response = client.post('/import', data=body.encode(), content_type='application/x-ndjson')
+    assert response.status_code == 200
+    report = response.get_json()
+
+    assert report['imported'] == 1
+    assert [e['line'] for e in report['errors']] == [1, 2, 3, 4]
+    assert report['errors'][0]['error'] == 'time spent must be between 0 and 86400 seconds'
+    assert report['errors'][2]['error'] == 'missing or unreadable date'
+    with app.app_context():
+        entry = MoodEntry.query.filter_by(user_id=user_id).one()
+        assert entry.created_at == datetime(2025, 4, 5, 7, 30)
+
+
+def test_import_commits_in_batches(app, client, monkeypatch):
+    monkeypatch.setattr('imports.BATCH_SIZE', 10)
+    user_id = _login(app, client)
+    body = '\n'.join(
+        json.dumps({'date': f'2025-01-{d:02d}', 'rating': 5}) for d in range(1, 26)
+    )
+    commits = []
+    monkeypatch.setattr(db.session, 'commit', lambda real=db.session.commit: commits.append(1) or real())
+    report = client.post('/import', data=body.encode(),
+                         content_type='application/x-ndjson').get_json()
+    assert report['imported'] == 25
+    # three batches plus the derived-table rebuild
+    assert len(commits) >= 4
+    with app.app_context():
+        assert get_user_stats(user_id)['total_entries'] == 25
+
+
+def test_form_upload_flashes_summary(app, client):
+    _login(app, client)
+    csv_body = 'Date,Rating,Mood Label\n2025-05-01,7,Good\n'
+    response = client.post('/import', data={
+        'file': (io.BytesIO(csv_body.encode()), 'journal.csv'),
+    }, content_type='multipart/form-data', follow_redirects=True)
+    assert b'Imported 1 entries.' in response.data
+
+
+def test_csv_without_required_columns_is_rejected(app, client):
+    _login(app, client)
+    response = client.post('/import?format=csv', data=b'Foo,Bar\n1,2\n',
+                           content_type='text/csv')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'invalid_file'
@@ -65,3 +65,80 @@ def test_entry_fields_integrity(client):
     assert saved.mood_rating == 6
     assert saved.notes == "Testing fields"
     assert saved.entry_date == date.today()
+
+
+def _login_with_entries(client, app, count):
+    from models import User
+    with app.app_context():
+        user = User(username="username", email="test@example.com")
+        user.set_password("password")
+        db.session.add(user)
+        db.session.commit()
+        for i in range(count):
+            db.session.add(MoodEntry(
+                user_id=user.id,
+                entry_date=date(2025, 1, 1) + timedelta(days=i),
+                mood_rating=5,
+                mood_label=f"Entry{i}"
+            ))
+        db.session.commit()
+    client.post("/", data={"username": "username", "password": "password"})
+
+
+def test_logs_first_page_is_bounded(client, app):
+    _login_with_entries(client, app, 5)
+    app.config['ENTRIES_PAGE_SIZE'] = 2
+    try:
+        response = client.get("/logs")
+    finally:
+        app.config['ENTRIES_PAGE_SIZE'] = 50
+    assert response.status_code == 200
+    # newest two entries only (same-second timestamps fall back to id order)
+    assert b"Entry4" in response.data
+    assert b"Entry3" in response.data
+    assert b"Entry2" not in response.data
+    assert b"5 entries" in response.data
+    assert b"load-more-btn" in response.data
+
+
+def test_logs_more_walks_all_pages(client, app):
+    _login_with_entries(client, app, 5)
+
+    seen = []
+    cursor = ""
+    while True:
+        data = client.get(f"/logs/more?limit=2&cursor={cursor}").get_json()
+        seen.extend(e["mood_label"] for e in data["entries"])
+        assert len(data["entries"]) <= 2
+        if not data["next_cursor"]:
+            break
+        cursor = data["next_cursor"]
+
+    assert seen == ["Entry4", "Entry3", "Entry2", "Entry1", "Entry0"]
+
+
+def test_logs_more_requires_login(client):
+    response = client.get("/logs/more", headers={"Accept": "application/json"})
+    assert response.status_code == 401
+    assert response.get_json() == {"error": "login_required"}
+
+
+def test_toggle_privacy_persists_and_partitions_logs(client, app):
+    from models import MoodEntry
+    _login_with_entries(client, app, 2)
+    with app.app_context():
+        entry = MoodEntry.query.filter_by(mood_label="Entry1").first()
+        entry_id = entry.id
+
+    response = client.post(f"/toggle-privacy/{entry_id}", headers={"Accept": "application/json"})
+    assert response.get_json()["is_private"] is True
+
+    with app.app_context():
+        assert db.session.get(MoodEntry, entry_id).is_private is True
+
+    page = client.get("/logs").data
+    assert b"Public Entries" in page
+    assert b"(1)" in page
+    # private cards show only the date, never the label
+    assert b"Entry1" not in page
+    assert b"Entry0" in page
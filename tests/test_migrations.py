@@ -0,0 +1,70 @@
+from sqlalchemy import create_engine, inspect
+from werkzeug.security import check_password_hash
+
+from migrations import get_schema_version, latest_version, upgrade
+
+
+def _legacy_db(path):
+    """An app.db as created before indexes and schema versions existed."""
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(100) NOT NULL, "
+            "email VARCHAR(120) NOT NULL, password VARCHAR(200) NOT NULL, pin INTEGER)"
+        )
+        conn.exec_driver_sql(
+            "CREATE TABLE mood_entries (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+            "entry_date DATE NOT NULL, mood_rating INTEGER NOT NULL, mood_label VARCHAR(50), "
+            "notes TEXT, created_at DATETIME, viewed_at DATETIME, tags TEXT, timestamp DATETIME, "
+            "time_spent_seconds INTEGER, image_path VARCHAR(255))"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO mood_entries (user_id, entry_date, mood_rating, mood_label, tags) "
+            "VALUES (1, '2025-01-01', 7, 'Good', 'Work, #sleep,work')"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO users (id, username, email, password, pin) "
+            "VALUES (1, 'legacy', 'legacy@example.com', 'x', 42)"
+        )
+    return engine
+
+
+def test_upgrade_adds_indexes_to_existing_db(tmp_path):
+    engine = _legacy_db(tmp_path / "app.db")
+
+    assert upgrade(engine) == latest_version()
+
+    index_names = {ix['name'] for ix in inspect(engine).get_indexes('mood_entries')}
+    assert 'ix_mood_entries_user_date' in index_names
+    assert 'ix_mood_entries_user_timestamp' in index_names
+    assert 'ix_mood_entries_user_private_date' in index_names
+    assert 'ix_mood_entries_user_image' in index_names
+    columns = {c['name'] for c in inspect(engine).get_columns('mood_entries')}
+    assert 'is_private' in columns
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == latest_version()
+        # existing rows are untouched
+        assert conn.exec_driver_sql("SELECT count(*) FROM mood_entries").scalar() == 1
+        assert conn.exec_driver_sql("SELECT is_private FROM mood_entries").scalar() == 0
+        # existing entries are in the search index
+        assert conn.exec_driver_sql(
+            "SELECT count(*) FROM mood_entries_fts WHERE mood_entries_fts MATCH 'good'"
+        ).scalar() == 1
+        # plaintext PINs are hashed (restoring the leading zeros) and cleared
+        pin, pin_hash = conn.exec_driver_sql("SELECT pin, pin_hash FROM users").one()
+        assert pin is None
+        assert check_password_hash(pin_hash, '0042')
+        # password shapes are unknown until the next sign-in
+        assert conn.exec_driver_sql("SELECT password_pin_shaped FROM users").scalar() is None
+        # users get a data version for the response cache
+        assert conn.exec_driver_sql("SELECT data_version FROM users").scalar() != 0
+        # free-text tags are moved into entry_tags
+        assert conn.exec_driver_sql(
+            "SELECT user_id, tag FROM entry_tags ORDER BY tag"
+        ).all() == [(1, 'sleep'), (1, 'work')]
+
+
+def test_upgrade_is_idempotent(tmp_path):
+    engine = _legacy_db(tmp_path / "app.db")
+    upgrade(engine)
+    assert upgrade(engine) == latest_version()
@@ -25,3 +25,66 @@ def login(client):
         "username": "username",
         "password": "password"
     }, follow_redirects=True)
+
+
+def add_entries(app, ratings_by_day):
+    from datetime import date
+    from models import MoodEntry, User
+    from extensions import db
+    with app.app_context():
+        user = User.query.filter_by(username="username").first()
+        for day, ratings in ratings_by_day.items():
+            for rating in ratings:
+                db.session.add(MoodEntry(user_id=user.id, entry_date=date(2025, 3, day),
+                                         mood_rating=rating, mood_label="Mood"))
+        db.session.commit()
+        return user.id
+
+
+def test_filter_json_returns_only_matching_days(client, app):
+    create_user(app)
+    # Day 2 averages 5.5, which the calendar rounds to 6 (neutral)
+    add_entries(app, {1: [1], 2: [4, 7], 3: [6], 4: [9], 5: [3]})
+    login(client)
+
+    data = client.get("/dashboard/filter?year=2025&month=3&filter=neutral").get_json()
+    assert data["dates"] == [{"date": "2025-03-02", "mood": 6}, {"date": "2025-03-03", "mood": 6}]
+    assert data["summary"]["days"] == 2
+    assert data["summary"]["label"] == "Neutral (5–6)"
+
+    everything = client.get("/dashboard/filter?year=2025&month=3").get_json()
+    assert [d["date"][-2:] for d in everything["dates"]] == ["01", "02", "03", "04", "05"]
+    assert everything["summary"]["bucket"] == "neutral"
+
+
+def test_filter_matches_calendar_buckets(client, app):
+    from datetime import date
+    from aggregates import BUCKETS, bucket_days, month_view
+    create_user(app)
+    user_id = add_entries(app, {d: [d % 10 + 1, (d * 7) % 10 + 1] for d in range(1, 29)})
+
+    with app.app_context():
+        view = month_view(user_id, 2025, 3, date(2025, 3, 31))
+        cells = {day: bucket for week in view["calendar_dates"] for day, _, bucket in week if bucket}
+        for bucket in BUCKETS:
+            days = {day for day, _ in bucket_days(user_id, 2025, 3, bucket)}
+            assert days == {day for day, b in cells.items() if b == bucket}
+            assert len(days) == view["bucket_counts"][bucket]
+
+
+def test_filter_json_validates_and_revalidates(client, app):
+    create_user(app)
+    add_entries(app, {1: [8]})
+    login(client)
+
+    response = client.get("/dashboard/filter?year=2025&month=3&filter=sparkly")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "unknown_filter"
+    # The full page ignores an unknown filter instead of failing
+    assert client.get("/dashboard?year=2025&month=3&filter=sparkly").status_code == 200
+
+    first = client.get("/dashboard/filter?year=2025&month=3&filter=good")
+    assert first.headers["ETag"]
+    again = client.get("/dashboard/filter?year=2025&month=3&filter=good",
+                       headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
@@ -0,0 +1,177 @@
+"""
+Tests for the password hashing policy (passwords.py).
+"""
+import threading
+
+import pytest
+
+import passwords
+from extensions import db
+from models import User
+from passwords import PasswordHashingBusyError, needs_rehash
+
+
+def test_login_upgrades_hash_when_policy_changes(app, client, monkeypatch):
+    with app.app_context():
+        monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+        user = User(username='rehash', email='rehash@example.com')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        old_hash = user.password
+        assert old_hash.startswith('pbkdf2:sha256:1000$')
+
+        monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:2000')
+        assert needs_rehash(old_hash)
+
+        client.post('/', data={'username': 'rehash', 'password': 'secret'})
+        db.session.expire_all()
+        user = User.query.filter_by(username='rehash').one()
+        assert user.password.startswith('pbkdf2:sha256:2000$')
+        assert user.check_password('secret')
+        assert not user.password_needs_rehash()
+
+
+def test_failed_login_keeps_old_hash(app, client, monkeypatch):
+    with app.app_context():
+        monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+        user = User(username='stale', email='stale@example.com')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        old_hash = user.password
+
+        monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:2000')
+        client.post('/', data={'username': 'stale', 'password': 'wrong'})
+        db.session.expire_all()
+        assert User.query.filter_by(username='stale').one().password == old_hash
+
+
+def test_default_method_parameters_are_normalized():
+    # 'scrypt' alone means Werkzeug's default cost, which is what gets stored
+    stored = passwords.generate_password_hash('x', method='scrypt')
+    assert passwords._method_prefix('scrypt') == stored.split('$', 1)[0]
+
+
+def test_full_queue_raises_busy(app, monkeypatch):
+    with app.app_context():
+        monkeypatch.setitem(app.config, 'PASSWORD_HASH_WAIT', 0.05)
+        _, slots = passwords._executor()
+        taken = 0
+        while slots.acquire(blocking=False):
+            taken += 1
+        try:
+            with pytest.raises(PasswordHashingBusyError):
+                passwords.verify_password('pbkdf2:sha256:1$a$b', 'x')
+        finally:
+            for _ in range(taken):
+                slots.release()
+
+
+def test_hashing_runs_off_the_request_thread(app):
+    seen = []
+
+    def record(*args):
+        seen.append(threading.current_thread().name)
+        return 'hash'
+
+    with app.app_context():
+        assert passwords._run(record) == 'hash'
+    assert seen[0].startswith('passwords')
+
+
+def _pin_user(app, pin='4821'):
+    with app.app_context():
+        user = User(username='pinned', email='pinned@example.com', pin=pin)
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        return user.pin_hash
+
+
+def test_pin_is_stored_hashed_with_pin_method(app):
+    pin_hash = _pin_user(app)
+    assert pin_hash.startswith('pbkdf2:sha256:10000$')
+    assert '4821' not in pin_hash
+
+
+def test_pin_login_uses_only_the_pin_verifier(app, client, monkeypatch):
+    _pin_user(app)
+    calls = []
+    monkeypatch.setattr('models.verify_password', lambda *a: calls.append('password'))
+    response = client.post('/', data={'username': 'pinned', 'password': '4821'})
+    assert response.location.endswith('/home')
+    assert calls == []
+
+
+def test_wrong_pin_costs_one_verification(app, client, monkeypatch):
+    _pin_user(app)
+    calls = []
+    real_verify_pin = passwords.verify_pin
+    monkeypatch.setattr('models.verify_password', lambda *a: calls.append('password'))
+    monkeypatch.setattr('models.verify_pin', lambda *a: calls.append('pin') or real_verify_pin(*a))
+    response = client.post('/', data={'username': 'pinned', 'password': '0000'})
+    assert response.location.endswith('/')
+    assert calls == ['pin']
+
+
+def test_unknown_password_shape_is_recorded_on_sign_in(app, client, monkeypatch):
+    _pin_user(app)
+    with app.app_context():
+        user = User.query.filter_by(username='pinned').one()
+        user.password_pin_shaped = None  # set before the shape was recorded
+        db.session.commit()
+
+    # Until the shape is known, a wrong PIN is also tried as the password
+    calls = []
+    real_verify_password = passwords.verify_password
+    monkeypatch.setattr('models.verify_password',
+                        lambda *a: calls.append('password') or real_verify_password(*a))
+    client.post('/', data={'username': 'pinned', 'password': '0000'})
+    assert calls == ['password']
+
+    client.post('/', data={'username': 'pinned', 'password': 'password'})
+    with app.app_context():
+        assert User.query.filter_by(username='pinned').one().password_pin_shaped is False
+
+
+def test_wrong_pins_lock_pin_login(app, client):
+    _pin_user(app)
+    for _ in range(5):
+        client.post('/', data={'username': 'pinned', 'password': '0000'})
+    response = client.post('/', data={'username': 'pinned', 'password': '4821'},
+                           follow_redirects=True)
+    assert b'Too many incorrect PIN attempts' in response.data
+
+    # The password still works while the PIN is locked
+    response = client.post('/', data={'username': 'pinned', 'password': 'password'})
+    assert response.location.endswith('/home')
+
+
+def test_register_rejects_pin_shaped_password(client):
+    response = client.post('/register', data={
+        'username': 'digits', 'email': 'digits@example.com',
+        'password': '1234', 'confirm_password': '1234', 'PIN': '1234',
+    }, follow_redirects=True)
+    assert b'Password cannot be just a 4-digit number' in response.data
+
+
+def test_four_digit_password_still_signs_in_with_a_pin(app, client):
+    # Four-digit passwords were accepted before PIN sign-in existed
+    with app.app_context():
+        user = User(username='legacy', email='legacy@example.com', pin='4821')
+        user.set_password('2468')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    response = client.post('/', data={'username': 'legacy', 'password': '2468'})
+    assert response.location.endswith('/home')
+    with app.app_context():
+        assert db.session.get(User, user_id).pin_failed_attempts == 0
+
+    client.get('/logout')
+    client.post('/', data={'username': 'legacy', 'password': '0000'})
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        assert (user.pin_failed_attempts, user.password_pin_shaped) == (1, True)
@@ -0,0 +1,88 @@
+"""
+Tests for full-text search over entries (search.py and /search).
+"""
+from datetime import date
+
+from extensions import db
+from models import MoodEntry, User
+from search import match_expression, search_entries
+
+
+def _user(username):
+    user = User(username=username, email=f'{username}@example.com')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def _entry(user_id, label, notes, is_private=False):
+    entry = MoodEntry(user_id=user_id, entry_date=date(2025, 6, 1), mood_rating=6,
+                      mood_label=label, notes=notes, is_private=is_private)
+    db.session.add(entry)
+    db.session.commit()
+    return entry.id
+
+
+def test_results_are_ranked_and_scoped_to_the_user(app):
+    with app.app_context():
+        me, other = _user('searcher'), _user('other')
+        in_notes = _entry(me, 'Fine', 'A long walk by the beach with the dog')
+        in_label = _entry(me, 'Beach day', 'sunny')
+        _entry(me, 'Beach secret', 'private beach', is_private=True)
+        _entry(other, 'Beach', 'someone else at the beach')
+
+        results, has_more = search_entries(db.session, me, 'beach')
+        assert [r['id'] for r in results] == [in_label, in_notes]
+        assert not has_more
+        assert str(results[1]['snippet']).count('<mark>beach</mark>') == 1
+
+
+def test_index_follows_edits_and_bulk_deletes(app):
+    with app.app_context():
+        me = _user('searcher')
+        entry_id = _entry(me, 'Okay', 'studying for exams')
+        assert search_entries(db.session, me, 'exam')[0]
+
+        db.session.get(MoodEntry, entry_id).notes = 'played football'
+        db.session.commit()
+        assert search_entries(db.session, me, 'exam')[0] == []
+        assert search_entries(db.session, me, 'football')[0]
+
+        MoodEntry.query.filter_by(user_id=me).delete()
+        db.session.commit()
+        assert search_entries(db.session, me, 'football')[0] == []
+
+
+def test_user_input_is_never_fts_syntax():
+    assert match_expression('"unbalanced OR NEAR(') == '"unbalanced" "OR" "NEAR"'
+    assert match_expression('walk* it') == '"walk"* "it"'
+    assert match_expression('  ***  ') is None
+
+
+def test_search_page_escapes_notes_and_pages(app, client):
+    with app.app_context():
+        me = _user('searcher')
+        for i in range(3):
+            _entry(me, 'Calm', f'<script>alert({i})</script> meditation')
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+        sess['user_id'] = me
+
+    response = client.get('/search?q=meditation&limit=2')
+    assert response.status_code == 200
+    assert b'<script>alert' not in response.data
+    assert b'&lt;script&gt;alert' in response.data
+    assert b'<mark>meditation</mark>' in response.data
+    assert b'More results' in response.data
+    assert b'More results' not in client.get('/search?q=meditation&limit=2&page=2').data
+
+
+def test_control_characters_in_notes_are_not_highlights(app):
+    with app.app_context():
+        me = _user('controls')
+        _entry(me, 'Calm', 'stray \x02 marker \x03 before meditation')
+        (result,), _ = search_entries(db.session, me, 'meditation')
+    assert str(result['snippet']).count('<mark>') == 1
+    assert '<mark>meditation</mark>' in result['snippet']
+    assert '\x02 marker \x03' in result['snippet']
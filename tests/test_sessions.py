@@ -0,0 +1,114 @@
+"""
+Tests for the server-side session store (sessions.py).
+"""
+import re
+from datetime import datetime, timedelta
+
+from extensions import db
+from imports import MAX_TIME_SPENT
+from models import MoodEntry, SessionRecord, User
+
+
+def _register_and_login(app, client):
+    with app.app_context():
+        user = User(username='sessions', email='sessions@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+    return client.post('/', data={'username': 'sessions', 'password': 'password'})
+
+
+def test_cookie_holds_only_the_session_id(app, client):
+    response = _register_and_login(app, client)
+    cookie = client.get_cookie('session')
+    assert 'session=' in response.headers['Set-Cookie']
+    assert len(cookie.value) < 64
+
+    with app.app_context():
+        record = db.session.get(SessionRecord, cookie.value)
+        assert 'user_id' in record.data
+
+
+def test_unchanged_session_is_not_rewritten(app, client):
+    _register_and_login(app, client)
+    with app.app_context():
+        before = SessionRecord.query.one().expires
+
+    response = client.get('/home')
+    assert response.status_code == 200
+    assert 'Set-Cookie' not in response.headers
+    with app.app_context():
+        assert SessionRecord.query.one().expires == before
+
+
+def test_logout_deletes_the_stored_session(app, client):
+    _register_and_login(app, client)
+    client.get('/logout')
+    with app.app_context():
+        assert SessionRecord.query.count() == 0
+    assert client.get('/home').status_code == 302
+
+
+def test_unknown_session_id_is_not_adopted(app, client):
+    client.set_cookie('session', 'attacker-chosen')
+    with client.session_transaction() as sess:
+        sess['logged_in'] = False
+    assert client.get_cookie('session').value != 'attacker-chosen'
+
+
+def test_login_moves_the_session_to_a_new_id(app, client):
+    # A failed sign-in stores a flash, giving the browser an anonymous session id
+    client.post('/', data={'username': 'nobody', 'password': 'wrong'})
+    planted = client.get_cookie('session').value
+
+    _register_and_login(app, client)
+    assert client.get_cookie('session').value != planted
+    with app.app_context():
+        assert db.session.get(SessionRecord, planted) is None
+
+    # The old id does not carry the sign-in
+    client.set_cookie('session', planted)
+    assert client.get('/home').status_code == 302
+
+
+def test_showing_the_entry_form_writes_no_session(app, client):
+    _register_and_login(app, client)
+    with app.app_context():
+        before = SessionRecord.query.one().data
+
+    response = client.get('/mood-journal')
+    assert b'name="entry_started_at"' in response.data
+    assert 'Set-Cookie' not in response.headers
+    with app.app_context():
+        assert SessionRecord.query.one().data == before
+
+
+def test_entry_form_start_time_cannot_be_forged(app, client, monkeypatch):
+    _register_and_login(app, client)
+    page = client.get('/mood-journal').data.decode()
+    token = re.search(r'name="entry_started_at" value="([^"]+)"', page).group(1)
+
+    def post(started_at):
+        return client.post('/mood-journal', data={
+            'mood_rating': '6', 'date': '2025-05-01', 'entry_started_at': started_at,
+        })
+
+    # Client-chosen times, aware or not, are ignored rather than trusted
+    assert post('2025-01-01T00:00:00+00:00').status_code == 302
+    assert post('2000-01-01T00:00:00').status_code == 302
+    assert post(token).status_code == 302
+
+    # A form left open for days counts at most MAX_TIME_SPENT
+    class Later(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) + timedelta(days=3)
+
+    monkeypatch.setattr('app.datetime', Later)
+    assert post(token).status_code == 302
+
+    with app.app_context():
+        spent = [e.time_spent_seconds for e in MoodEntry.query.order_by(MoodEntry.id)]
+    assert spent[:2] == [0, 0]
+    assert 0 <= spent[2] < 60
+    assert spent[3] == MAX_TIME_SPENT
@@ -0,0 +1,110 @@
+"""
+Tests for entry tags (tags.py), tag filters on /logs and per-tag dashboard figures.
+"""
+from datetime import date
+
+from extensions import db
+from models import EntryTag, MoodEntry, User
+from tags import parse_tags, tag_summary
+
+
+def _user(username):
+    user = User(username=username, email=f'{username}@example.com')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def _entry(user_id, rating, tags, day=date(2025, 6, 1), label='Mood'):
+    entry = MoodEntry(user_id=user_id, entry_date=day, mood_rating=rating, mood_label=label)
+    entry.tags = tags
+    db.session.add(entry)
+    db.session.commit()
+    return entry.id
+
+
+def _login(client, user_id):
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+        sess['user_id'] = user_id
+
+
+def test_parse_tags_normalizes_and_dedupes():
+    assert parse_tags(' Work, #sleep ,work,, Late   Night ') == ['work', 'sleep', 'late night']
+    assert parse_tags(None) == []
+    assert len(parse_tags(','.join(f't{i}' for i in range(50)))) == 10
+
+
+def test_tags_follow_the_entry_through_edits_and_deletes(app, client):
+    with app.app_context():
+        me = _user('tagger')
+    _login(client, me)
+
+    client.post('/mood-journal', data={
+        'title': 'Tired', 'date': '2025-06-01', 'mood_rating': '4', 'tags': 'Exams, sleep',
+    })
+    with app.app_context():
+        entry = MoodEntry.query.filter_by(user_id=me).one()
+        entry_id = entry.id
+        assert entry.tags == ['exams', 'sleep']
+        assert {t.user_id for t in EntryTag.query} == {me}
+
+    client.post(f'/edit/{entry_id}', data={
+        'mood_label': 'Better', 'entry_date': '2025-06-01', 'mood_rating': '6',
+        'notes': '', 'tags': 'sleep, friends',
+    })
+    with app.app_context():
+        assert db.session.get(MoodEntry, entry_id).tags == ['friends', 'sleep']
+        _entry(me, 5, ['sleep'])
+
+    # Bulk deletes bypass the ORM cascade; the trigger still removes the tags
+    client.post('/delete-all-entries')
+    with app.app_context():
+        assert EntryTag.query.count() == 0
+
+
+def test_logs_filter_by_tag_with_facets(app, client):
+    with app.app_context():
+        me, other = _user('tagger'), _user('other')
+        work = [_entry(me, 3, ['work'], label=f'Work{i}') for i in range(3)]
+        _entry(me, 8, ['gym', 'work'], label='Gym')
+        _entry(me, 9, ['beach'], label='Beach')
+        _entry(other, 1, ['work'])
+
+        assert tag_summary(me) == [
+            {'tag': 'work', 'count': 4, 'average': 4.2},
+            {'tag': 'beach', 'count': 1, 'average': 9.0},
+            {'tag': 'gym', 'count': 1, 'average': 8.0},
+        ]
+    _login(client, me)
+
+    page = client.get('/logs?tag=%23Work&limit=2').data.decode()
+    assert 'Work2' in page and 'Gym' in page
+    assert 'Beach' not in page.split('#beach')[-1]
+    assert '4 entries' in page
+
+    more = client.get('/logs/more', query_string={
+        'tag': 'work', 'cursor': page.split('data-cursor="')[1].split('"')[0],
+    }).get_json()
+    assert [e['id'] for e in more['entries']] == [work[1], work[0]]
+    assert more['entries'][0]['tags'] == ['work']
+
+
+def test_dashboard_per_tag_averages_and_filter(app, client):
+    with app.app_context():
+        me = _user('tagger')
+        _entry(me, 2, ['exams'], day=date(2025, 6, 3))
+        _entry(me, 4, ['exams'], day=date(2025, 6, 4))
+        _entry(me, 9, ['holiday'], day=date(2025, 6, 20))
+        _entry(me, 1, ['exams'], day=date(2025, 7, 1))
+    _login(client, me)
+
+    page = client.get('/dashboard?year=2025&month=6').data.decode()
+    assert 'Tags this month' in page
+    assert '#exams' in page and '3.0' in page
+    assert 'id="total-entries" class="text-3xl font-semibold">3</div>' in page
+
+    page = client.get('/dashboard?year=2025&month=6&tag=exams').data.decode()
+    assert 'Showing only entries tagged <strong>#exams</strong>' in page
+    assert 'id="total-entries" class="text-3xl font-semibold">2</div>' in page
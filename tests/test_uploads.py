@@ -0,0 +1,318 @@
+"""
+Tests for the content-addressed image store and upload pipeline (uploads.py).
+"""
+import hashlib
+import io
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import MoodEntry, UploadBlob, User
+from uploads import blob_path, ingest_metrics, variant_name, wait_for_uploads
+
+# 1x1 transparent PNG
+PNG_BYTES = (
+    b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00"
+    b"\x1f\x15\xc4\x89\x00\x00\x00\rIDATx\xdac````\x00\x00\x00\x05\x00\x01z\xa8WP\x00\x00"
+    b"\x00\x00IEND\xaeB`\x82"
+)
+PNG_DIGEST = hashlib.sha256(PNG_BYTES).hexdigest()
+
+
+@pytest.fixture
+def upload_dirs(app, tmp_path, monkeypatch):
+    """Point the static and upload folders at a temporary directory."""
+    upload_folder = tmp_path / 'uploads'
+    upload_folder.mkdir()
+    monkeypatch.setattr(app, 'static_folder', str(tmp_path))
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(upload_folder))
+    return upload_folder
+
+
+def _login(app, client):
+    with app.app_context():
+        user = User(username='uploader', email='uploader@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        with client.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['user_id'] = user.id
+        return user.id
+
+
+def test_upload_is_written_in_background(app, client, upload_dirs):
+    user_id = _login(app, client)
+    response = client.post('/mood-journal', data={
+        'mood_rating': '7',
+        'date': '2025-11-10',
+        'image': (io.BytesIO(PNG_BYTES), 'photo.png'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 302
+    wait_for_uploads(timeout=10)
+
+    with app.app_context():
+        entry = MoodEntry.query.filter_by(user_id=user_id).one()
+        assert entry.image_path == 'uploads/' + blob_path(PNG_DIGEST, 'png')
+        assert (upload_dirs / blob_path(PNG_DIGEST, 'png')).read_bytes() == PNG_BYTES
+
+
+def _post_image(client, name='photo.png'):
+    return client.post('/mood-journal', data={
+        'mood_rating': '7',
+        'image': (io.BytesIO(PNG_BYTES), name),
+    }, content_type='multipart/form-data')
+
+
+def test_identical_uploads_are_stored_once(app, client, upload_dirs):
+    user_id = _login(app, client)
+    _post_image(client, 'a.png')
+    _post_image(client, 'b.png')
+    wait_for_uploads(timeout=10)
+
+    with app.app_context():
+        paths = {e.image_path for e in MoodEntry.query.filter_by(user_id=user_id)}
+        assert len(paths) == 1
+        assert db.session.get(UploadBlob, PNG_DIGEST).refcount == 2
+    original = upload_dirs / blob_path(PNG_DIGEST, 'png')
+    stored = sorted(p for p in upload_dirs.rglob('*') if p.is_file())
+    assert stored == sorted(
+        [original] + [original.with_name(variant_name(original.name, v)) for v in ('thumb', 'display')]
+    )
+
+
+def test_deleting_entries_collects_unreferenced_blobs(app, client, upload_dirs, monkeypatch):
+    monkeypatch.setattr('uploads.GC_GRACE', timedelta(0))
+    user_id = _login(app, client)
+    _post_image(client)
+    _post_image(client)
+    wait_for_uploads(timeout=10)
+    stored = upload_dirs / blob_path(PNG_DIGEST, 'png')
+
+    with app.app_context():
+        first, second = MoodEntry.query.filter_by(user_id=user_id).all()
+        first_id = first.id
+
+    # Still referenced by the second entry
+    client.post(f'/delete/{first_id}')
+    wait_for_uploads(timeout=10)
+    assert stored.exists()
+
+    client.post('/delete-all-entries')
+    wait_for_uploads(timeout=10)
+    assert not stored.exists()
+    with app.app_context():
+        assert db.session.get(UploadBlob, PNG_DIGEST) is None
+
+
+def test_recent_blobs_survive_collection(app, client, upload_dirs):
+    _login(app, client)
+    _post_image(client)
+    wait_for_uploads(timeout=10)
+    client.post('/delete-all-entries')
+    wait_for_uploads(timeout=10)
+
+    # Within the grace period the blob is kept for uploads still in flight
+    assert (upload_dirs / blob_path(PNG_DIGEST, 'png')).exists()
+
+
+def test_removing_image_deletes_file(app, client, upload_dirs):
+    user_id = _login(app, client)
+    (upload_dirs / 'old.png').write_bytes(PNG_BYTES)
+    (upload_dirs / variant_name('old.png', 'thumb')).write_bytes(b'thumb')
+    with app.app_context():
+        entry = MoodEntry(user_id=user_id, entry_date=date(2025, 11, 10), mood_rating=5,
+                          mood_label='Neutral', image_path='uploads/old.png')
+        db.session.add(entry)
+        db.session.commit()
+        entry_id = entry.id
+
+    client.post(f'/edit/{entry_id}', data={
+        'mood_label': 'Neutral', 'mood_rating': '5', 'remove_image': '1',
+    })
+    wait_for_uploads(timeout=10)
+    assert list(upload_dirs.iterdir()) == []
+
+
+def test_logs_falls_back_to_original_without_variant(app, client, upload_dirs):
+    user_id = _login(app, client)
+    (upload_dirs / 'pic.png').write_bytes(PNG_BYTES)
+    with app.app_context():
+        db.session.add(MoodEntry(user_id=user_id, entry_date=date(2025, 11, 10), mood_rating=5,
+                                 mood_label='Neutral', image_path='uploads/pic.png'))
+        db.session.commit()
+
+    assert b'/uploads/pic.png' in client.get('/logs').data
+
+    (upload_dirs / variant_name('pic.png', 'thumb')).write_bytes(b'thumb')
+    assert b'/uploads/pic.thumb.webp' in client.get('/logs').data
+
+
+def test_variants_are_generated(app, client, upload_dirs):
+    _login(app, client)
+    _post_image(client)
+    wait_for_uploads(timeout=10)
+    names = sorted(p.name for p in upload_dirs.rglob('*'))
+    assert any(n.endswith('.thumb.webp') for n in names)
+    assert any(n.endswith('.display.webp') for n in names)
+
+
+def test_non_image_upload_is_rejected_while_streaming(app, client, upload_dirs):
+    user_id = _login(app, client)
+    response = client.post('/mood-journal', data={
+        'mood_rating': '7',
+        'image': (io.BytesIO(b'#!/bin/sh\necho not an image\n' * 100), 'evil.png'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 302
+    assert response.location.endswith('/mood-journal')
+
+    with app.app_context():
+        assert MoodEntry.query.filter_by(user_id=user_id).count() == 0
+    assert [p for p in upload_dirs.rglob('*') if p.is_file()] == []
+
+
+def test_oversized_image_is_rejected_early(app, client, upload_dirs, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAX_IMAGE_SIZE', 1024)
+    user_id = _login(app, client)
+    response = client.post('/mood-journal', data={
+        'mood_rating': '7',
+        'image': (io.BytesIO(PNG_BYTES + b'\0' * 4096), 'big.png'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert MoodEntry.query.filter_by(user_id=user_id).count() == 0
+    assert [p for p in upload_dirs.rglob('*') if p.is_file()] == []
+
+
+def test_stored_extension_follows_content(app, client, upload_dirs):
+    """A PNG uploaded with a .jpg name is stored as the PNG it is."""
+    user_id = _login(app, client)
+    _post_image(client, 'mislabelled.jpg')
+    wait_for_uploads(timeout=10)
+    with app.app_context():
+        entry = MoodEntry.query.filter_by(user_id=user_id).one()
+        assert entry.image_path.endswith('.png')
+    assert ingest_metrics()['accepted'] >= 1
+
+
+def test_blob_served_with_immutable_etag(app, client, upload_dirs):
+    _login(app, client)
+    _post_image(client)
+    wait_for_uploads(timeout=10)
+    url = '/uploads/' + blob_path(PNG_DIGEST, 'png')
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == PNG_BYTES
+    assert response.headers['Cache-Control'] == 'private, max-age=31536000, immutable'
+    assert response.headers['ETag'] == f'"{PNG_DIGEST}.png"'
+
+    revalidated = client.get(url, headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+
+
+def test_proxy_send_modes_skip_the_body(app, client, upload_dirs, monkeypatch):
+    _login(app, client)
+    _post_image(client)
+    wait_for_uploads(timeout=10)
+    relative = blob_path(PNG_DIGEST, 'png')
+
+    monkeypatch.setitem(app.config, 'UPLOAD_SEND_MODE', 'x-accel')
+    response = client.get('/uploads/' + relative)
+    assert response.headers['X-Accel-Redirect'] == '/protected-uploads/' + relative
+    assert response.headers['Content-Type'] == 'image/png'
+    assert response.data == b''
+
+    monkeypatch.setitem(app.config, 'UPLOAD_SEND_MODE', 'x-sendfile')
+    response = client.get('/uploads/' + relative)
+    assert response.headers['X-Sendfile'] == str(upload_dirs / relative)
+    assert response.data == b''
+
+
+def test_missing_or_escaping_upload_is_404(app, client, upload_dirs):
+    _login(app, client)
+    assert client.get('/uploads/' + blob_path(PNG_DIGEST, 'png')).status_code == 404
+    assert client.get('/uploads/../secret.txt').status_code == 404
+
+
+def test_images_are_only_served_to_their_owner(app, client, upload_dirs):
+    owner_id = _login(app, client)
+    _post_image(client)
+    wait_for_uploads(timeout=10)
+    url = '/uploads/' + blob_path(PNG_DIGEST, 'png')
+    assert client.get(url).status_code == 200
+    # ... and never through the public static route
+    assert client.get('/static/uploads/' + blob_path(PNG_DIGEST, 'png')).status_code == 404
+
+    with app.app_context():
+        other = User(username='other', email='other@example.com')
+        other.set_password('password')
+        db.session.add(other)
+        db.session.commit()
+        other_id = other.id
+
+    with client.session_transaction() as sess:
+        sess['user_id'] = other_id
+    assert client.get(url).status_code == 404
+
+    with client.session_transaction() as sess:
+        sess.clear()
+    assert client.get(url).status_code == 404
+
+    # Locking the only entry that uses the image stops browser caching
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+        sess['user_id'] = owner_id
+    with app.app_context():
+        entry = MoodEntry.query.filter_by(user_id=owner_id).one()
+        entry.is_private = True
+        db.session.commit()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'private, no-store'
+
+
+def test_collection_unlinks_before_the_rows_commit(app, client, upload_dirs, monkeypatch):
+    import uploads
+
+    monkeypatch.setattr('uploads.GC_GRACE', timedelta(0))
+    _login(app, client)
+    _post_image(client)
+    wait_for_uploads(timeout=10)
+
+    # An upload of the same content must not be able to re-insert the row
+    # and find the old file still on disk: the files go first
+    order = []
+    remove_files = uploads._remove_files
+
+    def unlink(paths):
+        order.append('unlink %d' % len(paths))
+        remove_files(paths)
+
+    def committed(session):
+        order.append('commit')
+
+    monkeypatch.setattr(uploads, '_remove_files', unlink)
+    event.listen(Session, 'after_commit', committed)
+    try:
+        client.post('/delete-all-entries')
+    finally:
+        event.remove(Session, 'after_commit', committed)
+    # original + two variants, then the commit that drops the row
+    assert order[order.index('unlink 3') + 1] == 'commit'
+    assert not (upload_dirs / blob_path(PNG_DIGEST, 'png')).exists()
+
+
+def test_streamed_upload_replaces_an_existing_file(app, client, upload_dirs):
+    stored = upload_dirs / blob_path(PNG_DIGEST, 'png')
+    stored.parent.mkdir(parents=True)
+    stored.write_bytes(b'stale')
+    _login(app, client)
+    _post_image(client)
+    wait_for_uploads(timeout=10)
+    assert stored.read_bytes() == PNG_BYTES
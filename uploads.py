@@ -0,0 +1,506 @@
+"""Content-addressed storage and background processing for entry images.
+
+Uploads are stored once per distinct content, named by their SHA-256 and
+sharded two levels deep so no directory grows past a few hundred files::
+
+    uploads/ab/cd/abcd...ef.png          original
+    uploads/ab/cd/abcd...ef.thumb.webp   at most THUMBNAIL_SIZE, inline on /logs
+    uploads/ab/cd/abcd...ef.display.webp at most DISPLAY_SIZE, full-size viewer
+
+`save_upload()` hashes the body, records the blob in `models.UploadBlob` and
+returns the static-relative path right away; a small thread pool writes the
+original (skipped when the blob is already on disk) and derives the variants.
+Variants are made with Pillow, a project dependency; in an environment
+without it `variant_path()` falls back to the original.
+
+Image fields are not buffered by Werkzeug first: views marked with
+`accepts_image_uploads` get an `IngestStream` per file part (via
+`ImageUploadRequest`), which sniffs the magic bytes of the first chunk,
+enforces MAX_IMAGE_SIZE as data arrives and hashes while writing to a
+temporary file next to the blobs.  Bad or oversized uploads are rejected
+with 415/413 before the rest of the body is read; accepted ones are moved
+into place without being read again.
+
+Reference counts follow `MoodEntry.image_path` through the mapper events
+below.  Bulk deletes bypass them, so those routes call
+`release_user_uploads()` first.  `collect_garbage()` then removes blobs that
+nothing references in batches, unlinking their files before the rows'
+deletion commits.
+Paths from before the blob store (``uploads/<uuid>.<ext>``) are not counted
+and are removed directly by `discard_upload()`.
+"""
+import atexit
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import Request, current_app
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+from extensions import db
+from models import MoodEntry, UploadBlob
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - exercised only without Pillow
+    Image = ImageOps = None
+
+THUMBNAIL_SIZE = (320, 320)
+DISPLAY_SIZE = (1280, 1280)
+WEBP_QUALITY = 80
+VARIANTS = {'thumb': THUMBNAIL_SIZE, 'display': DISPLAY_SIZE}
+
+# Unreferenced blobs are kept this long after their last upload, so an upload
+# that deduplicated onto one is never swept before its entry is committed
+GC_GRACE = timedelta(minutes=10)
+GC_BATCH_SIZE = 500
+
+# A missing variant of an original written this recently may still be on its way
+VARIANT_WAIT = timedelta(minutes=2)
+
+# Per-file limit, checked while streaming (MAX_CONTENT_LENGTH bounds the whole request)
+DEFAULT_MAX_IMAGE_SIZE = 10 * 1024 * 1024
+INCOMING_DIR = '.incoming'
+
+# Leading bytes of each accepted format -> stored extension
+SNIFF_BYTES = 12
+_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+]
+
+_BLOB_PATH = re.compile(r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})\.[a-z0-9]+$')
+
+logger = logging.getLogger(__name__)
+
+_blobs = UploadBlob.__table__
+_entries = MoodEntry.__table__
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='uploads')
+_pending = set()
+_pending_lock = threading.Lock()
+
+atexit.register(_executor.shutdown, wait=True)
+
+
+def variant_name(filename, variant):
+    stem = filename.rsplit('.', 1)[0]
+    return f"{stem}.{variant}.webp"
+
+
+def blob_path(digest, ext):
+    """Path of a blob relative to the upload folder."""
+    return os.path.join(digest[:2], digest[2:4], f"{digest}.{ext}")
+
+
+def digest_from_path(image_path):
+    """The blob digest an image_path refers to, or None for legacy/empty paths."""
+    if not image_path:
+        return None
+    match = _BLOB_PATH.search(image_path.replace(os.sep, '/'))
+    if match is None or not match.group(3).startswith(match.group(1) + match.group(2)):
+        return None
+    return match.group(3)
+
+
+def sniff_image_type(head):
+    """Extension for the image format `head` starts with, or None."""
+    for signature, ext in _SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+# Running totals for streamed uploads, reported by `ingest_metrics()`
+_metrics = {'accepted': 0, 'rejected': 0, 'bytes': 0, 'seconds': 0.0}
+_metrics_lock = threading.Lock()
+
+
+def _record(outcome, size=0, seconds=0.0):
+    with _metrics_lock:
+        _metrics[outcome] += 1
+        _metrics['bytes'] += size
+        _metrics['seconds'] += seconds
+
+
+def ingest_metrics():
+    """Totals for streamed uploads, including the mean ingest rate in bytes/sec."""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    metrics['bytes_per_second'] = (
+        metrics['bytes'] / metrics['seconds'] if metrics['seconds'] else 0.0
+    )
+    return metrics
+
+
+class IngestStream:
+    """Writable file for one uploaded image part, validated as it arrives.
+
+    Werkzeug writes the part's data in chunks and then seeks back to the
+    start; reads are served from the temporary file afterwards, so the object
+    also works anywhere a regular upload stream is expected.
+    """
+
+    def __init__(self, directory, max_size, declared_length=None):
+        if declared_length and declared_length > max_size:
+            _record('rejected')
+            raise RequestEntityTooLarge()
+        self.directory = directory
+        self.max_size = max_size
+        self.size = 0
+        self.ext = None
+        self.path = None
+        self._head = b''
+        self._hash = hashlib.sha256()
+        self._file = None
+        self._started = None
+        self.seconds = 0.0
+
+    def _reject(self, error):
+        self.discard()
+        _record('rejected', self.size)
+        raise error
+
+    def write(self, chunk):
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.path = os.path.join(self.directory, uuid.uuid4().hex)
+            self._file = open(self.path, 'w+b')
+            self._started = time.perf_counter()
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            self._reject(RequestEntityTooLarge())
+        if self.ext is None and len(self._head) < SNIFF_BYTES:
+            self._head += chunk[:SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= SNIFF_BYTES:
+                self.ext = sniff_image_type(self._head)
+                if self.ext is None:
+                    self._reject(UnsupportedMediaType())
+        self._hash.update(chunk)
+        return self._file.write(chunk)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if self._file is None:
+            self._file = open(os.devnull, 'rb')
+        elif self._started is not None and not self.seconds:
+            self.seconds = time.perf_counter() - self._started
+        return self._file.seek(offset, whence)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._file is None:
+            self._file = open(os.devnull, 'rb')
+        return getattr(self._file, name)
+
+    def finish(self):
+        """Validate the complete upload; returns (digest, ext, size)."""
+        if self.ext is None:
+            self.ext = sniff_image_type(self._head)
+        if self.ext is None or not self.size:
+            self._reject(UnsupportedMediaType())
+        _record('accepted', self.size, self.seconds)
+        if self.seconds:
+            logger.info('Ingested %d bytes in %.3fs (%.0f bytes/sec)',
+                        self.size, self.seconds, self.size / self.seconds)
+        return self._hash.hexdigest(), self.ext, self.size
+
+    def adopt(self, destination):
+        """Move the temporary file to `destination`; False if it already existed.
+
+        An existing file is replaced rather than kept: it has the same content,
+        and renaming over it is as cheap as discarding the temporary file.
+        """
+        self._file.close()
+        existed = os.path.exists(destination)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(self.path, destination)
+        self.path = None
+        return not existed
+
+    def discard(self):
+        if self._file is not None:
+            self._file.close()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+    def close(self):
+        self.discard()
+
+
+def accepts_image_uploads(view):
+    """Mark a view whose file fields are images to be streamed into the store."""
+    view.accepts_image_uploads = True
+    return view
+
+
+def wants_image_stream(endpoint):
+    view = current_app.view_functions.get(endpoint) if endpoint else None
+    return getattr(view, 'accepts_image_uploads', False)
+
+
+class ImageUploadRequest(Request):
+    """Request that streams file parts of image-upload views into `IngestStream`s."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        if not wants_image_stream(self.endpoint):
+            return super()._get_file_stream(
+                total_content_length, content_type, filename, content_length)
+        return IngestStream(
+            os.path.join(current_app.config['UPLOAD_FOLDER'], INCOMING_DIR),
+            current_app.config.get('MAX_IMAGE_SIZE', DEFAULT_MAX_IMAGE_SIZE),
+            declared_length=content_length,
+        )
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.tmp-{uuid.uuid4().hex}"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _make_variants(source_path, directory, filename):
+    if Image is None:
+        return
+    with Image.open(source_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+        for variant, size in VARIANTS.items():
+            copy = img.copy()
+            copy.thumbnail(size)
+            target = os.path.join(directory, variant_name(filename, variant))
+            tmp = f"{target}.tmp-{uuid.uuid4().hex}"
+            copy.save(tmp, 'WEBP', quality=WEBP_QUALITY)
+            os.replace(tmp, target)
+
+
+def _derive_variants(path):
+    directory, filename = os.path.split(path)
+    try:
+        _make_variants(path, directory, filename)
+    except Exception:  # a bad image still keeps its original
+        logger.exception('Could not create variants for %s', filename)
+
+
+def process_upload(data, path):
+    """Write a blob and its variants unless already stored (runs on the worker pool)."""
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_atomic(path, data)
+    _derive_variants(path)
+
+
+def _track(future):
+    with _pending_lock:
+        _pending.add(future)
+
+    def _done(f):
+        with _pending_lock:
+            _pending.discard(f)
+    future.add_done_callback(_done)
+    return future
+
+
+def _touch_blob(digest, ext, size):
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(_blobs).where(_blobs.c.digest == digest).values(touched_at=now)
+    )
+    if result.rowcount == 0:
+        db.session.execute(insert(_blobs).values(
+            digest=digest, ext=ext, size=size, refcount=0, touched_at=now,
+        ))
+
+
+def save_upload(file, upload_folder):
+    """Store `file` as a blob and return its path relative to the static folder.
+
+    The blob row joins the caller's transaction; the entry that references the
+    returned path takes the reference when it is flushed.  Streamed uploads
+    were hashed and written while the request was parsed and are only moved
+    into place; anything else is sniffed and hashed here and written by the
+    worker pool.  Raises UnsupportedMediaType for content that is not an image.
+    """
+    stream = file.stream
+    if isinstance(stream, IngestStream):
+        digest, ext, size = stream.finish()
+        _touch_blob(digest, ext, size)
+        relative = blob_path(digest, ext)
+        destination = os.path.join(upload_folder, relative)
+        if stream.adopt(destination):
+            _track(_executor.submit(_derive_variants, destination))
+    else:
+        data = file.read()
+        ext = sniff_image_type(data[:SNIFF_BYTES])
+        if ext is None:
+            raise UnsupportedMediaType()
+        digest = hashlib.sha256(data).hexdigest()
+        _touch_blob(digest, ext, len(data))
+        relative = blob_path(digest, ext)
+        _track(_executor.submit(process_upload, data, os.path.join(upload_folder, relative)))
+    return os.path.join(os.path.basename(upload_folder), relative)
+
+
+def _file_set(path):
+    directory, filename = os.path.split(path)
+    return [path] + [os.path.join(directory, variant_name(filename, v)) for v in VARIANTS]
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.exception('Could not remove %s', path)
+
+
+def discard_upload(image_path, static_folder):
+    """Forget an image an entry no longer uses.
+
+    Blob references are dropped by the mapper events when the entry is
+    flushed; only legacy one-off files are removed here (in the background).
+    """
+    if not image_path or digest_from_path(image_path) is not None:
+        return
+    _track(_executor.submit(_remove_files, _file_set(os.path.join(static_folder, image_path))))
+
+
+def _adjust_refcount(connection, image_path, delta):
+    digest = digest_from_path(image_path)
+    if digest is not None:
+        connection.execute(
+            update(_blobs).where(_blobs.c.digest == digest)
+            .values(refcount=_blobs.c.refcount + delta)
+        )
+
+
+@event.listens_for(MoodEntry, 'after_insert')
+def _after_insert(mapper, connection, target):
+    _adjust_refcount(connection, target.image_path, 1)
+
+
+@event.listens_for(MoodEntry, 'after_delete')
+def _after_delete(mapper, connection, target):
+    _adjust_refcount(connection, target.image_path, -1)
+
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+# Load the replaced path even if image_path was expired, so the update hook sees it
+event.listen(MoodEntry.image_path, 'set', _load_previous_value, active_history=True, retval=True)
+
+
+@event.listens_for(MoodEntry, 'after_update')
+def _after_update(mapper, connection, target):
+    history = inspect(target).attrs.image_path.history
+    if not history.has_changes():
+        return
+    for old in history.deleted:
+        _adjust_refcount(connection, old, -1)
+    _adjust_refcount(connection, target.image_path, 1)
+
+
+def release_user_uploads(user_id, static_folder):
+    """Drop the references a user's entries hold; call before bulk-deleting them."""
+    rows = db.session.execute(
+        select(_entries.c.image_path, func.count())
+        .where(_entries.c.user_id == user_id, _entries.c.image_path.is_not(None))
+        .group_by(_entries.c.image_path)
+    ).all()
+    connection = db.session.connection()
+    for image_path, count in rows:
+        if digest_from_path(image_path) is None:
+            discard_upload(image_path, static_folder)
+        else:
+            _adjust_refcount(connection, image_path, -count)
+
+
+def collect_garbage(upload_folder, grace=None, batch_size=None):
+    """Delete unreferenced blobs in batches; returns how many were removed.
+
+    Each batch's files are removed before its row deletion commits.  The
+    transaction holds SQLite's write lock meanwhile, so an upload of the same
+    content cannot re-insert the row until the files are gone, and then it
+    writes them again instead of finding a file about to be unlinked.
+    """
+    grace = GC_GRACE if grace is None else grace
+    batch_size = batch_size or GC_BATCH_SIZE
+    cutoff = datetime.utcnow() - grace
+    collectable = (_blobs.c.refcount <= 0) & (_blobs.c.touched_at < cutoff)
+    removed = 0
+    while True:
+        batch = db.session.execute(
+            delete(_blobs)
+            .where(_blobs.c.digest.in_(
+                select(_blobs.c.digest).where(collectable).limit(batch_size).scalar_subquery()
+            ))
+            .returning(_blobs.c.digest, _blobs.c.ext)
+        ).all()
+        paths = []
+        for digest, ext in batch:
+            paths.extend(_file_set(os.path.join(upload_folder, blob_path(digest, ext))))
+        _remove_files(paths)
+        db.session.commit()
+        removed += len(batch)
+        if len(batch) < batch_size:
+            break
+    return removed
+
+
+def variant_path(image_path, variant, static_folder):
+    """Static-relative path of a variant, or of the original if it is not ready."""
+    if not image_path:
+        return image_path
+    directory, filename = os.path.split(image_path)
+    candidate = os.path.join(directory, variant_name(filename, variant))
+    if os.path.exists(os.path.join(static_folder, candidate)):
+        return candidate
+    return image_path
+
+
+def variant_pending(image_path, static_folder):
+    """Whether variants of `image_path` that do not exist yet may still be written.
+
+    False where variants cannot be made (no Pillow) and once the original is
+    older than VARIANT_WAIT: by then a missing variant is missing for good,
+    e.g. for a legacy path or an image Pillow could not read.
+    """
+    if Image is None or not image_path:
+        return False
+    try:
+        written = os.path.getmtime(os.path.join(static_folder, image_path))
+    except OSError:
+        # A blob the worker pool has not written yet
+        return digest_from_path(image_path) is not None
+    return time.time() - written < VARIANT_WAIT.total_seconds()
+
+
+def wait_for_uploads(timeout=None):
+    """Block until queued writes have finished (tests and shutdown)."""
+    with _pending_lock:
+        futures = list(_pending)
+    for future in futures:
+        future.result(timeout=timeout)
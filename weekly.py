@@ -0,0 +1,242 @@
+"""Weekly mood rollups, maintained on write.
+
+`models.WeeklySummary` keeps one row per (user, week) with the entry count,
+rating sum and the ids of the lowest/highest rated entries.  The mapper events
+record what a flush changed and the changes are applied once it has written
+its rows: inserts update the row in place; deletes and edits that could change
+the min/max recount that single week.  As in streaks.py, bulk `Query.delete()` calls bypass the
+mapper events, so those routes call `reset_weekly_summaries()`.
+"""
+from datetime import timedelta
+
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session, object_session
+
+from dates import to_date
+from extensions import db
+from models import MoodEntry, WeeklySummary
+
+_weeks = WeeklySummary.__table__
+_entries = MoodEntry.__table__
+
+
+def week_start_for(day):
+    day = to_date(day)
+    return day - timedelta(days=day.weekday()) if day is not None else None
+
+
+def _week_key(user_id, week_start):
+    return (_weeks.c.user_id == user_id) & (_weeks.c.week_start == week_start)
+
+
+def rebuild_week(connection, user_id, week_start):
+    """Recount one week from mood_entries (at most a handful of rows)."""
+    rows = connection.execute(
+        select(_entries.c.id, _entries.c.mood_rating)
+        .where(
+            _entries.c.user_id == user_id,
+            _entries.c.entry_date >= week_start,
+            _entries.c.entry_date < week_start + timedelta(days=7),
+        )
+        .order_by(_entries.c.entry_date, _entries.c.id)
+    ).all()
+    connection.execute(delete(_weeks).where(_week_key(user_id, week_start)))
+    if not rows:
+        return
+    lowest = min(rows, key=lambda r: r.mood_rating)
+    highest = max(rows, key=lambda r: r.mood_rating)
+    connection.execute(insert(_weeks).values(
+        user_id=user_id,
+        week_start=week_start,
+        entry_count=len(rows),
+        rating_sum=sum(r.mood_rating for r in rows),
+        min_rating=lowest.mood_rating,
+        min_entry_id=lowest.id,
+        max_rating=highest.mood_rating,
+        max_entry_id=highest.id,
+    ))
+
+
+def rebuild_weekly_summaries(connection, user_id):
+    """Recompute every week for a user with one grouped pass over their entries."""
+    connection.execute(delete(_weeks).where(_weeks.c.user_id == user_id))
+    rows = connection.execute(
+        select(_entries.c.id, _entries.c.entry_date, _entries.c.mood_rating)
+        .where(_entries.c.user_id == user_id)
+        .order_by(_entries.c.entry_date, _entries.c.id)
+    )
+    weeks = {}
+    for entry_id, entry_date, rating in rows:
+        week = week_start_for(entry_date)
+        if week is None:
+            continue
+        w = weeks.get(week)
+        if w is None:
+            weeks[week] = {
+                'user_id': user_id, 'week_start': week,
+                'entry_count': 1, 'rating_sum': rating,
+                'min_rating': rating, 'min_entry_id': entry_id,
+                'max_rating': rating, 'max_entry_id': entry_id,
+            }
+            continue
+        w['entry_count'] += 1
+        w['rating_sum'] += rating
+        if rating < w['min_rating']:
+            w['min_rating'], w['min_entry_id'] = rating, entry_id
+        if rating > w['max_rating']:
+            w['max_rating'], w['max_entry_id'] = rating, entry_id
+    if weeks:
+        connection.execute(insert(_weeks), list(weeks.values()))
+    return len(weeks)
+
+
+def rebuild_all_weekly_summaries():
+    """Rebuild rollups for every user with entries; returns the number of weeks."""
+    connection = db.session.connection()
+    connection.execute(delete(_weeks))
+    user_ids = connection.execute(select(_entries.c.user_id).distinct()).scalars().all()
+    weeks = sum(rebuild_weekly_summaries(connection, user_id) for user_id in user_ids)
+    db.session.commit()
+    return weeks
+
+
+def reset_weekly_summaries(user_id):
+    """Drop a user's rollups after a bulk delete of their entries."""
+    db.session.execute(delete(_weeks).where(_weeks.c.user_id == user_id))
+
+
+def week_changed(connection, user_id, week, added, removed):
+    """Apply one flush's inserted/deleted (entry id, rating) pairs to a week.
+
+    Runs once the flush has written every row, against the rollup as it was
+    before the flush.  Removing the week's min/max entry (or all of its
+    entries) recounts the week, which also covers that flush's inserts.
+    """
+    row = connection.execute(select(_weeks).where(_week_key(user_id, week))).mappings().first()
+    if row is None and not removed:
+        lowest = min(added, key=lambda pair: pair[1])
+        highest = max(added, key=lambda pair: pair[1])
+        connection.execute(insert(_weeks).values(
+            user_id=user_id, week_start=week, entry_count=len(added),
+            rating_sum=sum(rating for _, rating in added),
+            min_rating=lowest[1], min_entry_id=lowest[0],
+            max_rating=highest[1], max_entry_id=highest[0],
+        ))
+        return
+    removed_ids = {entry_id for entry_id, _ in removed}
+    if (row is None or row['min_entry_id'] in removed_ids or row['max_entry_id'] in removed_ids
+            or row['entry_count'] <= len(removed)):
+        rebuild_week(connection, user_id, week)
+        return
+    values = {
+        'entry_count': row['entry_count'] + len(added) - len(removed),
+        'rating_sum': (row['rating_sum'] + sum(rating for _, rating in added)
+                       - sum(rating for _, rating in removed)),
+    }
+    lowest = (row['min_rating'], row['min_entry_id'])
+    highest = (row['max_rating'], row['max_entry_id'])
+    for entry_id, rating in added:
+        if rating < lowest[0]:
+            lowest = (rating, entry_id)
+        if rating > highest[0]:
+            highest = (rating, entry_id)
+    values.update(min_rating=lowest[0], min_entry_id=lowest[1],
+                  max_rating=highest[0], max_entry_id=highest[1])
+    connection.execute(update(_weeks).where(_week_key(user_id, week)).values(**values))
+
+
+def _pending(target):
+    """Per-flush {(user_id, week): (added, removed)} plus the weeks to recount."""
+    info = object_session(target).info
+    return info.setdefault('weekly_changes', {}), info.setdefault('weekly_rebuilds', set())
+
+
+def _record(target, user_id, entry_date, side, pair):
+    week = week_start_for(entry_date)
+    if week is not None:
+        _pending(target)[0].setdefault((user_id, week), ([], []))[side].append(pair)
+
+
+@event.listens_for(MoodEntry, 'after_insert')
+def _after_insert(mapper, connection, target):
+    _record(target, target.user_id, target.entry_date, 0, (target.id, target.mood_rating))
+
+
+@event.listens_for(MoodEntry, 'after_delete')
+def _after_delete(mapper, connection, target):
+    _record(target, target.user_id, target.entry_date, 1, (target.id, target.mood_rating))
+
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+# Attributes expired by a commit have no history when reassigned unless the
+# old value is loaded first; active_history makes the edit path see it.
+for _attr in (MoodEntry.user_id, MoodEntry.entry_date, MoodEntry.mood_rating):
+    event.listen(_attr, 'set', _load_previous_value, active_history=True, retval=True)
+
+
+@event.listens_for(MoodEntry, 'after_update')
+def _after_update(mapper, connection, target):
+    attrs = inspect(target).attrs
+    changed = [
+        attrs[name].history for name in ('user_id', 'entry_date', 'mood_rating')
+        if attrs[name].history.has_changes()
+    ]
+    if not changed:
+        return
+    user_hist = attrs.user_id.history
+    date_hist = attrs.entry_date.history
+    old_user = user_hist.deleted[0] if user_hist.deleted else target.user_id
+    old_week = week_start_for(date_hist.deleted[0] if date_hist.deleted else target.entry_date)
+    rebuilds = _pending(target)[1]
+    if old_week is not None:
+        rebuilds.add((old_user, old_week))
+    new_week = week_start_for(target.entry_date)
+    if new_week is not None:
+        rebuilds.add((target.user_id, new_week))
+
+
+@event.listens_for(Session, 'before_flush')
+def _forget_failed_flush(session, flush_context, instances):
+    session.info.pop('weekly_changes', None)
+    session.info.pop('weekly_rebuilds', None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_changes(session, flush_context):
+    changes = session.info.pop('weekly_changes', None) or {}
+    rebuilds = session.info.pop('weekly_rebuilds', None) or set()
+    if not changes and not rebuilds:
+        return
+    connection = session.connection()
+    for key in sorted(rebuilds):
+        rebuild_week(connection, *key)
+    for key in sorted(set(changes) - rebuilds):
+        week_changed(connection, *key, *changes[key])
+
+
+def summaries_page(user_id, before=None, limit=12):
+    """Newest-first page of rollup rows, optionally strictly before a week.
+
+    Returns (rows, next_before) where next_before is None on the last page.
+    """
+    query = WeeklySummary.query.filter(WeeklySummary.user_id == user_id)
+    if before is not None:
+        query = query.filter(WeeklySummary.week_start < before)
+    rows = query.order_by(WeeklySummary.week_start.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1].week_start
+    return rows, None
+
+
+def ensure_weekly_summaries(user_id, total_entries):
+    """Backfill rollups for data written before they existed (or after repair)."""
+    counted = db.session.query(func.coalesce(func.sum(WeeklySummary.entry_count), 0)).filter(
+        WeeklySummary.user_id == user_id
+    ).scalar()
+    if counted != total_entries:
+        rebuild_weekly_summaries(db.session.connection(), user_id)
+        db.session.commit()